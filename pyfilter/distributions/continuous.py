@@ -2,7 +2,9 @@ import numpy as np
 import abc
 import scipy.stats as stats
 import pyfilter.utils.utils as helps
-from scipy.special import gamma
+from scipy.special import gammaln, betaln, xlogy, xlog1py
+from scipy.linalg import solve_triangular
+from ..utils.rng import get_rng, standard_normal
 from .transforms import NonTransformable, Log, LogOdds, Interval, TransformMixin
 
 
@@ -19,9 +21,26 @@ def _get(x, y):
     return np.array(out) if not isinstance(out, (np.ndarray,)) else out
 
 
+def _support(out, inside):
+    """
+    Sets the log-density to minus infinity outside of the support.
+    :param out: The log-density
+    :type out: np.ndarray|float
+    :param inside: Whether the point is inside the support
+    :type inside: np.ndarray|bool
+    :return: The log-density
+    :rtype: np.ndarray|float
+    """
+
+    return np.where(inside, out, -np.inf)[()]
+
+
 class Distribution(TransformMixin):
     ndim = None
+    debug = False
     _values = None
+    _store = None
+    _index = None
 
     @property
     def values(self):
@@ -29,6 +48,10 @@ class Distribution(TransformMixin):
         Returns the values of current instance.
         :rtype: np.ndarray
         """
+
+        if self._store is not None:
+            return self._store.array[self._index, ...]
+
         return self._values
 
     @property
@@ -47,44 +70,86 @@ class Distribution(TransformMixin):
         :type x: float|int|np.ndarray
         """
 
-        if self._values is None:
+        self._set_values(x)
+
+    @t_values.setter
+    def t_values(self, x):
+        """
+        Sets the transformed values of the instance, i.e. inverse transforms the values and sets the values. As the
+        inverse transform maps onto the support, the write is trusted.
+        :param x: The new parameters
+        :type x: float|int|np.ndarray
+        """
+        self._set_values(self.inverse_transform(x), trusted=True)
+
+    def _set_values(self, x, trusted=False):
+        """
+        Sets the values of the instance. Unless `trusted`, the type, shape and bounds of `x` are validated against the
+        current values. Trusted writes are used internally where the bounds are guaranteed by construction, and are
+        validated as well if `Distribution.debug` is set.
+        :param x: The new parameters
+        :type x: float|int|np.ndarray
+        :param trusted: Whether to skip the validation
+        :type trusted: bool
+        :return: Self
+        :rtype: Distribution
+        """
+
+        values = self.values
+
+        if values is None:
             self._values = x
-            return
+            return self
 
-        assert isinstance(x, type(self._values))
+        if not trusted or self.debug:
+            assert isinstance(x, type(values))
 
-        low, high = self.bounds()
-        if isinstance(x, np.ndarray):
-            v_low, v_high = x.min(), x.max()
-            assert self._values.shape == x.shape
-        else:
-            v_low, v_high = x, x
+            low, high = self.bounds()
+            if isinstance(x, np.ndarray):
+                v_low, v_high = x.min(), x.max()
+                assert values.shape == x.shape
+            else:
+                v_low, v_high = x, x
 
-        assert (v_low >= low) and (v_high <= high)
+            assert (v_low >= low) and (v_high <= high)
 
-        self._values = x
+        if self._store is not None:
+            values[...] = x
+        else:
+            self._values = x
 
-        return
+        return self
 
-    @t_values.setter
-    def t_values(self, x):
+    def attach(self, store, index):
         """
-        Sets the transformed values of the instance, i.e. inverse transforms the values and sets the values.
-        :param x: The new parameters
-        :type x: float|int|np.ndarray
+        Attaches the instance to a parameter store, after which the values are read from and written to row `index` of
+        the store.
+        :param store: The parameter store
+        :type store: pyfilter.timeseries.store.ParameterStore
+        :param index: The row of the store
+        :type index: int
+        :return: Self
+        :rtype: Distribution
         """
-        self.values = self.inverse_transform(x)
 
-    def sample(self, size=None):
+        self._store = store
+        self._index = index
+        self._values = None
+
+        return self
+
+    def sample(self, size=None, rng=None):
         """
         Samples a random sample and overwrites `values`.
         :param size: The size
         :type size: tuple|list
+        :param rng: The random number generator to use, defaults to the global NumPy random state
+        :type rng: np.random.Generator
         :return: Self
         :rtype: Distribution
         """
 
-        self.values = self.rvs(size=size)
+        self.values = self.rvs(size=size, rng=rng)
 
         return self
 
@@ -97,6 +162,20 @@ class Distribution(TransformMixin):
         """
         raise NotImplementedError()
 
+    def logpdf_grad(self, x, loc=None, scale=None, **kwargs):
+        """
+        Implements the gradient of the logarithm of the PDF with respect to the location and scale.
+        :param x: The point at which to evaluate
+        :type x: np.ndarray|float|int
+        :param loc: The location
+        :type loc: np.ndarray|float|int
+        :param scale: The scale
+        :type scale: np.ndarray|float|int
+        :return: The gradient with respect to the location and scale respectively
+        :rtype: tuple of np.ndarray
+        """
+        raise NotImplementedError()
+
     def rvs(self, *args, **kwargs):
         """
         Samples from the distribution of interest
@@ -161,10 +240,24 @@ class Normal(OneDimensional, NonTransformable):
 
         return -np.log(2 * np.pi * s) / 2 - (x - m) ** 2 / 2 / s
 
-    def rvs(self, loc=None, scale=None, size=None, **kwargs):
+    def logpdf_grad(self, x, loc=None, scale=None, **kwargs):
+        m, s = _get(loc, self.loc), _get(scale, self.scale)
+
+        diff = x - m
+
+        return diff / s ** 2, (diff ** 2 - s ** 2) / s ** 3
+
+    def rvs(self, loc=None, scale=None, size=None, out=None, rng=None, **kwargs):
         m, s = _get(loc, self.loc), _get(scale, self.scale)
 
-        return np.random.normal(loc=m, scale=s, size=size)
+        if out is None:
+            return get_rng(rng).normal(loc=m, scale=s, size=size)
+
+        standard_normal(rng, out=out)
+        out *= s
+        out += m
+
+        return out
 
     def bounds(self):
         return -np.infty, np.infty
@@ -178,13 +271,15 @@ class Uniform(OneDimensional, Interval):
         self.a = a
         self.b = b
 
+        self._const = -np.log(b - a)
+
     def logpdf(self, x, *args, **kwargs):
-        return stats.uniform(self.a, self.b + 1).logpdf(x)
+        return _support(self._const * np.ones_like(x, dtype=float), (x >= self.a) & (x <= self.b))
 
-    def rvs(self, a=None, b=None, size=None, **kwargs):
+    def rvs(self, a=None, b=None, size=None, rng=None, **kwargs):
         a, b = _get(a, self.a), _get(b, self.b)
 
-        return np.random.uniform(a, b, size=size)
+        return get_rng(rng).uniform(a, b, size=size)
 
     def bounds(self):
         return self.a, self.b
@@ -198,45 +293,67 @@ class Student(Normal, NonTransformable):
         super().__init__(loc, scale)
         self.nu = nu
 
+        self._const = gammaln((nu + 1) / 2) - gammaln(nu / 2) - np.log(np.pi * nu) / 2
+
     def logpdf(self, x, loc=None, scale=None, size=None, **kwargs):
         m, s = _get(loc, self.loc), _get(scale, self.scale)
 
-        temp = (self.nu + 1) / 2
         diff = (x - m) / s
-        t1 = np.log(gamma(temp))
-        t2 = np.log(np.pi * self.nu) / 2 + np.log(gamma(self.nu / 2))
-        t3 = temp * np.log(1 + diff ** 2 / self.nu)
 
-        return t1 - (t2 + t3) - np.log(s)
+        return self._const - (self.nu + 1) / 2 * np.log1p(diff ** 2 / self.nu) - np.log(s)
 
-    def rvs(self, loc=None, scale=None, size=None, **kwargs):
+    def logpdf_grad(self, x, loc=None, scale=None, **kwargs):
         m, s = _get(loc, self.loc), _get(scale, self.scale)
 
-        return m + s * np.random.standard_t(self.nu, size=size)
+        diff = (x - m) / s
+        temp = (self.nu + 1) / self.nu / (1 + diff ** 2 / self.nu)
+
+        return temp * diff / s, (temp * diff ** 2 - 1) / s
+
+    def rvs(self, loc=None, scale=None, size=None, rng=None, **kwargs):
+        m, s = _get(loc, self.loc), _get(scale, self.scale)
+
+        return m + s * get_rng(rng).standard_t(self.nu, size=size)
 
     def std(self):
         return stats.t.std(self.nu, loc=self.loc, scale=self.scale).std()
 
 
+def _gamma_const(a, scale):
+    """
+    The normalizing constant of the Gamma distribution.
+    """
+
+    return -gammaln(a) - a * np.log(scale)
+
+
 class Gamma(OneDimensional, Log):
     def __init__(self, a, loc=0, scale=1):
         self.a = a
         self.loc = loc
         self.scale = scale
 
+        self._const = _gamma_const(a, scale)
+
     def logpdf(self, x, a=None, loc=None, scale=None, size=None, **kwargs):
+        const = self._const if a is None and scale is None else None
+
         a = _get(a, self.a)
         loc = _get(loc, self.loc)
         scale = _get(scale, self.scale)
 
-        return stats.gamma.logpdf(x, a=a, loc=loc, scale=scale, **kwargs)
+        z = x - loc
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = (const if const is not None else _gamma_const(a, scale)) + xlogy(a - 1, z) - z / scale
 
-    def rvs(self, a=None, loc=None, scale=None, size=None, **kwargs):
+        return _support(out, z >= 0)
+
+    def rvs(self, a=None, loc=None, scale=None, size=None, rng=None, **kwargs):
         a = _get(a, self.a)
         loc = _get(loc, self.loc)
         scale = _get(scale, self.scale)
 
-        return loc + np.random.gamma(a, scale, size=size)
+        return loc + get_rng(rng).gamma(a, scale, size=size)
 
     def bounds(self):
         return self.loc, np.infty
@@ -245,28 +362,44 @@ class Gamma(OneDimensional, Log):
         return stats.gamma(a=self.a, loc=self.loc, scale=self.scale).std()
 
 
+def _invgamma_const(a, scale):
+    """
+    The normalizing constant of the Inverse Gamma distribution.
+    """
+
+    return a * np.log(scale) - gammaln(a)
+
+
 class InverseGamma(OneDimensional, Log):
     def __init__(self, a, loc=0, scale=1):
         self.a = a
         self.loc = loc
         self.scale = scale
 
+        self._const = _invgamma_const(a, scale)
+
     def std(self):
         return stats.invgamma(a=self.a, loc=self.loc, scale=self.scale).std()
 
     def logpdf(self, x, a=None, loc=None, scale=None, size=None, **kwargs):
+        const = self._const if a is None and scale is None else None
+
         a = _get(a, self.a)
         loc = _get(loc, self.loc)
         scale = _get(scale, self.scale)
 
-        return stats.invgamma.logpdf(x, a=a, loc=loc, scale=scale, **kwargs)
+        z = x - loc
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = (const if const is not None else _invgamma_const(a, scale)) - (a + 1) * np.log(z) - scale / z
 
-    def rvs(self, a=None, loc=None, scale=None, size=None, **kwargs):
+        return _support(out, z > 0)
+
+    def rvs(self, a=None, loc=None, scale=None, size=None, rng=None, **kwargs):
         a = _get(a, self.a)
         loc = _get(loc, self.loc)
         scale = _get(scale, self.scale)
 
-        return stats.invgamma(a, scale=scale, loc=loc).rvs(size=size)
+        return loc + scale / get_rng(rng).gamma(a, size=size)
 
     def bounds(self):
         return self.loc, np.infty
@@ -277,14 +410,21 @@ class Beta(OneDimensional, LogOdds):
         self.a = a
         self.b = b
 
-    def rvs(self, a=None, b=None, size=None, **kwargs):
+        self._const = -betaln(a, b)
+
+    def rvs(self, a=None, b=None, size=None, rng=None, **kwargs):
         a, b = _get(a, self.a), _get(b, self.b)
 
-        return np.random.beta(a, b, size=size)
+        return get_rng(rng).beta(a, b, size=size)
 
     def logpdf(self, x, a=None, b=None, size=None, **kwargs):
+        const = self._const if a is None and b is None else None
         a, b = _get(a, self.a), _get(b, self.b)
-        return stats.beta.logpdf(x, a, b)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = (const if const is not None else -betaln(a, b)) + xlogy(a - 1, x) + xlog1py(b - 1, -x)
+
+        return _support(out, (x >= 0) & (x <= 1))
 
     def bounds(self):
         return 0, 1
@@ -297,11 +437,16 @@ class Exponential(OneDimensional, Log):
     def __init__(self, lam):
         self.lam = lam
 
-    def rvs(self, lam=None, size=None, **kwargs):
-        return np.random.exponential(1 / _get(lam, self.lam), size=size)
+        self._const = -np.log(1 / lam)
+
+    def rvs(self, lam=None, size=None, rng=None, **kwargs):
+        return get_rng(rng).exponential(1 / _get(lam, self.lam), size=size)
 
     def logpdf(self, x, lam=None, **kwargs):
-        return stats.expon(scale=1 / _get(lam, self.lam)).logpdf(x)
+        scale = 1 / _get(lam, self.lam)
+        const = self._const if lam is None else -np.log(scale)
+
+        return _support(const - x / scale, x >= 0)
 
     def bounds(self):
         return 0, np.inf
@@ -322,33 +467,68 @@ class MultivariateNormal(MultiDimensional, NonTransformable):
             self._cov = scale
             self._ndim = scale.shape[0]
 
-        self._hmean = np.zeros(self._ndim)
-        self._hcov = np.eye(self._ndim)
-
     @property
     def ndim(self):
         return self._ndim
 
-    def rvs(self, loc=None, scale=None, size=None, **kwargs):
+    def rvs(self, loc=None, scale=None, size=None, out=None, rng=None, **kwargs):
+        """
+        Samples from the distribution by scaling standard normal variables with the (batched or shared) square root of
+        the covariance.
+        :param loc: The mean, of shape (ndim, ...)
+        :type loc: np.ndarray
+        :param scale: The square root of the covariance, of shape (ndim, ndim, ...)
+        :type scale: np.ndarray
+        :param size: The number of samples, defaults to the trailing shape of `loc`
+        :type size: int|tuple of int
+        :param out: Optional buffer of shape (ndim, ...) to write the samples to
+        :type out: np.ndarray
+        :param rng: The random number generator to use, defaults to the global NumPy random state
+        :type rng: np.random.Generator
+        :return: Samples
+        :rtype: np.ndarray
+        """
+
         loc, scale = _get(loc, self._mean), _get(scale, self._cov)
 
-        rvs = np.random.multivariate_normal(mean=self._hmean, cov=self._hcov, size=(size or loc.shape[1:]))
-        scaledrvs = np.einsum('ij...,...j->i...', scale, rvs)
+        if out is not None:
+            shape = out.shape
+        else:
+            size = size or loc.shape[1:]
+            shape = (self._ndim,) + (tuple(size) if isinstance(size, (tuple, list)) else (size,))
+
+        rvs = standard_normal(rng, size=shape)
 
-        try:
-            return loc + scaledrvs
-        except ValueError:
-            return (loc + scaledrvs.T).T
+        if scale.ndim < 3:
+            out = np.dot(scale, rvs.reshape(self._ndim, -1)).reshape(shape) if out is None else np.einsum(
+                'ij,j...->i...', scale, rvs, out=out
+            )
+        else:
+            out = np.einsum('ij...,j...->i...', scale, rvs, out=out)
+
+        np.add(out.T, loc.T, out=out.T)
+
+        return out
 
     def logpdf(self, x, loc=None, scale=None, **kwargs):
         loc, scale = _get(loc, self._mean), _get(scale, self._cov)
 
-        cov = helps.outer(scale, self._hcov)
+        diff = (x.T - loc.T).T
 
-        t1 = - 0.5 * np.log(np.linalg.det(2 * np.pi * cov.T)).T
-        t2 = - 0.5 * helps.square((x.T - loc.T).T, np.linalg.inv(cov.T).T)
+        # ===== Standardize using the square root of the covariance ===== #
+
+        if not helps.istril(scale):
+            cov = np.moveaxis(scale, (0, 1), (-2, -1))
+            standardized = np.moveaxis(np.linalg.solve(cov, np.moveaxis(diff, 0, -1)[..., None])[..., 0], -1, 0)
+            logdet = np.linalg.slogdet(cov)[1]
+        elif scale.ndim < 3:
+            standardized = solve_triangular(scale, diff.reshape(self._ndim, -1), lower=True).reshape(diff.shape)
+            logdet = np.log(np.abs(np.diag(scale))).sum()
+        else:
+            standardized = helps.trisolve(scale, diff)
+            logdet = np.log(np.abs(np.diagonal(scale, axis1=0, axis2=1))).sum(axis=-1)
 
-        return t1 + t2
+        return -self._ndim / 2 * np.log(2 * np.pi) - logdet - (standardized ** 2).sum(axis=0) / 2
 
     def bounds(self):
         bound = np.infty * np.ones_like(self._mean)
@@ -27,6 +27,29 @@ class TransformMixin(object):
 
         raise NotImplementedError()
 
+    def log_jacobian(self, x):
+        """
+        Implements the log of the absolute derivative of the inverse transform, i.e. the correction of the log-density
+        when changing variables to the real line.
+        :param x: The transformed value(s)
+        :type x: np.ndarray|float
+        :return: A new array
+        :rtype: np.ndarray
+        """
+
+        raise NotImplementedError()
+
+
+def _logodds_jacobian(x):
+    """
+    The log-derivative of the logistic function.
+    :param x: The transformed value(s)
+    :type x: np.ndarray|float
+    :rtype: np.ndarray
+    """
+
+    return -np.logaddexp(0, x) - np.logaddexp(0, -x)
+
 
 class NonTransformable(TransformMixin):
     def transform(self, x):
@@ -35,6 +58,9 @@ class NonTransformable(TransformMixin):
     def inverse_transform(self, x):
         return x
 
+    def log_jacobian(self, x):
+        return np.zeros_like(x, dtype=float)
+
 
 class LogOdds(TransformMixin):
     """
@@ -47,6 +73,9 @@ class LogOdds(TransformMixin):
     def transform(self, x):
         return logit(x)
 
+    def log_jacobian(self, x):
+        return _logodds_jacobian(x)
+
 
 class Log(TransformMixin):
     """
@@ -59,6 +88,9 @@ class Log(TransformMixin):
     def inverse_transform(self, x):
         return np.exp(x)
 
+    def log_jacobian(self, x):
+        return np.array(x, dtype=float)
+
 
 class Interval(TransformMixin):
     """
@@ -73,4 +105,138 @@ class Interval(TransformMixin):
     def transform(self, x):
         a, b = self.bounds()
 
-        return np.log(x - a) - np.log(b - x)
\ No newline at end of file
+        return np.log(x - a) - np.log(b - x)
+
+    def log_jacobian(self, x):
+        a, b = self.bounds()
+
+        return np.log(b - a) + _logodds_jacobian(x)
+
+
+class StackedTransform(object):
+    def __init__(self, transforms, ndim=1):
+        """
+        Applies the transforms of several variables stacked along the first axis of an array, with one vectorised pass
+        per kind of transform instead of one per variable. The bounds of `Interval` transforms are evaluated once on
+        construction. Transforms of other kinds are applied one at a time.
+        :param transforms: The transforms, e.g. the parameter distributions
+        :type transforms: list of TransformMixin
+        :param ndim: The number of dimensions of the stacked arrays
+        :type ndim: int
+        """
+
+        self.transforms = tuple(transforms)
+
+        groups = dict()
+        for i, t in enumerate(self.transforms):
+            kind = next((k for k in _KINDS if _iskind(t, k)), None)
+            groups.setdefault(kind, list()).append(i)
+
+        self._groups = {k: (v if k is None else _asindex(v)) for k, v in groups.items()}
+
+        self._bounds = None
+        if Interval in groups:
+            shape = (-1,) + (1,) * (ndim - 1)
+            bounds = np.array([self.transforms[i].bounds() for i in groups[Interval]], dtype=float)
+            self._bounds = bounds[:, 0].reshape(shape), bounds[:, 1].reshape(shape)
+
+    def _apply(self, x, funcs):
+        """
+        Applies the function of each kind of transform to its rows of `x`.
+        :param x: The stacked array
+        :type x: np.ndarray
+        :param funcs: The functions to apply keyed by kind, the key None is applied to each row with its transform
+        :type funcs: dict
+        :rtype: np.ndarray
+        """
+
+        out = np.empty(x.shape, dtype=float)
+
+        for kind, inds in self._groups.items():
+            if kind is None:
+                for i in inds:
+                    out[i] = funcs[None](self.transforms[i], x[i])
+            else:
+                out[inds] = funcs[kind](x[inds])
+
+        return out
+
+    def transform(self, x):
+        """
+        Transforms the stacked values to the real line.
+        :param x: The values, of shape (# variables, ...)
+        :type x: np.ndarray
+        :rtype: np.ndarray
+        """
+
+        return self._apply(x, {
+            NonTransformable: lambda u: u,
+            Log: np.log,
+            LogOdds: logit,
+            Interval: lambda u: np.log(u - self._bounds[0]) - np.log(self._bounds[1] - u),
+            None: lambda t, u: t.transform(u)
+        })
+
+    def inverse_transform(self, x):
+        """
+        Transforms the stacked values from the real line.
+        :param x: The transformed values, of shape (# variables, ...)
+        :type x: np.ndarray
+        :rtype: np.ndarray
+        """
+
+        return self._apply(x, {
+            NonTransformable: lambda u: u,
+            Log: np.exp,
+            LogOdds: expit,
+            Interval: lambda u: (self._bounds[1] - self._bounds[0]) * expit(u) + self._bounds[0],
+            None: lambda t, u: t.inverse_transform(u)
+        })
+
+    def log_jacobian(self, x):
+        """
+        Returns the log-Jacobian of the inverse transform summed over the variables.
+        :param x: The transformed values, of shape (# variables, ...)
+        :type x: np.ndarray
+        :rtype: np.ndarray
+        """
+
+        return self._apply(x, {
+            NonTransformable: np.zeros_like,
+            Log: lambda u: u,
+            LogOdds: _logodds_jacobian,
+            Interval: lambda u: np.log(self._bounds[1] - self._bounds[0]) + _logodds_jacobian(u),
+            None: lambda t, u: t.log_jacobian(u)
+        }).sum(axis=0)
+
+
+_KINDS = (NonTransformable, Log, LogOdds, Interval)
+
+
+def _asindex(inds):
+    """
+    Returns the indices as a slice if they are consecutive, as indexing with a slice does not copy.
+    :param inds: The sorted indices
+    :type inds: list of int
+    :rtype: slice|np.ndarray
+    """
+
+    if inds[-1] - inds[0] == len(inds) - 1:
+        return slice(inds[0], inds[-1] + 1)
+
+    return np.array(inds)
+
+
+def _iskind(t, kind):
+    """
+    Checks whether `t` is a transform of `kind` that has not overridden its methods.
+    :param t: The transform
+    :type t: TransformMixin
+    :param kind: The kind of transform
+    :type kind: type
+    :rtype: bool
+    """
+
+    methods = ('transform', 'inverse_transform', 'log_jacobian')
+
+    return isinstance(t, kind) and all(getattr(type(t), m) is getattr(kind, m) for m in methods)
\ No newline at end of file
@@ -8,8 +8,24 @@ from ..proposals.linearized import Linearized as Linz
 from .upf import UPF, GlobalUPF
 from .ukf import UKF
 from .klf import KalmanLaplace
+from .sqmc import SQMC
+from .enkf import EnKF
+from .ekf import EKF
+from .rbpf import RBPF
 
 
 class Linearized(SISR):
-    def __init__(self, model, particles, *args, **kwargs):
-        super().__init__(model, particles, *args, proposal=Linz(), **kwargs)
\ No newline at end of file
+    def __init__(self, model, particles, *args, tol=1e-3, maxiter=5, **kwargs):
+        """
+        Implements the SISR filter using the `Linearized` proposal.
+        :param model: See BaseFilter
+        :param particles: See BaseFilter
+        :param tol: The tolerance of the Newton iterations, see `pyfilter.proposals.Linearized`
+        :type tol: float
+        :param maxiter: The maximum number of Newton iterations, see `pyfilter.proposals.Linearized`
+        :type maxiter: int
+        :param args: See SISR
+        :param kwargs: See SISR
+        """
+
+        super().__init__(model, particles, *args, proposal=Linz(tol=tol, maxiter=maxiter), **kwargs)
\ No newline at end of file
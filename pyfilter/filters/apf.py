@@ -23,7 +23,7 @@ class APF(ParticleFilter):
 
         # ===== Resample and propagate ===== #
 
-        resampled_indices = self._resamp(resamp_w)
+        resampled_indices = self._resamp(resamp_w, rng=self._rng)
         resampled_x = choose(self._old_x, resampled_indices)
 
         t_x = self._proposal.draw(y, resampled_x)
@@ -31,7 +31,7 @@ class APF(ParticleFilter):
 
         self._cur_x = t_x
         self._inds = resampled_indices
-        self._anc_x = self._old_x.copy()
+        self._anc_x = self._old_x.copy() if self._summarize else None
         self._old_x = t_x
         self._old_w = weights - choose(t_weights, resampled_indices)
 
@@ -44,4 +44,4 @@ class APF(ParticleFilter):
             self.s_x.append(t_x)
             self.s_w.append(self._old_w)
 
-        return self._save_mean_and_noise(y, t_x, normalize(self._old_w))
\ No newline at end of file
+        return self._save_summaries(y, t_x, self._old_w)
\ No newline at end of file
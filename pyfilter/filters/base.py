@@ -1,8 +1,13 @@
 import pandas as pd
 import numpy as np
 import copy
+import time
+from functools import wraps
 from ..utils.utils import choose, dot, expanddims
+from ..utils.normalization import normalize
+from ..utils.summaries import REDUCERS, Trace
 from ..utils.resampling import multinomial, systematic
+from ..utils.rng import seedsequence, BufferedGenerator
 from ..proposals.bootstrap import Bootstrap, Proposal
 from ..timeseries import Base, StateSpaceModel
 from tqdm import tqdm
@@ -18,32 +23,119 @@ def _numparticles(parts):
     return parts if (not isinstance(parts, tuple) or (len(parts) < 2)) else (parts[0], 1)
 
 
-def _overwriteparams(ts, particles):
+def _overwriteparams(ts, particles, rng=None):
     """
     Helper function for overwriting the parameters of the model.
     :param ts: The timeseries
     :type ts: pyfilter.timeseries.Base
     :param particles: The number of particles
     :type particles: tuple of int|int
+    :param rng: The random number generator
+    :type rng: np.random.Generator
     :return:
     """
 
     for j, p in enumerate(ts.theta_dists):
-        p.sample(size=particles)
+        p.sample(size=particles, rng=rng)
 
     return True
 
 
+def _todata(data):
+    """
+    Returns the data as an array.
+    :param data: The data
+    :type data: pd.DataFrame|np.ndarray|list
+    :rtype: np.ndarray
+    """
+
+    if isinstance(data, pd.DataFrame):
+        return data.values
+    elif isinstance(data, list):
+        return np.array(data)
+
+    return data
+
+
+def _reducers(summaries):
+    """
+    Returns the reducers of the requested summaries.
+    :param summaries: The names of the summaries in `REDUCERS`, or the reducers keyed by name
+    :type summaries: tuple of str|dict[str, callable]
+    :rtype: dict[str, callable]
+    """
+
+    if isinstance(summaries, dict):
+        return dict(summaries)
+
+    unknown = set(summaries) - set(REDUCERS)
+    if unknown:
+        raise ValueError('Unknown summaries `{}`, pass the reducers keyed by name instead'.format(sorted(unknown)))
+
+    return {name: REDUCERS[name] for name in summaries}
+
+
+def _budgeted(func):
+    """
+    Wraps the `filter` method of a filter such that the step is timed and passed on to the deadline of the filter, if
+    any, which then sets the effort of the next step. Only the outermost call is timed.
+    :param func: The method
+    :type func: callable
+    :rtype: callable
+    """
+
+    @wraps(func)
+    def wrapper(self, y):
+        if self._deadline is None or self._timing:
+            return func(self, y)
+
+        effort = self._get_effort()
+
+        self._timing = True
+        try:
+            start = time.perf_counter()
+            out = func(self, y)
+            elapsed = time.perf_counter() - start
+        finally:
+            self._timing = False
+
+        self._set_effort(self._deadline.update(elapsed, effort))
+
+        return out
+
+    return wrapper
+
+
 class BaseFilter(object):
-    def __init__(self, model, particles, *args, saveall=False, resampling=systematic, proposal=Bootstrap(), **kwargs):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        if 'filter' in cls.__dict__:
+            cls.filter = _budgeted(cls.__dict__['filter'])
+
+    def __init__(self, model, particles, *args, saveall=False, resampling=systematic, proposal=None, seed=None,
+                 prefetch=None, deadline=None, summaries=('mean', 'noise'), **kwargs):
         """
         Implements the base functionality of a particle filter.
         :param model: The state-space model to filter
         :type model: StateSpaceModel
-        :param resampling: Which resampling method to use
+        :param resampling: Which resampling method to use, must take the random number generator as kwarg `rng`
         :type resampling: callable
-        :param proposal: Which proposal to use
+        :param proposal: Which proposal to use, defaults to `Bootstrap`
         :type proposal: Proposal
+        :param seed: The seed of the random number generator owned by the filter
+        :type seed: int|np.random.SeedSequence
+        :param prefetch: If passed, the number of uniform and normal variables to pre-generate in one call
+        :type prefetch: int
+        :param deadline: If passed, controls the number of particles or inner iterations of the filter such that the
+                         time of `filter` meets a latency budget
+        :type deadline: pyfilter.utils.deadline.Deadline
+        :param summaries: The summaries of the filtering distribution to save at each step, either names of reducers in
+                          `pyfilter.utils.summaries.REDUCERS` or the reducers keyed by name. A reducer takes the
+                          particles and the normalized weights and reduces the last axis. Each summary is saved in its
+                          trace in `s_summaries`, see `summary`, where the 'mean' of the state and 'noise', i.e. the
+                          mean of the standardized residuals, are also available as `s_mx` and `s_n`
+        :type summaries: tuple of str|dict[str, callable]
         :param args:
         :param kwargs:
         """
@@ -63,15 +155,29 @@ class BaseFilter(object):
 
         self.saveall = saveall
         self._td = None
+        proposal = proposal if proposal is not None else Bootstrap()
         self._proposal = proposal.set_model(self._model, isinstance(particles, tuple))
 
+        self._deadline = deadline
+        if deadline is not None and deadline.knob not in self._knobs():
+            raise NotImplementedError('{} does not support the knob `{}`'.format(self.__class__.__name__,
+                                                                                 deadline.knob))
+
+        self._timing = False
+        self._summarize = True
+        self._reducers = _reducers(summaries)
+
+        self._prefetch = prefetch
+        self._seq = None
+        self._rng = None
+        self.set_seed(seed)
+
         if saveall:
             self.s_x = list()
             self.s_w = list()
 
         self.s_l = list()
-        self.s_mx = list()
-        self.s_n = list()
+        self.s_summaries = {name: Trace() for name in self._reducers}
 
     @property
     def ssm(self):
@@ -81,6 +187,44 @@ class BaseFilter(object):
         """
         return self._model
 
+    @property
+    def rng(self):
+        """
+        Returns the random number generator of the filter.
+        :rtype: np.random.Generator
+        """
+        return self._rng
+
+    def set_seed(self, seed=None):
+        """
+        Sets the random number generator of the filter, and passes it on to the proposal.
+        :param seed: The seed
+        :type seed: int|np.random.SeedSequence
+        :return: Self
+        :rtype: BaseFilter
+        """
+
+        self._seq = seedsequence(seed)
+        self._rng = np.random.default_rng(self._seq)
+
+        if self._prefetch:
+            self._rng = BufferedGenerator(self._rng, self._prefetch)
+
+        self._proposal.set_rng(self._rng)
+
+        return self
+
+    def spawn(self, n):
+        """
+        Returns `n` copies of the filter with independent random number streams spawned from the stream of the
+        filter, e.g. for running shards in parallel.
+        :param n: The number of copies
+        :type n: int
+        :rtype: list of BaseFilter
+        """
+
+        return [self.copy() for _ in range(n)]
+
     def _initialize_parameters(self):
         """
         Initializes the parameters by drawing from the prior distributions.
@@ -89,8 +233,8 @@ class BaseFilter(object):
 
         # ===== HIDDEN ===== #
 
-        _overwriteparams(self._model.hidden, self._p_particles)
-        _overwriteparams(self._model.observable, self._p_particles)
+        _overwriteparams(self._model.hidden, self._p_particles, rng=self._rng)
+        _overwriteparams(self._model.observable, self._p_particles, rng=self._rng)
 
         return self
 
@@ -100,7 +244,7 @@ class BaseFilter(object):
         :return:
         """
         self._initialize_parameters()
-        self._old_x = self._model.initialize(self._particles)
+        self._old_x = self._model.initialize(self._particles, rng=self._rng)
 
         return self
 
@@ -114,6 +258,33 @@ class BaseFilter(object):
 
         raise NotImplementedError()
 
+    def _knobs(self):
+        """
+        Returns the knobs of a deadline that the filter supports, see `pyfilter.utils.deadline.Deadline`.
+        :rtype: tuple of str
+        """
+
+        return ()
+
+    def _get_effort(self):
+        """
+        Returns the current value of the knob controlled by the deadline.
+        :rtype: int
+        """
+
+        raise NotImplementedError()
+
+    def _set_effort(self, value):
+        """
+        Sets the value of the knob controlled by the deadline, to be used from the next step.
+        :param value: The value
+        :type value: int
+        :return: Self
+        :rtype: BaseFilter
+        """
+
+        raise NotImplementedError()
+
     def _calc_noise(self, y, x):
         """
         Calculates the residual given the observation `y` and state `x`.
@@ -133,23 +304,35 @@ class BaseFilter(object):
 
         return dot(np.linalg.inv(scale.T).T, (expanddims(y, mean.ndim) - mean))
 
-    def _save_mean_and_noise(self, y, x, normalized):
+    def _save_summaries(self, y, x, w=None):
         """
-        Saves the residual given the observation `y` and state `x`.
+        Runs the requested reducers on the particles `x` and saves the summaries.
         :param y: The observation
         :type y: np.ndarray
-        :param x: The state
+        :param x: The particles, or the estimate of the state if `w` is None
         :type y: np.ndarray
-        :param normalized: The normalized weights for weighting
-        :type normalized: np.ndarray
+        :param w: The log weights of the particles
+        :type w: np.ndarray
         :return: Self
         :rtype: BaseFilter
         """
 
-        rescaled = self._calc_noise(y, x)
+        if not self._summarize:
+            return self
+
+        # ===== The 'noise' reduces the standardized residuals instead of the particles ===== #
+        inputs = {'noise': self._calc_noise(y, x)} if 'noise' in self._reducers else {}
 
-        self.s_n.append(np.sum(rescaled * normalized, axis=-1))
-        self.s_mx.append(np.sum(x * normalized, axis=-1))
+        # ===== An estimate of the state is reduced as a single particle of unit weight ===== #
+        if w is None:
+            x = np.asarray(x)[..., None]
+            inputs = {k: np.asarray(v)[..., None] for k, v in inputs.items()}
+            normalized = np.ones(1)
+        else:
+            normalized = normalize(w)
+
+        for name, reducer in self._reducers.items():
+            self.s_summaries[name].append(reducer(inputs.get(name, x), normalized))
 
         return self
 
@@ -164,10 +347,10 @@ class BaseFilter(object):
         :rtype: BaseFilter
         """
 
-        if isinstance(data, pd.DataFrame):
-            data = data.values
-        elif isinstance(data, list):
-            data = np.array(data)
+        data = _todata(data)
+
+        for trace in self.s_summaries.values():
+            trace.reserve(data.shape[0])
 
         # ===== SMC2 needs the entire dataset ==== #
         self._td = data
@@ -184,6 +367,63 @@ class BaseFilter(object):
 
         return self
 
+    def loglikelihood(self, data):
+        """
+        Filters the entire data set and returns the total log-likelihood, for each parameter particle if any. As
+        opposed to `longfilter`, nothing but the state needed for the next step is kept, i.e. neither the means,
+        residuals, particle history nor the log-likelihood of each step are saved, e.g. for PMMH-type moves.
+        :param data: An array of data. Should be {# observations, # dimensions (minimum of 1)}
+        :type data: pd.DataFrame|np.ndarray
+        :return: The log-likelihood
+        :rtype: np.ndarray|float
+        """
+
+        data = _todata(data)
+        saveall = self.saveall
+
+        self._td = data
+        self.saveall = self._summarize = False
+
+        ll = 0.
+        try:
+            for yt in data:
+                self.filter(yt)
+                ll = ll + self.s_l.pop()
+        finally:
+            self._td = None
+            self.saveall, self._summarize = saveall, True
+
+        return ll
+
+    def summary(self, name):
+        """
+        Returns the saved summary `name` of each step.
+        :param name: The name of the summary
+        :type name: str
+        :return: The summaries, where the steps are on the first axis
+        :rtype: np.ndarray
+        """
+
+        return self.s_summaries[name].values
+
+    @property
+    def s_mx(self):
+        """
+        Returns the saved means of the state, if requested.
+        :rtype: np.ndarray
+        """
+
+        return self.summary('mean') if 'mean' in self.s_summaries else np.empty(0)
+
+    @property
+    def s_n(self):
+        """
+        Returns the saved means of the standardized residuals, if requested.
+        :rtype: np.ndarray
+        """
+
+        return self.summary('noise') if 'noise' in self.s_summaries else np.empty(0)
+
     def filtermeans(self):
         """
         Calculates the filter means and returns a timeseries.
@@ -207,18 +447,18 @@ class BaseFilter(object):
         :type steps: int
         :return: np.arrays
         """
-        x, y = self._model.sample(steps+1, x_s=self._old_x)
+        x, y = self._model.sample(steps+1, x_s=self._old_x, rng=self._rng)
 
         return x[1:], y[1:]
 
     def copy(self):
         """
-        Returns a copy of itself.
+        Returns a copy of itself, with a random number stream spawned from the one of `self`.
         :return: Copy of self
         :rtype: BaseFilter
         """
 
-        return copy.deepcopy(self)
+        return copy.deepcopy(self).set_seed(self._seq.spawn(1)[0])
 
     def resample(self, indices, entire_history=True):
         """
@@ -232,13 +472,15 @@ class BaseFilter(object):
         """
 
         self._old_x = choose(self._old_x, indices)
-        self._model.p_apply(lambda x: choose(x.values, indices))
+        self._model.p_resample(indices)
         self._old_w = choose(self._old_w, indices)
 
         self._proposal = self._proposal.resample(indices)
         if entire_history:
             self.s_l = list(np.array(self.s_l)[..., indices])
-            self.s_mx = list(np.array(self.s_mx)[..., indices])
+
+            for trace in self.s_summaries.values():
+                trace.resample(indices)
 
         return self
 
@@ -252,7 +494,7 @@ class BaseFilter(object):
 
         self._particles = particles if particles is not None else self._particles
 
-        self._old_x = self._model.initialize(self._particles)
+        self._old_x = self._model.initialize(self._particles, rng=self._rng)
         self._old_w = 0
 
         if self.saveall:
@@ -260,18 +502,44 @@ class BaseFilter(object):
             self.s_w = list()
 
         self.s_l = list()
-        self.s_mx = list()
-        self.s_n = list()
+
+        for trace in self.s_summaries.values():
+            trace.clear()
+
+        if self._deadline is not None:
+            self._deadline.reset()
 
         return self
 
-    def exchange(self, indices, newfilter):
+    def _exchange_history(self, indices, newfilter):
+        """
+        Exchanges the log-likelihoods and the summaries of all steps of `self` with `indices` of `newfilter`.
+        :param indices: The indices to exchange
+        :type indices: np.ndarray
+        :param newfilter: The new filter to exchange with.
+        :type newfilter: BaseFilter
+        :return: Self
+        :rtype: BaseFilter
+        """
+
+        ots = np.array(self.s_l)
+        ots[..., indices] = np.array(newfilter.s_l)[..., indices]
+        self.s_l = list(ots)
+
+        for name, trace in self.s_summaries.items():
+            trace.exchange(indices, newfilter.s_summaries[name])
+
+        return self
+
+    def exchange(self, indices, newfilter, entire_history=True):
         """
         Exchanges particles of `self` with `indices` of `newfilter`.
         :param indices: The indices to exchange
         :type indices: np.ndarray
         :param newfilter: The new filter to exchange with.
         :type newfilter: BaseFilter
+        :param entire_history: Whether to exchange the entire history, else only the parameters and the current state
+        :type entire_history: bool
         :return: Self
         :rtype: BaseFilter
         """
@@ -282,12 +550,8 @@ class BaseFilter(object):
 
         # ===== Exchange old likelihoods and weights ===== #
 
-        for prop in ['s_l', 's_mx']:
-            ots = np.array(getattr(self, prop))
-            nts = np.array(getattr(newfilter, prop))
-
-            ots[..., indices] = nts[..., indices]
-            setattr(self, prop, list(ots))
+        if entire_history:
+            self._exchange_history(indices, newfilter)
 
         self._old_w[indices] = newfilter._old_w[indices]
 
@@ -300,7 +564,7 @@ class BaseFilter(object):
 
         # ===== Exchange particle history ===== #
 
-        if self.saveall:
+        if self.saveall and entire_history:
             for t, (x, w) in enumerate(zip(newfilter.s_x, newfilter.s_w)):
                 if x.ndim > w.ndim:
                     self.s_x[t][:, indices] = x[:, indices]
@@ -317,24 +581,29 @@ class ParticleFilter(BaseFilter):
 
 
 class KalmanFilter(BaseFilter):
-    def exchange(self, indices, newfilter):
+    def __init__(self, model, particles, *args, **kwargs):
+        super().__init__(model, particles, *args, **kwargs)
+
+        if set(self.s_summaries) - {'mean', 'noise'}:
+            raise NotImplementedError('Kalman filters only save the \'mean\' and \'noise\' summaries')
+
+    def exchange(self, indices, newfilter, entire_history=True):
         # ===== Exchange parameters ===== #
         self._model.exchange(indices, newfilter._model)
 
-        for prop in ['s_l', 's_mx']:
-            ots = np.array(getattr(self, prop))
-            nts = np.array(getattr(newfilter, prop))
-
-            ots[..., indices] = nts[..., indices]
-            setattr(self, prop, list(ots))
+        if entire_history:
+            self._exchange_history(indices, newfilter)
 
         return self
 
     def resample(self, indices, entire_history=True):
-        self._model.p_apply(lambda x: choose(x.values, indices))
+        self._model.p_resample(indices)
         self._proposal = self._proposal.resample(indices)
 
         if entire_history:
             self.s_l = list(np.array(self.s_l)[:, indices])
 
+            for trace in self.s_summaries.values():
+                trace.resample(indices)
+
         return self
\ No newline at end of file
@@ -0,0 +1,176 @@
+from .base import KalmanFilter
+from ..utils.utils import dot, mdot, outerm, expanddims, customcholesky, trisolve
+from ..distributions.continuous import Normal, MultivariateNormal
+import numpy as np
+
+
+def _atleast(x, ndim):
+    """
+    Adds the leading axis of one-dimensional processes.
+    :param x: The array
+    :type x: np.ndarray|float
+    :param ndim: The dimension of the process
+    :type ndim: int
+    :rtype: np.ndarray
+    """
+
+    return np.array(x, dtype=float)[None] if ndim < 2 else np.array(x, dtype=float)
+
+
+class EKF(KalmanFilter):
+    def __init__(self, model, *args, jacobians=None, epsilon=1e-6, **kwargs):
+        """
+        Implements the Extended Kalman filter, where the mean functions of the processes are linearized around the
+        current estimate, and the noise is assumed additive with scale evaluated at the same point. Unless passed, the
+        Jacobians are estimated by central differences, where all points are evaluated in one call to the model.
+        :param model: The model to use
+        :type model: See BaseFilter
+        :param args: Any additional arguments
+        :type args: See BaseFilter
+        :param jacobians: The Jacobians of the mean functions of the hidden and observable processes, taking the same
+                          arguments as the mean functions. The axes of the one-dimensional processes are dropped, e.g.
+                          a one-dimensional observable of a two-dimensional state returns the gradient, of shape
+                          (2, ...). Any of them may be None, in which case it's estimated numerically
+        :type jacobians: tuple of callable
+        :param epsilon: The step size of the finite differences
+        :type epsilon: float
+        :param kwargs: Any additional kwargs passed to `BaseFilter`
+        :type kwargs: See BaseFilter
+        """
+
+        if 'particles' in kwargs:
+            super().__init__(model, *args, **kwargs)
+        else:
+            super().__init__(model, None, *args, **kwargs)
+
+        self._jacobians = jacobians or (None, None)
+        self._eps = epsilon
+
+        self._mean = None
+        self._cov = None
+
+    def initialize(self):
+        self._initialize_parameters()
+
+        return self._initialize_moments()
+
+    def reset(self, particles=None):
+        super().reset(particles)
+
+        return self._initialize_moments()
+
+    def _initialize_moments(self):
+        """
+        Sets the mean and covariance of the state to those of the initial distribution of the hidden process.
+        :return: Self
+        :rtype: EKF
+        """
+
+        shape = () if self._particles is None else self._p_particles
+        shape = shape if isinstance(shape, tuple) else (shape,)
+
+        ndim = self._model.hidden_ndim
+        mean = _atleast(self._model.hidden.i_mean(), ndim)
+        scale = self._model.hidden.i_scale()
+
+        cov = np.array(scale, dtype=float) ** 2 if ndim < 2 else outerm(scale, scale)
+
+        self._mean = np.broadcast_to(expanddims(mean, 1 + len(shape)), (ndim, *shape)).copy()
+        self._cov = np.broadcast_to(
+            expanddims(cov if ndim > 1 else cov[None, None], 2 + len(shape)), (ndim, ndim, *shape)
+        ).copy()
+
+        return self
+
+    def _linearize(self, ts, jacobian, x):
+        """
+        Evaluates the mean function of `ts` at `x`, and its Jacobian.
+        :param ts: The process
+        :type ts: pyfilter.timeseries.meta.Base
+        :param jacobian: The Jacobian of the mean function, if passed
+        :type jacobian: callable
+        :param x: The state, of shape (hidden ndim, ...)
+        :type x: np.ndarray
+        :return: The mean, of shape (ndim, ...), and the Jacobian, of shape (ndim, hidden ndim, ...)
+        :rtype: tuple of np.ndarray
+        """
+
+        ndim, hdim = ts.ndim, x.shape[0]
+        squeeze = (lambda u: u[0]) if self._model.hidden_ndim < 2 else (lambda u: u)
+
+        if jacobian is not None:
+            mean = _atleast(ts.mean(squeeze(x)), ndim)
+            jac = np.array(jacobian(squeeze(x), *ts.theta_vals), dtype=float)
+
+            jac = jac[None] if ndim < 2 else jac
+            jac = jac[:, None] if hdim < 2 else jac
+
+            return np.broadcast_to(mean, (ndim, *x.shape[1:])), np.broadcast_to(jac, (ndim, hdim, *x.shape[1:]))
+
+        # ===== Evaluate the centre and the central differences along each axis in one call ===== #
+        offsets = np.concatenate((np.zeros((hdim, 1)), self._eps * np.eye(hdim), -self._eps * np.eye(hdim)), axis=1)
+        points = x[:, None] + offsets.reshape(offsets.shape + (1,) * (x.ndim - 1))
+
+        out = _atleast(ts.mean(squeeze(points)), ndim)
+        out = np.broadcast_to(out, (ndim, *points.shape[1:]))
+
+        return out[:, 0], (out[:, 1:hdim + 1] - out[:, hdim + 1:]) / 2 / self._eps
+
+    def _noisecov(self, ts, x):
+        """
+        Returns the covariance of the noise of `ts` evaluated at `x`.
+        :param ts: The process
+        :type ts: pyfilter.timeseries.meta.Base
+        :param x: The state, of shape (hidden ndim, ...)
+        :type x: np.ndarray
+        :rtype: np.ndarray
+        """
+
+        scale = np.array(ts.scale(x[0] if self._model.hidden_ndim < 2 else x), dtype=float)
+        cov = scale[None, None] ** 2 if ts.ndim < 2 else outerm(scale, scale)
+
+        return expanddims(cov, x.ndim + 1)
+
+    def filter(self, y):
+        hidden, obs = self._model.hidden, self._model.observable
+
+        # ===== Predict ===== #
+        mean, jac = self._linearize(hidden, self._jacobians[0], self._mean)
+        cov = outerm(mdot(jac, self._cov), jac) + self._noisecov(hidden, self._mean)
+
+        # ===== Update ===== #
+        ymean, yjac = self._linearize(obs, self._jacobians[1], mean)
+
+        xycov = outerm(cov, yjac)
+        ycov = mdot(yjac, xycov) + self._noisecov(obs, mean)
+
+        ychol = customcholesky(ycov)
+        gain = np.swapaxes(trisolve(ychol, trisolve(ychol, np.swapaxes(xycov, 0, 1)), trans=True), 0, 1)
+
+        self._mean = mean + dot(gain, expanddims(_atleast(y, obs.ndim), ymean.ndim) - ymean)
+        self._cov = cov - mdot(gain, outerm(ycov, gain))
+
+        if obs.ndim < 2:
+            kernel = Normal(ymean[0], ychol[0, 0])
+        else:
+            kernel = MultivariateNormal(ymean, ychol)
+
+        self.s_l.append(kernel.logpdf(y))
+
+        return self._save_summaries(y, self._mean.copy()[0] if hidden.ndim < 2 else self._mean.copy())
+
+    def resample(self, indices, entire_history=True):
+        super().resample(indices, entire_history)
+
+        self._mean = self._mean[..., indices]
+        self._cov = self._cov[..., indices]
+
+        return self
+
+    def exchange(self, indices, newfilter, entire_history=True):
+        super().exchange(indices, newfilter, entire_history)
+
+        self._mean[..., indices] = newfilter._mean[..., indices]
+        self._cov[..., indices] = newfilter._cov[..., indices]
+
+        return self
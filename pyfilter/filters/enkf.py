@@ -0,0 +1,190 @@
+from .base import KalmanFilter
+from ..utils.utils import trisolve, expanddims
+import numpy as np
+
+
+def gaspari_cohn(distance, radius):
+    """
+    Evaluates the compactly supported correlation function of Gaspari and Cohn, found here:
+        https://doi.org/10.1002/qj.49712555417
+    Used for constructing the localization of `EnKF`, e.g. as `gaspari_cohn(np.abs(i - j), radius)` for the distances
+    between the hidden dimensions `i` and the observed dimensions `j`.
+    :param distance: The distances
+    :type distance: np.ndarray|float
+    :param radius: The half width of the support, i.e. the correlation is zero at distances beyond `2 * radius`
+    :type radius: float
+    :rtype: np.ndarray|float
+    """
+
+    r = np.abs(distance) / radius
+
+    inner = -r ** 5 / 4 + r ** 4 / 2 + 5 * r ** 3 / 8 - 5 * r ** 2 / 3 + 1
+    with np.errstate(divide='ignore'):
+        outer = r ** 5 / 12 - r ** 4 / 2 + 5 * r ** 3 / 8 + 5 * r ** 2 / 3 - 5 * r + 4 - 2 / 3 / r
+
+    return np.where(r <= 1, inner, np.where(r < 2, outer, 0.))
+
+
+class EnKF(KalmanFilter):
+    def __init__(self, model, *args, ensemble=100, sqrt=False, inflation=1., localization=None, **kwargs):
+        """
+        Implements the Ensemble Kalman filter, where the observations are assimilated one at a time as in the serial
+        filter of Houtekamer and Mitchell. Found here:
+            https://doi.org/10.1175/1520-0493(2001)129%3C0123:ASEKFF%3E2.0.CO;2
+        The square root variant instead adjusts the ensemble deterministically as in the ensemble adjustment filter of
+        Whitaker and Hamill, found here:
+            https://doi.org/10.1175/1520-0493(2002)130%3C1913:EDAWPO%3E2.0.CO;2
+        The ensemble is propagated through the hidden process, and the observable is assumed to be Gaussian with
+        additive noise, whose scale is evaluated at the mean of the ensemble. Correlated observations are decorrelated
+        using the Cholesky factor of the covariance of the noise. The cost is linear in the dimension of the hidden
+        state, as opposed to the cubic cost of the UKF.
+        :param model: The model to use
+        :type model: See BaseFilter
+        :param args: Any additional arguments
+        :type args: See BaseFilter
+        :param ensemble: The number of members of the ensemble
+        :type ensemble: int
+        :param sqrt: Whether to use the deterministic square root update instead of perturbed observations
+        :type sqrt: bool
+        :param inflation: The multiplicative inflation applied to the deviations of the forecast ensemble from its mean
+        :type inflation: float
+        :param localization: The weights, of shape (hidden ndim, obs ndim), with which to taper the covariances between
+                             the hidden dimensions and the observations, see `gaspari_cohn`
+        :type localization: np.ndarray
+        :param kwargs: Any additional kwargs passed to `BaseFilter`
+        :type kwargs: See BaseFilter
+        """
+
+        if 'particles' in kwargs:
+            super().__init__(model, *args, **kwargs)
+        else:
+            super().__init__(model, None, *args, **kwargs)
+
+        self._ensemble = ensemble
+        self._sqrt = sqrt
+        self._inflation = inflation
+        self._loc = np.ones((model.hidden_ndim, model.obs_ndim)) if localization is None else np.array(localization)
+
+        if self._loc.shape != (model.hidden_ndim, model.obs_ndim):
+            raise ValueError('`localization` must be of shape {}'.format((model.hidden_ndim, model.obs_ndim)))
+
+        self._x = None
+
+    def _size(self):
+        """
+        Returns the size of the ensemble, i.e. the number of members followed by the number of parameter particles.
+        :rtype: tuple of int
+        """
+
+        if self._particles is None:
+            return self._ensemble,
+
+        parts = self._p_particles if isinstance(self._p_particles, tuple) else (self._p_particles,)
+
+        return (self._ensemble, *parts)
+
+    def initialize(self):
+        self._initialize_parameters()
+        self._x = self._model.initialize(size=self._size(), rng=self._rng)
+
+        return self
+
+    def reset(self, particles=None):
+        super().reset(particles)
+        self._x = self._model.initialize(size=self._size(), rng=self._rng)
+
+        return self
+
+    def _forecast(self):
+        """
+        Propagates the ensemble and inflates it.
+        :return: The forecast ensemble, of shape (hidden ndim, ensemble, ...)
+        :rtype: np.ndarray
+        """
+
+        x = self._model.propagate(self._x, rng=self._rng)
+        if self._model.hidden_ndim < 2:
+            x = x[None]
+
+        if self._inflation != 1.:
+            mean = x.mean(axis=1, keepdims=True)
+            x = mean + self._inflation * (x - mean)
+
+        return x
+
+    def _whiten(self, y, x):
+        """
+        Evaluates the observable at the ensemble and decorrelates the observation and its ensemble using the Cholesky
+        factor of the covariance of the observation noise.
+        :param y: The observation
+        :type y: np.ndarray|float
+        :param x: The forecast ensemble
+        :type x: np.ndarray
+        :return: The observation, the observation ensemble and the log determinant of the Cholesky factor
+        :rtype: tuple of np.ndarray
+        """
+
+        state = x[0] if self._model.hidden_ndim < 2 else x
+        mean = self._model.observable.mean(state)
+        scale = self._model.observable.scale(state.mean(axis=1) if self._model.hidden_ndim > 1 else state.mean(axis=0))
+
+        if self._model.obs_ndim < 2:
+            mean, chol = mean[None], np.array(scale)[None, None]
+        else:
+            chol = np.array(scale)
+
+        yobs = np.reshape(y, (-1,) + (1,) * (mean.ndim - 1))
+        chol = expanddims(chol, mean.ndim)
+
+        yobs, mean = trisolve(chol, yobs), trisolve(chol, mean)
+        logdet = np.log(np.abs(np.diagonal(chol, axis1=0, axis2=1))).sum(axis=-1)
+
+        return yobs, mean, logdet
+
+    def filter(self, y):
+        x = self._forecast()
+        yobs, yens, logdet = self._whiten(y, x)
+
+        m = self._ensemble - 1
+        ll = -logdet
+
+        # ===== Assimilate the decorrelated observations one at a time ===== #
+        for j in range(yens.shape[0]):
+            ymean = yens[j].mean(axis=0)
+            ydev = yens[j] - ymean
+
+            s = (ydev ** 2).sum(axis=0) / m + 1
+            innov = yobs[j, 0] - ymean
+
+            ll = ll - np.log(2 * np.pi * s) / 2 - innov ** 2 / s / 2
+
+            xgain = ((x - x.mean(axis=1, keepdims=True)) * ydev).sum(axis=1) / m
+            xgain = expanddims(self._loc[:, j], xgain.ndim) * xgain
+            ygain = ((yens - yens.mean(axis=1, keepdims=True)) * ydev).sum(axis=1) / m
+
+            if self._sqrt:
+                delta = innov - ydev / (1 + np.sqrt(1 / s))
+            else:
+                noise = self._rng.standard_normal(size=ydev.shape)
+                delta = yobs[j, 0] + noise - noise.mean(axis=0) - yens[j]
+
+            x = x + (xgain / s)[:, None] * delta
+            yens = yens + (ygain / s)[:, None] * delta
+
+        self._x = x[0] if self._model.hidden_ndim < 2 else x
+
+        self.s_l.append(ll)
+
+        return self._save_summaries(y, self._x.mean(axis=0 if self._model.hidden_ndim < 2 else 1))
+
+    def resample(self, indices, entire_history=True):
+        super().resample(indices, entire_history)
+        self._x = self._x[..., indices]
+
+        return self
+
+    def exchange(self, indices, newfilter, entire_history=True):
+        super().exchange(indices, newfilter, entire_history)
+        self._x[..., indices] = newfilter._x[..., indices]
+
+        return self
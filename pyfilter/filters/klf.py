@@ -1,27 +1,83 @@
 from .ukf import UKF
-from ..utils.utils import customcholesky, bfgs
+from ..utils.utils import bfgs, dot, trisolve, expanddims, OptimizeResult
+from ..utils.stategradient import stencil, fromstencil
 from ..distributions.continuous import Normal, MultivariateNormal
 import numpy as np
 from scipy.optimize import minimize
 
 
+def _batched(a, func, *args):
+    """
+    Applies the linear algebra routine `func` to the matrices `a`, whose matrix axes are the first two axes.
+    :param a: The matrices
+    :type a: np.ndarray
+    :param func: The routine, e.g. `np.linalg.inv`
+    :type func: callable
+    :param args: Any vectors, of shape (ndim, ...), to pass as right hand sides
+    :rtype: np.ndarray
+    """
+
+    a = np.moveaxis(a, (0, 1), (-2, -1))
+
+    if not args:
+        return np.moveaxis(func(a), (-2, -1), (0, 1))
+
+    return np.moveaxis(func(a, *(np.moveaxis(b, 0, -1)[..., None] for b in args))[..., 0], -1, 0)
+
+
+def _subset(params, inds):
+    """
+    Returns the values of the parameters of the particles `inds`.
+    :param params: The values of the parameters
+    :type params: tuple of np.ndarray|tuple of float
+    :param inds: The indices of the particles
+    :type inds: np.ndarray
+    :rtype: tuple of np.ndarray|tuple of float
+    """
+
+    return tuple(p[inds] if np.ndim(p) > 0 else p for p in params)
+
+
 class KalmanLaplace(UKF):
-    def __init__(self, model, *args, **kwargs):
+    def __init__(self, model, *args, newton=None, tol=1e-3, epsilon=1e-4, **kwargs):
         """
         Implements the Kalman-Laplace filter engineered by Paul Bui Qang and Christian Musso. Found here:
             https://ieeexplore.ieee.org/abstract/document/7266743/
         :param model: See Base
         :param args: See UKF
+        :param newton: If passed, the maximum number of Newton steps to take from the predicted mean, using the
+                       predicted covariance of the unscented transform as the prior part of the hessian. Particles that
+                       have not converged after these steps are passed to the optimizer. If None, the optimizer is
+                       started from scratch at every step
+        :type newton: int
+        :param tol: The tolerance on the Newton step for a particle to be considered converged
+        :type tol: float
+        :param epsilon: The step size of the finite differences of the Newton steps
+        :type epsilon: float
         :param kwargs: See UKF
         """
 
+        self._newton = newton
         super().__init__(model, *args, **kwargs)
 
         self._opt = None
+        self._tol = tol
+        self._eps = epsilon
 
     def initialize(self):
         return self._initialize_parameters()
 
+    def _knobs(self):
+        return ('iterations',) if self._newton is not None else ()
+
+    def _get_effort(self):
+        return self._newton
+
+    def _set_effort(self, value):
+        self._newton = value
+
+        return self
+
     def _get_x_map(self, y):
         """
         Constructs and performs the MAP optimization of the state variable.
@@ -30,60 +86,176 @@ class KalmanLaplace(UKF):
         """
         # ====== If first time we run ====== #
         if self._old_x is None:
-            start = self.ssm.hidden.i_mean() if self._particles is None else self.ssm.initialize(size=self._p_particles)
+            if self._particles is None:
+                start = self.ssm.hidden.i_mean()
+            else:
+                start = self.ssm.initialize(size=self._p_particles, rng=self._rng)
 
             self._opt = minimize if self._particles is None else bfgs
 
             if self.ssm.hidden.ndim < 2 and isinstance(start, np.ndarray):
                 start = start[None]
 
-            return self._opt(lambda x: -(self.ssm.weight(y, x) + self.ssm.hidden.i_weight(x)), start), (None, None)
+            if self._particles is None:
+                return self._opt(lambda x: -(self.ssm.weight(y, x) + self.ssm.hidden.i_weight(x)), start), (None, None)
+
+            hparams, oparams = self.ssm.hidden.theta_vals, self.ssm.observable.theta_vals
+
+            def func(x, inds):
+                return -(self.ssm.weight(y, x, _subset(oparams, inds)) +
+                         self.ssm.hidden.i_weight(x, _subset(hparams, inds)))
+
+            return self._opt(func, start, indexed=True), (None, None)
 
         # ====== Otherwise ===== #
-        (m, c, _), (ym, yc, _) = self._ut.get_meancov()
+        (m, mchol, _), (ym, ychol, _) = self._ut.get_meanchol()
+
+        if self._particles is None:
+            dist = Normal(m[0], mchol[0, 0]) if self.ssm.hidden_ndim < 2 else MultivariateNormal(m, mchol)
+            func = lambda x: -(self.ssm.weight(y, x) + dist.logpdf(x))
+        else:
+            func = self._indexedfunc(y, m, mchol)
+
+        if self._newton is None:
+            return self._opt(func, m, **({} if self._particles is None else {'indexed': True})), (ym, ychol)
+
+        return self._newton_map(y, m, mchol, func), (ym, ychol)
+
+    def _indexedfunc(self, y, m, mchol):
+        """
+        Returns the negative log posterior as a function of the states of the particles `inds`, evaluated using only
+        their parameters and predicted moments. See `pyfilter.utils.utils.bfgs`.
+        :param y: The observation
+        :type y: np.ndarray|float|int
+        :param m: The predicted mean
+        :type m: np.ndarray
+        :param mchol: The Cholesky factor of the predicted covariance
+        :type mchol: np.ndarray
+        :rtype: callable
+        """
 
-        if self.ssm.hidden_ndim < 2:
-            dist = Normal(m[0], np.sqrt(c[0, 0]))
+        params = self.ssm.observable.theta_vals
+
+        def func(x, inds):
+            if self.ssm.hidden_ndim < 2:
+                dist = Normal(m[0, inds], mchol[0, 0, inds])
+            else:
+                dist = MultivariateNormal(m[:, inds], mchol[..., inds])
+
+            return -(self.ssm.weight(y, x, _subset(params, inds)) + dist.logpdf(x))
+
+        return func
+
+    def _derivatives(self, y, x, m, prec):
+        """
+        Estimates the gradient and hessian of the negative log posterior from one evaluation of the model at the
+        stacked finite difference stencil. The hessian is replaced by the prior precision where it's not positive
+        definite.
+        :param y: The observation
+        :type y: np.ndarray|float|int
+        :param x: The state
+        :type x: np.ndarray
+        :param m: The predicted mean
+        :type m: np.ndarray
+        :param prec: The predicted precision
+        :type prec: np.ndarray
+        :return: The gradient, the hessian and whether the hessian is positive definite
+        :rtype: tuple of np.ndarray
+        """
+
+        fx = self.ssm.weight(y, stencil(x, self._eps))
+        grad, obshess = fromstencil(np.reshape(fx, (-1, *x.shape[1:])), self._eps, x.shape[0])
+
+        hess = prec - obshess
+        posdef = np.linalg.eigvalsh(np.moveaxis(hess, (0, 1), (-2, -1))).min(axis=-1) > 0
+
+        return dot(prec, x - m) - grad, np.where(posdef, hess, prec), posdef
+
+    def _newton_map(self, y, m, mchol, func):
+        """
+        Performs Newton steps from the predicted mean, where the prior part of the hessian is given by the predicted
+        covariance. The particles that have not converged, or whose hessian is not positive definite, are passed to the
+        optimizer, starting from the last step.
+        :param y: The observation
+        :type y: np.ndarray|float|int
+        :param m: The predicted mean
+        :type m: np.ndarray
+        :param mchol: The Cholesky factor of the predicted covariance
+        :type mchol: np.ndarray
+        :param func: The negative log posterior, used for the stragglers, indexed if there are particles
+        :type func: callable
+        :return: The optimization results
+        :rtype: OptimizeResult
+        """
+
+        linv = trisolve(mchol, expanddims(np.eye(m.shape[0]), mchol.ndim))
+        prec = np.einsum('ki...,kj...->ij...', linv, linv)
+
+        x = m.copy()
+        active = np.ones(m.shape[1:], dtype=bool)
+        hess = prec
+
+        for _ in range(self._newton):
+            grad, hess, posdef = self._derivatives(y, x, m, prec)
+
+            step = _batched(hess, np.linalg.solve, grad)
+            x = np.where(active, x - step, x)
+
+            active &= (np.abs(step).max(axis=0) >= self._tol) | ~posdef
+
+            if not active.any():
+                return OptimizeResult(x, _batched(hess, np.linalg.inv))
+
+        # ===== Optimize the stragglers and re-estimate the curvature at the mode ===== #
+        hessinv = _batched(hess, np.linalg.inv)
+
+        if active.ndim < 1:
+            x = self._opt(func, x).x
         else:
-            dist = MultivariateNormal(m, customcholesky(c))
+            stragglers = np.flatnonzero(active)
+
+            x = x.copy()
+            x[:, active] = self._opt(
+                lambda z, inds: func(z, stragglers[inds]), x[:, active], hessinv=hessinv[..., active], indexed=True
+            ).x
 
-        return self._opt(lambda x: -(self.ssm.weight(y, x) + dist.logpdf(x)), m), (ym, yc)
+        _, hess, _ = self._derivatives(y, x, m, prec)
 
-    def _save(self, y, optstate, ym, yc):
+        return OptimizeResult(x, _batched(hess, np.linalg.inv))
+
+    def _save(self, y, optstate, ym, ychol):
         """
         Saves the data.
         :param optstate: The optimal state
         :type optstate: pyfilter.utils.utils.OptimizeResult
         :param ym: The predicted mean of the observation
         :type ym: np.ndarray
-        :param yc: The predicted covariance of the observation
-        :type yc: np.ndarray
+        :param ychol: The Cholesky factor of the predicted covariance of the observation
+        :type ychol: np.ndarray
         :return: Self
         :rtype: KalmanLaplace
         """
         # ====== If first time we run ====== #
         if self._old_x is None:
             self._ut.initialize(optstate.x if self.ssm.hidden_ndim > 1 else optstate.x[0])
-            _, (ym, yc, _) = self._ut.get_meancov()
+            _, (ym, ychol, _) = self._ut.get_meanchol()
 
         # ====== Get likelihood etc. ===== #
         if self.ssm.obs_ndim < 2:
-            dist = Normal(ym[0], np.sqrt(yc[0, 0]))
+            dist = Normal(ym[0], ychol[0, 0])
         else:
-            dist = MultivariateNormal(ym, customcholesky(yc))
+            dist = MultivariateNormal(ym, ychol)
 
         self._ut.xmean = self._old_x = optstate.x
         self._ut.xcov = optstate.hess_inv
 
-        self.s_mx.append(optstate.x)
         # TODO: Fix this
         # TODO: Investigate the discrepancy between the SISR and this filter in the log likelihood estimation
         self.s_l.append(dist.logpdf(y))
-        self.s_n.append(self._calc_noise(y, self._ut.xmean.copy()))
 
-        return self
+        return self._save_summaries(y, optstate.x)
 
     def filter(self, y):
-        optstate, (ym, yc) = self._get_x_map(y)
+        optstate, (ym, ychol) = self._get_x_map(y)
 
-        return self._save(y, optstate, ym, yc)
\ No newline at end of file
+        return self._save(y, optstate, ym, ychol)
\ No newline at end of file
@@ -2,53 +2,57 @@ from .base import BaseFilter, ParticleFilter, KalmanFilter
 from .sisr import SISR
 from ..utils.normalization import normalize
 from ..utils.utils import get_ess
-from ..distributions.continuous import Distribution
+from ..timeseries.store import ParameterStore
 import math
 import numpy as np
-from scipy.stats import truncnorm, bernoulli
 from .rapf import _propose
+from ..utils.rng import get_rng
 
 
-def cont_jitter(params, p, *args, **kwargs):
+def cont_jitter(params, p, *args, rng=None, **kwargs):
     """
     Jitters the parameters.
-    :param params: The parameters of the model, inputs as (values, prior)
-    :type params: Distribution
+    :param params: The parameters of the model
+    :type params: ParameterStore
     :param p: The scaling to use for the variance of the proposal
     :type p: int|float
+    :param rng: The random number generator
+    :type rng: np.random.Generator
     :return: Proposed values
     :rtype: np.ndarray
     """
     # TODO: Can we improve the jittering kernel?
     values = params.t_values
-    std = 1 / math.sqrt(values.size ** ((p + 2) / p))
+    std = 1 / math.sqrt(values[0].size ** ((p + 2) / p))
 
-    return values + np.random.normal(scale=std, size=values.shape)
+    return values + get_rng(rng).normal(scale=std, size=values.shape)
 
 
-def shrink_jitter(params, p, w, h, **kwargs):
+def shrink_jitter(params, p, w, h, rng=None, **kwargs):
     """
     Jitters the parameters using the same shrinkage kernel as in the RAPF.
-    :param params: The parameters of the model, inputs as (values, prior)
-    :type params: Distribution
+    :param params: The parameters of the model
+    :type params: ParameterStore
     :param p: The scaling to use for the variance of the proposal
     :type p: int|float
     :param w: The weights to use
     :type w: np.ndarray
     :param h: The `a` to use for shrinking
     :type h: float
+    :param rng: The random number generator
+    :type rng: np.random.Generator
     :return: Proposed values
     :rtype: np.ndarray
     """
 
-    return _propose(params, range(params.values.size), h, w)
+    return _propose(params, np.arange(params.array.shape[1]), h, w, rng=rng)
 
 
-def disc_jitter(params, p, w, h, i, **kwargs):
+def disc_jitter(params, p, w, h, i, rng=None, **kwargs):
     """
     Jitters the parameters using discrete propagation.
-    :param params: The parameters of the model, inputs as (values, prior)
-    :type params: Distribution
+    :param params: The parameters of the model
+    :type params: ParameterStore
     :param p: The scaling to use for the variance of the proposal
     :type p: int|float
     :param w: The weights to use
@@ -57,11 +61,13 @@ def disc_jitter(params, p, w, h, i, **kwargs):
     :type h: float
     :param i: The indices to jitter
     :type i: np.ndarray
+    :param rng: The random number generator
+    :type rng: np.random.Generator
     :return: Proposed values
     :rtype: np.ndarray
     """
     # TODO: Only jitter the relevant particles
-    return (1 - i) * params.t_values + i * shrink_jitter(params, p, w, h)
+    return (1 - i) * params.t_values + i * shrink_jitter(params, p, w, h, rng=rng)
 
 
 def flattener(a):
@@ -80,7 +86,7 @@ def flattener(a):
 
 
 class NESS(BaseFilter):
-    def __init__(self, model, particles, filt=SISR, threshold=0.9, shrinkage=None, p=4, **filtkwargs):
+    def __init__(self, model, particles, filt=SISR, threshold=0.9, shrinkage=None, p=4, seed=None, **filtkwargs):
         """
         Implements the NESS alorithm by Miguez and Crisan.
         :param model: See BaseFilter
@@ -91,12 +97,13 @@ class NESS(BaseFilter):
         :param threshold: The threshold for when to resample the parameters.
         :param p: A parameter controlling the variance of the jittering kernel. The greater the value, the higher the
                   variance.
+        :param seed: See BaseFilter, the stream of the filter targeting the states is spawned from it
         :param filtkwargs: See BaseFilter
         """
         # TODO: Perhaps change behaviour s.t. we pass an instantiated filter?
-        super().__init__(model, particles)
+        super().__init__(model, particles, seed=seed)
 
-        self._filter = filt(self._model, particles=particles, **filtkwargs).initialize()
+        self._filter = filt(self._model, particles=particles, seed=self._seq.spawn(1)[0], **filtkwargs).initialize()
 
         msg = """
         `particles` must be `tuple` or `list` of length {:d} where the first element is the number of particles 
@@ -131,17 +138,18 @@ class NESS(BaseFilter):
         if isinstance(self._recw, np.ndarray):
             prev_weight = self._recw
         else:
-            prev_weight = np.ones(self._p_particles)
+            prev_weight = np.ones(self._p_particles[0])
 
         # ===== JITTER ===== #
         # TODO: Think about a better way to do this
         if self.kernel == disc_jitter:
             prob = 1 / prev_weight.shape[0] ** (self._p / 2)
-            i = bernoulli(prob).rvs(size=self._p_particles)
+            i = self._rng.binomial(1, prob, size=self._p_particles)
         else:
             i = 0
 
-        self._model.p_apply(lambda x: self.kernel(x, self._p, prev_weight, h=self.h, i=i), transformed=True)
+        store = self._model.p_store()
+        store.t_values = self.kernel(store, self._p, prev_weight, h=self.h, i=i, rng=self._rng)
 
         # ===== PROPAGATE FILTER ===== #
 
@@ -154,13 +162,16 @@ class NESS(BaseFilter):
         ess = get_ess(self._recw)
 
         if ess < self._th * self._filter._particles[0]:
-            indices = self._resamp(self._recw)
+            indices = self._resamp(self._recw, rng=self._rng)
             self._filter = self._filter.resample(indices, entire_history=False)
 
             self._recw = np.zeros_like(self._recw)
 
         return self
 
+    def loglikelihood(self, data):
+        raise NotImplementedError('The log-likelihood is only available for the filter targeting the states')
+
     def predict(self, steps, **kwargs):
         xp, yp = self._filter.predict(steps, **kwargs)
 
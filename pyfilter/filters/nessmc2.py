@@ -6,7 +6,7 @@ from tqdm import tqdm
 
 
 class NESSMC2(SMC2):
-    def __init__(self, model, particles, handshake=0.2, nesskwargs=None, smc2kwargs=None, **kwargs):
+    def __init__(self, model, particles, handshake=0.2, nesskwargs=None, smc2kwargs=None, seed=None, **kwargs):
         """
         Implements a hybrid of the NESS and SMC2 algorithm, as recommended in the NESS article. That is, we use the
         SMC2 algorithm for the first part of the series and then switch to NESS when it becomes too computationally
@@ -17,9 +17,11 @@ class NESSMC2(SMC2):
         :type particles: tuple of int
         :param handshake: At which point to switch algorithms, (in percent of length of the series) shoud be <= 1.
         :type handshake: float
+        :param seed: See BaseFilter, the streams of both algorithms are spawned from it
+        :type seed: int|np.random.SeedSequence
         :param kwargs: Keyworded arguments used in both algorithms
         """
-        super().__init__(model, particles, **kwargs)
+        super().__init__(model, particles, seed=seed, **kwargs)
 
         self._hs = handshake
         self._switched = False
@@ -28,8 +30,12 @@ class NESSMC2(SMC2):
         nk = nesskwargs or {}
         sm2k = smc2kwargs or {}
 
-        self._smc2 = SMC2(model, particles, threshold=sm2k.pop('threshold', 0.4), **sm2k, **kwargs)
-        self._ness = NESS(model, particles, shrinkage=nk.pop('shrinkage', 0.95), p=nk.pop('p', 1),  **nk, **kwargs)
+        seeds = self._seq.spawn(2)
+
+        self._smc2 = SMC2(model, particles, threshold=sm2k.pop('threshold', 0.4), seed=seeds[0], **sm2k, **kwargs)
+        self._ness = NESS(
+            model, particles, shrinkage=nk.pop('shrinkage', 0.95), p=nk.pop('p', 1), seed=seeds[1], **nk, **kwargs
+        )
 
         self._filter = self._ness._filter = self._smc2._filter
 
@@ -40,7 +46,7 @@ class NESSMC2(SMC2):
         if not self._switched:
             self._switched = True
 
-            inds = self._resamp(self._smc2._recw)
+            inds = self._resamp(self._smc2._recw, rng=self._rng)
             self._filter = self._ness._filter = self._smc2._filter.resample(inds)
             self._recw = np.zeros_like(self._smc2._recw)
 
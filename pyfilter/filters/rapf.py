@@ -3,13 +3,27 @@ from math import sqrt
 from ..utils.utils import choose, loglikelihood
 import numpy as np
 from ..utils.normalization import normalize
+from ..utils.rng import get_rng
+
+
+def _average(transformed, normalized):
+    """
+    Helper function for calculating the weighted average of the parameters along the particle axis.
+    :param transformed: The transformed parameters, of shape (# parameters, # particles, ...)
+    :type transformed: np.ndarray
+    :param normalized: The normalized weights
+    :type normalized: np.ndarray
+    :rtype: np.ndarray
+    """
+
+    return np.expand_dims(np.average(transformed, weights=normalized, axis=1), 1)
 
 
 def _shrink(p, shrink, weights):
     """
     Helper class for shrink parameters
-    :param p: The parameter
-    :type p: pyfilter.distributions.continuous.Distribution
+    :param p: The parameters
+    :type p: pyfilter.timeseries.store.ParameterStore
     :param shrink: The amount to shrink
     :type shrink: float
     :param weights: The weights to use for estimating the mean
@@ -17,28 +31,34 @@ def _shrink(p, shrink, weights):
     :rtype: np.ndarray
     """
 
-    return shrink * p.t_values + (1 - shrink) * np.average(p.t_values, weights=normalize(weights), axis=0)
+    transformed = p.t_values
+
+    return shrink * transformed + (1 - shrink) * _average(transformed, normalize(weights))
 
 
-def _propose(p, indices, h, weights):
+def _propose(p, indices, h, weights, rng=None):
     """
     Helper class for shrink parameters
-    :param p: The parameter
-    :type p: pyfilter.distributions.continuous.Distribution
+    :param p: The parameters
+    :type p: pyfilter.timeseries.store.ParameterStore
     :param indices: The indices to resample
     :type indices: np.ndarray
     :param weights: The weights to use for estimating the mean
     :type weights: np.ndarray
+    :param rng: The random number generator
+    :type rng: np.random.Generator
     :rtype: np.ndarray
     """
     normalized = normalize(weights)
 
-    means = _shrink(p, sqrt(1 - h ** 2), weights)[indices]
     transformed = p.t_values
-    mean = np.average(transformed, weights=normalized, axis=0)
-    std = h * np.sqrt(np.average((transformed - mean) ** 2, weights=normalized, axis=0))
+    mean = _average(transformed, normalized)
+    std = h * np.sqrt(_average((transformed - mean) ** 2, normalized))
+
+    shrink = sqrt(1 - h ** 2)
+    means = (shrink * transformed + (1 - shrink) * mean)[:, indices]
 
-    return np.random.normal(means, std, size=p.values.shape)
+    return get_rng(rng).normal(means, std, size=p.array.shape)
 
 
 class RAPF(BaseFilter):
@@ -66,14 +86,15 @@ class RAPF(BaseFilter):
         # ==== Propagate APF ===== #
         copy = self._model.copy()
         t_x = copy.propagate_apf(self._old_x)
-        copy.p_apply(lambda u: _shrink(u, self.a, self._old_w), transformed=True)
+        copy.p_store().t_values = _shrink(copy.p_store(), self.a, self._old_w)
 
         # ===== Weight and get indices ===== #
         t_weights = copy.weight(y, t_x)
-        res_ind = self._resamp(t_weights + self._old_w)
+        res_ind = self._resamp(t_weights + self._old_w, rng=self._rng)
 
         # ===== Propose new parameters ===== #
-        self._model.p_apply(lambda u: _propose(u, res_ind, self.h, self._old_w), transformed=True)
+        store = self._model.p_store()
+        store.t_values = _propose(store, res_ind, self.h, self._old_w, rng=self._rng)
 
         # ===== Propagate the good states ===== #
 
@@ -86,10 +107,9 @@ class RAPF(BaseFilter):
         self._old_x = x
 
         self.s_l.append(loglikelihood(self._old_w))
-        self.s_mx.append(np.sum(x * normalize(self._old_w), axis=-1))
 
         if self.saveall:
             self.s_w.append(self._old_w - choose(t_weights, res_ind))
             self.s_x.append(x)
 
-        return self
\ No newline at end of file
+        return self._save_summaries(y, x, self._old_w)
\ No newline at end of file
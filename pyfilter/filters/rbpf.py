@@ -0,0 +1,219 @@
+from .sisr import SISR
+from ..distributions.continuous import Normal, MultivariateNormal
+from ..utils.utils import choose, dot, mdot, outerm, expanddims, customcholesky, loglikelihood
+import numpy as np
+
+
+def _inv(a):
+    """
+    Inverts the matrices of `a`, where the matrix axes are the first two.
+    :param a: The matrices
+    :type a: np.ndarray
+    :rtype: np.ndarray
+    """
+
+    if a.shape[0] < 2:
+        return 1 / a
+
+    return np.linalg.inv(a.T).T
+
+
+class RBPF(SISR):
+    def __init__(self, model, particles, linear, *args, **kwargs):
+        """
+        Implements the marginalized, or Rao-Blackwellized, particle filter of Schön et al. Found here:
+            https://doi.org/10.1109/TSP.2005.849151
+        The dimensions `linear` of the hidden state are integrated out by a Kalman filter per particle, and only the
+        remaining dimensions are sampled. This requires the means of both processes to be affine in the linear
+        dimensions given the others, the noise to be Gaussian and the scales to not depend on the linear dimensions.
+        The nonlinear dimensions are drawn from their predictive distribution given the previous state, with the
+        linear dimensions then conditioned on the draw, and the particles are weighted by the predictive likelihood.
+        :param model: See BaseFilter
+        :param particles: See BaseFilter
+        :param linear: The indices of the conditionally linear dimensions of the hidden state
+        :type linear: tuple of int
+        :param args: See SISR
+        :param kwargs: See SISR
+        """
+
+        super().__init__(model, particles, *args, **kwargs)
+
+        self._linear = np.unique(linear)
+        self._nonlinear = np.setdiff1d(np.arange(model.hidden_ndim), self._linear)
+
+        if self._linear.size < 1 or self._nonlinear.size < 1 or not set(self._linear) <= set(range(model.hidden_ndim)):
+            raise ValueError('`linear` must be a proper subset of the dimensions of the hidden state')
+
+        for noise in (model.hidden.noise0, model.hidden.noise, model.observable.noise):
+            if not isinstance(noise, (Normal, MultivariateNormal)):
+                raise ValueError('The RBPF requires Gaussian noise, got `{}`'.format(noise))
+
+        self._cov = None
+
+    def initialize(self):
+        super().initialize()
+
+        return self._initialize_linear()
+
+    def reset(self, particles=None):
+        super().reset(particles)
+
+        return self._initialize_linear()
+
+    def _initialize_linear(self):
+        """
+        Replaces the linear dimensions of the initial states by their conditional mean and covariance given the
+        nonlinear dimensions.
+        :return: Self
+        :rtype: RBPF
+        """
+
+        hidden, ndim = self._model.hidden, self._old_x.ndim
+
+        mean = expanddims(np.array(hidden.i_mean(), dtype=float), ndim)
+        scale = np.array(hidden.i_scale(), dtype=float)
+
+        self._old_x[self._linear], cov = self._condition(
+            mean, expanddims(outerm(scale, scale), ndim + 1), self._old_x[self._nonlinear]
+        )
+
+        self._cov = np.broadcast_to(cov, cov.shape[:2] + self._old_x.shape[1:]).copy()
+
+        return self
+
+    def _condition(self, mean, cov, u):
+        """
+        Conditions a Gaussian distribution of the hidden state on the nonlinear dimensions being `u`.
+        :param mean: The mean, of shape (hidden ndim, ...)
+        :type mean: np.ndarray
+        :param cov: The covariance, of shape (hidden ndim, hidden ndim, ...)
+        :type cov: np.ndarray
+        :param u: The nonlinear dimensions
+        :type u: np.ndarray
+        :return: The mean and covariance of the linear dimensions
+        :rtype: tuple of np.ndarray
+        """
+
+        lin, nonlin = self._linear, self._nonlinear
+
+        cross = cov[lin][:, nonlin]
+        gain = mdot(cross, _inv(cov[nonlin][:, nonlin]))
+
+        return mean[lin] + dot(gain, u - mean[nonlin]), cov[lin][:, lin] - outerm(gain, cross)
+
+    def _affine(self, func, x, ndim):
+        """
+        Evaluates `func` at `x`, and its Jacobian with respect to the linear dimensions.
+        :param func: The function, e.g. the mean of the hidden process
+        :type func: callable
+        :param x: The state, of shape (hidden ndim, ...)
+        :type x: np.ndarray
+        :param ndim: The dimension of the output of `func`
+        :type ndim: int
+        :return: The value, of shape (ndim, ...), and the Jacobian, of shape (ndim, linear ndim, ...)
+        :rtype: tuple of np.ndarray
+        """
+
+        k = self._linear.size
+
+        # ===== Evaluate the centre and unit steps along each linear axis in one call ===== #
+        offsets = np.zeros((x.shape[0], 1 + 2 * k))
+        offsets[self._linear, 1:k + 1] = np.eye(k)
+        offsets[self._linear, k + 1:] = -np.eye(k)
+
+        points = x[:, None] + offsets.reshape(offsets.shape + (1,) * (x.ndim - 1))
+
+        out = np.array(func(points), dtype=float)
+        out = np.broadcast_to(out[None] if ndim < 2 else out, (ndim, *points.shape[1:]))
+
+        mid, up, low = out[:, :1], out[:, 1:k + 1], out[:, k + 1:]
+
+        if not np.allclose(up + low, 2 * mid):
+            raise ValueError('The model must be affine in the linear dimensions of the hidden state')
+
+        return mid[:, 0], (up - low) / 2
+
+    def _covariance(self, ts, x):
+        """
+        Returns the covariance of the noise of `ts` given the state `x`.
+        :param ts: The process
+        :type ts: pyfilter.timeseries.meta.Base
+        :param x: The state, of shape (hidden ndim, ...)
+        :type x: np.ndarray
+        :rtype: np.ndarray
+        """
+
+        scale = np.array(ts.scale(x), dtype=float)
+        cov = scale[None, None] ** 2 if ts.ndim < 2 else outerm(scale, scale)
+
+        return expanddims(cov, x.ndim + 1)
+
+    def filter(self, y):
+        hidden, obs = self._model.hidden, self._model.observable
+        lin, nonlin = self._linear, self._nonlinear
+
+        # ===== Predict the next state given the nonlinear dimensions ===== #
+        mean, jac = self._affine(hidden.mean, self._old_x, hidden.ndim)
+        cov = mdot(jac, outerm(self._cov, jac)) + self._covariance(hidden, self._old_x)
+
+        # ===== Sample the nonlinear dimensions and condition the linear dimensions on them ===== #
+        t_x = np.empty_like(mean)
+
+        noise = self._rng.standard_normal(size=mean[nonlin].shape)
+        ucov = cov[nonlin][:, nonlin]
+        t_x[nonlin] = mean[nonlin] + dot(np.sqrt(ucov) if nonlin.size < 2 else customcholesky(ucov), noise)
+        t_x[lin], cov = self._condition(mean, cov, t_x[nonlin])
+
+        # ===== Update the linear dimensions with the observation ===== #
+        ymean, yjac = self._affine(obs.mean, t_x, obs.ndim)
+
+        xycov = outerm(cov, yjac)
+        ycov = mdot(yjac, xycov) + self._covariance(obs, t_x)
+
+        if obs.ndim < 2:
+            weights = Normal(ymean[0], np.sqrt(ycov[0, 0])).logpdf(y)
+        else:
+            weights = MultivariateNormal(ymean, customcholesky(ycov)).logpdf(y)
+
+        gain = mdot(xycov, _inv(ycov))
+
+        t_x[lin] += dot(gain, np.reshape(y, (-1,) + (1,) * (ymean.ndim - 1)) - ymean)
+        cov = cov - mdot(gain, outerm(ycov, gain))
+
+        self._resize(t_x, weights)
+        resampled_indices = self._resample(weights, t_x)
+
+        self._cur_x = t_x
+        self._inds = resampled_indices
+        self._anc_x = self._old_x.copy() if self._summarize else None
+        self._old_x = self._choose(t_x, resampled_indices)
+        self._cov = self._choose(np.broadcast_to(cov, cov.shape[:2] + t_x.shape[1:]), resampled_indices)
+        self._old_w = weights
+
+        self.s_l.append(loglikelihood(weights))
+
+        if self.saveall:
+            self.s_x.append(t_x)
+            self.s_w.append(weights)
+
+        return self._save_summaries(y, t_x, weights)
+
+    def predict(self, steps):
+        x = self._old_x.copy()
+        x[self._linear] += dot(customcholesky(self._cov), self._rng.standard_normal(size=x[self._linear].shape))
+
+        x, y = self._model.sample(steps + 1, x_s=x, rng=self._rng)
+
+        return x[1:], y[1:]
+
+    def resample(self, indices, entire_history=True):
+        super().resample(indices, entire_history)
+        self._cov = choose(self._cov, indices)
+
+        return self
+
+    def exchange(self, indices, newfilter, entire_history=True):
+        super().exchange(indices, newfilter, entire_history)
+        self._cov[:, :, indices] = newfilter._cov[:, :, indices]
+
+        return self
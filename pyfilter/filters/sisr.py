@@ -1,23 +1,152 @@
 from .base import ParticleFilter
 from ..utils.utils import loglikelihood, choose
-from ..utils.normalization import normalize
+from ..utils.sizing import kld
+import numpy as np
 
 
 class SISR(ParticleFilter):
-    """
-    Implements the SISR filter by Gordon et al.
-    """
+    def __init__(self, model, particles, *args, bounds=None, sizing=kld, **kwargs):
+        """
+        Implements the SISR filter by Gordon et al.
+        :param model: See BaseFilter
+        :param particles: See BaseFilter
+        :param bounds: If passed, the lower and upper bound on the number of particles, which is then chosen by
+                       `sizing` at each resampling. The chosen numbers are saved in `s_particles`
+        :type bounds: (int, int)
+        :param sizing: The function returning the number of particles given the particles and their log weights, see
+                       `pyfilter.utils.sizing`. The resampling method must take the number of indices as kwarg `size`
+        :type sizing: callable
+        :param args: See BaseFilter
+        :param kwargs: See BaseFilter
+        """
+
+        deadline, uppers = kwargs.get('deadline'), list()
+
+        if bounds is not None:
+            uppers.append(bounds[1])
+
+        if deadline is not None and deadline.knob == 'particles':
+            uppers.append(deadline.bounds[1])
+
+        fixed = not (isinstance(particles, tuple) or model.hidden.theta_dists or model.observable.theta_dists)
+
+        if uppers and not fixed:
+            raise NotImplementedError('Adaptive numbers of particles require a non-nested filter with fixed parameters')
+
+        super().__init__(model, particles, *args, **kwargs)
+
+        self._bounds = bounds
+        self._sizing = sizing
+        self._upper = min(uppers) if uppers else None
+        self._cap = None
+        self._pool = None
+
+        self.s_particles = list()
+
+    def reset(self, particles=None):
+        super().reset(particles)
+        self.s_particles = list()
+
+        return self
+
+    def _knobs(self):
+        return ('particles', 'iterations') if hasattr(self._proposal, '_maxiter') else ('particles',)
+
+    def _get_effort(self):
+        if self._deadline.knob == 'particles':
+            return self._old_x.shape[-1]
+
+        return self._proposal._maxiter
+
+    def _set_effort(self, value):
+        if self._deadline.knob == 'iterations':
+            self._proposal._maxiter = value
+        elif self._bounds is not None:
+            self._cap = value
+        else:
+            self._particles = value
+
+        return self
+
+    def _buffer(self, shape):
+        """
+        Returns a view of the pool of memory to draw the proposals into, which is grown to fit the upper bound on the
+        number of particles so that it's not reallocated when the number changes.
+        :param shape: The shape of the proposals
+        :type shape: tuple of int
+        :rtype: np.ndarray
+        """
+
+        size = int(np.prod(shape))
+
+        if self._pool is None or self._pool.size < size:
+            capacity = size if self._upper is None else size // shape[-1] * max(self._upper, shape[-1])
+            self._pool = np.empty(capacity)
+
+        return self._pool[:size].reshape(shape)
+
+    def _resample(self, weights, x):
+        """
+        Returns the indices of the particles to resample.
+        :param weights: The weights of the particles
+        :type weights: np.ndarray
+        :param x: The particles
+        :type x: np.ndarray
+        :rtype: np.ndarray
+        """
+
+        if self._upper is None:
+            return self._resamp(weights, rng=self._rng)
+
+        return self._resamp(weights, rng=self._rng, size=self._particles)
+
+    def _resize(self, x, weights):
+        """
+        Saves the number of particles of the current step, and chooses the number of particles to resample.
+        :param x: The particles
+        :type x: np.ndarray
+        :param weights: The weights of the particles
+        :type weights: np.ndarray
+        :return: Self
+        :rtype: SISR
+        """
+
+        if self._summarize:
+            self.s_particles.append(weights.shape[-1])
+
+        if self._bounds is not None:
+            self._particles = int(np.clip(self._sizing(x, weights), *self._bounds))
+            self._particles = self._particles if self._cap is None else min(self._particles, self._cap)
+
+        return self
+
+    def _choose(self, x, indices):
+        """
+        Chooses the resampled particles, whose number may differ from that of `x` if adaptive.
+        :param x: The particles
+        :type x: np.ndarray
+        :param indices: The resampled indices
+        :type indices: np.ndarray
+        :rtype: np.ndarray
+        """
+
+        return choose(x, indices) if self._upper is None else x[..., indices]
+
     def filter(self, y):
-        t_x = self._proposal.draw(y, self._old_x, size=self._particles)
+        # ===== Reuse the memory of the previous proposals if not saved ===== #
+
+        buffer = self._buffer(self._old_x.shape) if not self.saveall and isinstance(self._old_x, np.ndarray) else None
+        t_x = self._proposal.draw(y, self._old_x, size=self._particles, out=buffer)
         weights = self._proposal.weight(y, t_x, self._old_x)
 
-        resampled_indices = self._resamp(weights)
+        self._resize(t_x, weights)
+        resampled_indices = self._resample(weights, t_x)
 
         self._proposal = self._proposal.resample(resampled_indices)
         self._cur_x = t_x
         self._inds = resampled_indices
-        self._anc_x = self._old_x.copy()
-        self._old_x = choose(t_x, resampled_indices)
+        self._anc_x = self._old_x.copy() if self._summarize else None
+        self._old_x = self._choose(t_x, resampled_indices)
         self._old_w = weights
 
         self.s_l.append(loglikelihood(weights))
@@ -26,4 +155,4 @@ class SISR(ParticleFilter):
             self.s_x.append(t_x)
             self.s_w.append(weights)
 
-        return self._save_mean_and_noise(y, t_x, normalize(weights))
\ No newline at end of file
+        return self._save_summaries(y, t_x, weights)
\ No newline at end of file
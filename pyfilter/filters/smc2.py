@@ -1,7 +1,8 @@
 from .ness import NESS
 from ..utils.utils import get_ess, expanddims, normalize
 import numpy as np
-from ..distributions.continuous import Distribution, MultivariateNormal
+from ..distributions.continuous import MultivariateNormal
+from ..timeseries.store import ParameterStore
 from .base import KalmanFilter
 
 
@@ -9,14 +10,14 @@ def _define_pdf(params, weights):
     """
     Helper function for creating the PDF.
     :param params: The parameters to use for defining the distribution
-    :type params: tuple of tuple of Distribution
+    :type params: ParameterStore
     :param weights: The weights to use
     :type weights: np.ndarray
     :return: A truncated normal distribution
     :rtype: stats.truncnorm
     """
 
-    asarray = np.array([p.t_values for p in params])
+    asarray = params.t_values
 
     if asarray.ndim > 2:
         asarray = asarray[..., 0]
@@ -28,24 +29,24 @@ def _define_pdf(params, weights):
     return MultivariateNormal(mean, np.linalg.cholesky(cov))
 
 
-def _mcmc_move(params, dist):
+def _mcmc_move(params, dist, rng=None):
     """
     Performs an MCMC move to rejuvenate parameters.
     :param params: The parameters to use for defining the distribution
-    :type params: tuple of Distribution
+    :type params: ParameterStore
     :param dist: The distribution to use for sampling
     :type dist: stats.multivariate_normal
+    :param rng: The random number generator
+    :type rng: np.random.Generator
     :return: Samples from a truncated normal distribution
     :rtype: np.ndarray
     """
-    shape = next(p.t_values.shape for p in params)
+    shape = params.array.shape[1:]
     if len(shape) > 1:
         shape = shape[:-1]
 
-    rvs = dist.rvs(size=shape)
-
-    for p, vals in zip(params, rvs):
-        p.t_values = expanddims(vals, p.t_values.ndim)
+    rvs = dist.rvs(size=shape, rng=rng)
+    params.t_values = expanddims(rvs, params.array.ndim)
 
     return True
 
@@ -54,15 +55,15 @@ def _eval_kernel(params, dist, n_params, n_dist):
     """
     Evaluates the kernel used for performing the MCMC move.
     :param params: The current parameters
-    :type params: tuple of Distribution
+    :type params: ParameterStore
     :param n_params: The new parameters to evaluate against
-    :type n_params: tuple of Distribution
+    :type n_params: ParameterStore
     :return: The log density of the proposal kernel evaluated at `new_params`
     :rtype: np.ndarray
     """
 
-    p_vals = np.array([p.t_values for p in params])
-    n_p_vals = np.array([p.t_values for p in n_params])
+    p_vals = params.t_values
+    n_p_vals = n_params.t_values
 
     return n_dist.logpdf(p_vals) - dist.logpdf(n_p_vals)
 
@@ -83,6 +84,7 @@ class SMC2(NESS):
 
         self._th = threshold
         self._recw = 0      # type: np.ndarray
+        self._ll = 0        # type: np.ndarray
         self._ior = 0
         self._disp = disp
 
@@ -92,6 +94,7 @@ class SMC2(NESS):
 
         self._filter.filter(y)
         self._recw += self._filter.s_l[-1]
+        self._ll = self._ll + self._filter.s_l[-1]
 
         # ===== Calculate efficient number of samples ===== #
 
@@ -115,33 +118,34 @@ class SMC2(NESS):
         """
 
         # ===== Construct distribution ===== #
-        ll = np.sum(self._filter.s_l, axis=0)
-        dist = _define_pdf(self._filter.ssm.flat_theta_dists, normalize(self._recw))
+        ll = self._ll
+        dist = _define_pdf(self._filter.ssm.p_store(), normalize(self._recw))
 
         # ===== Resample among parameters ===== #
 
-        inds = self._resamp(self._recw)
+        inds = self._resamp(self._recw, rng=self._rng)
         self._filter.resample(inds)
 
         # ===== Define new filters and move via MCMC ===== #
 
         t_filt = self._filter.copy().reset()
-        _mcmc_move(t_filt.ssm.flat_theta_dists, dist)
+        _mcmc_move(t_filt.ssm.p_store(), dist, rng=self._rng)
 
         # ===== Filter data ===== #
 
-        t_filt.longfilter(self._td[:self._ior+1], bar=False)
-        t_ll = np.sum(t_filt.s_l, axis=0)
+        t_ll = t_filt.loglikelihood(self._td[:self._ior+1])
 
         # ===== Calculate acceptance ratio ===== #
-        # TODO: Might have to add gradients for transformation?
+        # The proposal is defined on the transformed parameters, hence the prior is corrected by the log-Jacobian
         quotient = t_ll - ll[inds]
+        t_store, store = t_filt.ssm.p_store(), self._filter.ssm.p_store()
         plogquot = t_filt._model.p_prior() - self._filter._model.p_prior()
-        kernel = _eval_kernel(self._filter.ssm.flat_theta_dists, dist, t_filt.ssm.flat_theta_dists, dist)
+        plogquot = plogquot + t_store.log_jacobian() - store.log_jacobian()
+        kernel = _eval_kernel(store, dist, t_store, dist)
 
         # ===== Check which to accept ===== #
 
-        u = np.log(np.random.uniform(size=quotient.shape))
+        u = np.log(self._rng.uniform(size=quotient.shape))
         if plogquot.ndim > 1:
             toaccept = u < quotient + plogquot[:, 0] + kernel[:, 0]
         else:
@@ -152,7 +156,8 @@ class SMC2(NESS):
 
         # ===== Replace old filters with newly accepted ===== #
 
-        self._filter.exchange(toaccept, t_filt)
+        self._filter.exchange(toaccept, t_filt, entire_history=False)
+        self._ll = np.where(toaccept, t_ll, ll[inds])
         self._recw = np.zeros_like(self._recw)
 
         # ===== Increase states if less than 20% are accepted ===== #
@@ -176,11 +181,15 @@ class SMC2(NESS):
         # ===== Create new filter with double the state particles ===== #
         # TODO: Something goes wrong here
         n_particles = self._filter._particles[0], 2 * self._filter._particles[1]
-        t_filt = self._filter.copy().reset(n_particles).longfilter(self._td[:self._ior+1], bar=False)
+        t_filt = self._filter.copy().reset(n_particles)
+        t_ll = t_filt.loglikelihood(self._td[:self._ior+1])
+
+        # ===== Calculate new weights and replace filter, keeping the history ===== #
 
-        # ===== Calculate new weights and replace filter ===== #
+        t_filt.s_l, t_filt.s_summaries = self._filter.s_l, self._filter.s_summaries
 
-        self._recw = np.sum(t_filt.s_l, axis=0) - np.sum(self._filter.s_l, axis=0)
+        self._recw = t_ll - self._ll
+        self._ll = t_ll
         self._filter = t_filt
 
         return self
\ No newline at end of file
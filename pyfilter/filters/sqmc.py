@@ -0,0 +1,61 @@
+import warnings
+import numpy as np
+from .sisr import SISR
+from ..utils.qmc import QMCGenerator
+from ..utils.resampling import hilbert
+
+
+def _ispow2(n):
+    """
+    Checks whether `n` is a power of 2.
+    :param n: The integer
+    :type n: int
+    :rtype: bool
+    """
+
+    return n > 0 and (n & (n - 1)) == 0
+
+
+class SQMC(SISR):
+    def __init__(self, model, particles, *args, resampling=hilbert, **kwargs):
+        """
+        Implements the Sequential quasi-Monte Carlo filter of Mathieu Gerber and Nicolas Chopin, found here:
+            https://arxiv.org/abs/1402.4039
+        The standard normal variables of the proposal and the uniforms of the resampling are taken from scrambled Sobol
+        point sets, and the particles are sorted along the Hilbert curve before resampling. Noise that is not Gaussian
+        is still drawn using plain Monte Carlo.
+        :param model: See BaseFilter
+        :param particles: The number of particles, preferably a power of 2
+        :type particles: int
+        :param resampling: Which resampling method to use, must take the particles as kwarg `x`
+        :type resampling: callable
+        :param args: See SISR
+        :param kwargs: See SISR
+        """
+
+        if isinstance(particles, tuple):
+            raise NotImplementedError('SQMC is only implemented for non-nested filters')
+
+        if kwargs.get('bounds') is not None:
+            raise NotImplementedError('SQMC requires a fixed number of particles')
+
+        if not _ispow2(particles):
+            warnings.warn('The Sobol point sets are only balanced if the number of particles is a power of 2')
+
+        super().__init__(model, particles, *args, resampling=resampling, **kwargs)
+
+    def _knobs(self):
+        return tuple(k for k in super()._knobs() if k != 'particles')
+
+    def set_seed(self, seed=None):
+        super().set_seed(seed)
+
+        # ===== The point sets are scrambled by a plain generator, as SciPy rejects the buffered one ===== #
+        scrambler = np.random.default_rng(self._seq.spawn(1)[0])
+        self._rng = QMCGenerator(self._rng, self._model.hidden_ndim, scrambler=scrambler)
+        self._proposal.set_rng(self._rng)
+
+        return self
+
+    def _resample(self, weights, x):
+        return self._resamp(weights, x=x, rng=self._rng)
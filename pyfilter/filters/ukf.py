@@ -2,7 +2,6 @@ from .base import KalmanFilter
 from ..utils.unscentedtransform import UnscentedTransform
 from ..distributions.continuous import Normal, MultivariateNormal
 import numpy as np
-from ..utils.utils import customcholesky, choose
 
 
 class UKF(KalmanFilter):
@@ -13,7 +12,8 @@ class UKF(KalmanFilter):
         :type model: See BaseFilter
         :param args: Any additional arguments
         :type args: See BaseFilter
-        :param utkwargs: Any kwargs passed to UnscentedTransform
+        :param utkwargs: Any kwargs passed to UnscentedTransform, e.g. `sqrt=True` for the square-root UKF, or
+                         `augment=True` to augment the state with the noise even if the model declares it additive
         :type utkwargs: dict
         :param kwargs: Any additional kwargs passed to `BaseFilter`
         :type kwargs: See BaseFilter
@@ -28,7 +28,7 @@ class UKF(KalmanFilter):
     def initialize(self):
         self._initialize_parameters()
         if self._particles is not None:
-            self._ut.initialize(self._model.initialize(size=self._p_particles))
+            self._ut.initialize(self._model.initialize(size=self._p_particles, rng=self._rng))
         else:
             self._ut.initialize(self._model.hidden.i_mean())
 
@@ -36,26 +36,23 @@ class UKF(KalmanFilter):
 
     def filter(self, y):
         self._ut.construct(y)
+        ychol = self._ut.ychol
 
         if self._model.obs_ndim < 2:
-            kernel = Normal(self._ut.ymean[0], np.sqrt(self._ut.ycov[0, 0]))
+            kernel = Normal(self._ut.ymean[0], ychol[0, 0])
         else:
-            kernel = MultivariateNormal(self._ut.ymean, customcholesky(self._ut.ycov))
+            kernel = MultivariateNormal(self._ut.ymean, ychol)
 
-        x = (self._ut.xmean.copy()[0] if self._model.hidden_ndim < 2 else self._ut.xmean.copy())
-
-        self.s_mx.append(x)
         self.s_l.append(kernel.logpdf(y))
 
-        self.s_n.append(self._calc_noise(y, x))
+        x = (self._ut.xmean.copy()[0] if self._model.hidden_ndim < 2 else self._ut.xmean.copy())
 
-        return self
+        return self._save_summaries(y, x)
 
     def resample(self, indices, entire_history=True):
-        self._model.p_apply(lambda x: choose(x.values, indices))
+        self._model.p_resample(indices)
 
-        self._ut._mean = choose(self._ut._mean, indices)
-        self._ut._cov = choose(self._ut._cov, indices)
+        self._ut.resample(indices)
 
         if entire_history:
             self.s_l = list(np.array(self.s_l)[:, indices])
@@ -1,19 +1,33 @@
-from ..proposals.unscented import Unscented, GlobalUnscented
+from ..proposals.unscented import Unscented, GlobalUnscented, ClusteredUnscented
 from .sisr import SISR
-from ..utils.utils import expanddims
 
 
 class UPF(SISR):
-    """
-    Implements the Unscented Particle Filter of van der Merwe et al.
-    """
-    def __init__(self, model, particles, *args, **kwargs):
-        super().__init__(model, particles, *args, proposal=Unscented(), **kwargs)
+    def __init__(self, model, particles, *args, utkwargs=None, clusters=None, **kwargs):
+        """
+        Implements the Unscented Particle Filter of van der Merwe et al.
+        :param model: See BaseFilter
+        :param particles: See BaseFilter
+        :param utkwargs: Any kwargs passed to UnscentedTransform
+        :type utkwargs: dict
+        :param clusters: If passed, the particles are grouped into this many clusters that share one unscented
+                         transform each, see `ClusteredUnscented`
+        :type clusters: int
+        :param args: See SISR
+        :param kwargs: See SISR
+        """
+
+        if clusters is not None:
+            proposal = ClusteredUnscented(clusters, **(utkwargs or {}))
+        else:
+            proposal = Unscented(**(utkwargs or {}))
+
+        super().__init__(model, particles, *args, proposal=proposal, **kwargs)
 
     def initialize(self):
         self._initialize_parameters()
-        self._old_x = self._model.initialize(self._particles)
-        self._proposal.ut.initialize(self._old_x)
+        self._old_x = self._model.initialize(self._particles, rng=self._rng)
+        self._proposal.initialize(self._old_x)
 
         return self
 
@@ -22,12 +36,12 @@ class GlobalUPF(SISR):
     """
     Implements the Global UPF of Y Zhao.
     """
-    def __init__(self, model, particles, *args, **kwargs):
-        super().__init__(model, particles, *args, proposal=GlobalUnscented(), **kwargs)
+    def __init__(self, model, particles, *args, utkwargs=None, **kwargs):
+        super().__init__(model, particles, *args, proposal=GlobalUnscented(**(utkwargs or {})), **kwargs)
 
     def initialize(self):
         self._initialize_parameters()
-        self._old_x = self._model.initialize(self._particles)
-        self._proposal.ut.initialize(expanddims(self._old_x.mean(axis=-1), self._old_x.ndim))
+        self._old_x = self._model.initialize(self._particles, rng=self._rng)
+        self._proposal.initialize(self._old_x)
 
         return self
\ No newline at end of file
@@ -1,3 +1,4 @@
 from .bootstrap import Bootstrap
 from .linearized import Linearized
-from .unscented import Unscented, GlobalUnscented
\ No newline at end of file
+from .optimal import Optimal
+from .unscented import Unscented, GlobalUnscented, ClusteredUnscented
\ No newline at end of file
@@ -13,6 +13,7 @@ class Proposal(object):
         self._model = None
         self._kernel = None
         self._nested = None
+        self._rng = None
 
         self._meaner = lambda x: x
         self._sg = None
@@ -34,13 +35,27 @@ class Proposal(object):
 
         return self
 
-    def draw(self, y, x, size=None, *args, **kwargs):
+    def set_rng(self, rng):
+        """
+        Sets the random number generator to use when drawing.
+        :param rng: The random number generator
+        :type rng: np.random.Generator
+        :return: Self
+        :rtype: Proposal
+        """
+
+        self._rng = rng
+
+        return self
+
+    def draw(self, y, x, size=None, *args, out=None, **kwargs):
         """
         Defines the method for drawing proposals.
         :param y: The current observation
         :param x: The previous hidden states
         :param size: The size which to draw
         :param args: Additional arguments
+        :param out: Optional buffer to write the proposed states to
         :param kwargs: Additional kwargs
         :return:
         """
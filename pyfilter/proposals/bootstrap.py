@@ -5,8 +5,8 @@ class Bootstrap(Proposal):
     """
     Implements the Bootstrap proposal. I.e. sampling from the prior distribution.
     """
-    def draw(self, y, x, size=None, *args, **kwargs):
-        return self._model.propagate(x)
+    def draw(self, y, x, size=None, *args, out=None, **kwargs):
+        return self._model.propagate(x, out=out, rng=self._rng)
 
     def weight(self, y, xn, xo, *args, **kwargs):
         return self._model.weight(y, xn)
\ No newline at end of file
@@ -1,62 +1,137 @@
 from .base import Proposal
-from ..distributions.continuous import Normal, MultivariateNormal
+from ..distributions.continuous import Distribution, Normal, MultivariateNormal
 import numpy as np
-from ..utils.utils import dot, customcholesky
+from ..utils.utils import dot, outerm, expanddims, customcholesky
 
 
-class Linearized(Proposal):
+def _subset(ts, mask, shape):
     """
-    Implements the Linearized proposal from "On sequential Monte Carlo sampling methods for Bayesian filtering" by
-    Doucet et al.
+    Returns the values of the parameters of `ts` for the particles selected by `mask`.
+    :param ts: The process
+    :type ts: pyfilter.timeseries.meta.Base
+    :param mask: The particles to select
+    :type mask: np.ndarray
+    :param shape: The shape of the particles
+    :type shape: tuple of int
+    :rtype: tuple of np.ndarray|tuple of float
     """
-    def draw(self, y, x, size=None, *args, **kwargs):
+
+    return tuple(
+        np.broadcast_to(v, shape)[mask] if isinstance(th, Distribution) and np.ndim(v) > 0 else v
+        for th, v in zip(ts.theta, ts.theta_vals)
+    )
+
+
+class Linearized(Proposal):
+    def __init__(self, *args, tol=1e-3, maxiter=5, **kwargs):
+        """
+        Implements the Linearized proposal from "On sequential Monte Carlo sampling methods for Bayesian filtering" by
+        Doucet et al. The Newton iterations for the mode are only carried out for the particles that have yet to
+        converge, and the particles that don't converge are drawn from the prior as in `Bootstrap`.
+        :param tol: The tolerance on the Newton step for a particle to be considered converged
+        :type tol: float
+        :param maxiter: The maximum number of Newton iterations
+        :type maxiter: int
+        """
+
+        super().__init__(*args, **kwargs)
+        self._tol = tol
+        self._maxiter = maxiter
+
+    def draw(self, y, x, size=None, *args, out=None, **kwargs):
         x = self._meaner(x)
         t_x = self._model.propagate_apf(x)
 
-        mode, variance = self._get_mode_variance(y, t_x, x)
+        mode, variance, converged = self._get_mode_variance(y, t_x, x)
+
+        # ===== Fall back to the prior for the particles where Newton failed ===== #
+        if not np.all(converged):
+            mode = np.where(converged, mode, t_x)
+            variance = np.where(converged, variance, self._prior_variance(x, variance.shape))
 
         if self._model.hidden.ndim < 2:
             self._kernel = Normal(mode, np.sqrt(variance))
         else:
             self._kernel = MultivariateNormal(mode, customcholesky(variance))
 
-        return self._kernel.rvs(size=size)
+        return self._kernel.rvs(size=size, out=out, rng=self._rng)
+
+    def _prior_variance(self, x, shape):
+        """
+        Returns the variance of the hidden process given the previous state.
+        :param x: The previous state
+        :type x: np.ndarray|float|int
+        :param shape: The shape of the variance
+        :type shape: tuple of int
+        :rtype: np.ndarray
+        """
+
+        scale = np.array(self._model.hidden.scale(x), dtype=float)
+
+        if self._model.hidden_ndim < 2:
+            return np.broadcast_to(scale ** 2, shape)
+
+        return np.broadcast_to(expanddims(outerm(scale, scale), len(shape)), shape)
 
     def _get_mode_variance(self, y, tx, x):
         """
-        Gets the first and second order derivatives.
+        Finds the mode and the negative inverse hessian at the mode by Newton iterations, where the particles are
+        dropped from the iterations once the step is smaller than the tolerance.
         :param y: The current observation to linearize around
         :type y: np.ndarray|float|int
         :param tx: The mean of the next state observation
         :type tx: np.ndarray|float|int
         :param x: The previous observation
         :type x: np.ndarray|float|int
-        :return: The mode and negative hessian
-        :rtype: tuple of np.ndarray|tuple of float
+        :return: The mode, the negative inverse hessian, and whether each particle converged to a mode
+        :rtype: tuple of np.ndarray
         """
 
-        mode = tx
-        converged = False
-        iters = 0
-        hess = None
-        oldmode = tx.copy()
-        while not converged:
-            first, hess = self._sg.gradient(y, mode, x), self._sg.hess(y, mode, x)
+        ndim = self._model.hidden_ndim
+
+        mode = np.array(tx, dtype=float)
+        x = np.broadcast_to(x, mode.shape)
+
+        shape = mode.shape[1:] if ndim > 1 else mode.shape
+        variance = np.empty((ndim, ndim, *shape) if ndim > 1 else shape)
+
+        active = np.ones(shape, dtype=bool)
+        converged = np.zeros(shape, dtype=bool)
+
+        for _ in range(self._maxiter):
+            params = _subset(self._model.hidden, active, shape), _subset(self._model.observable, active, shape)
 
-            if self._model.hidden_ndim < 2:
-                mode -= hess * first
-            else:
-                mode -= dot(hess, first)
+            xa, oldxa = mode[..., active], x[..., active]
+            first, hess = self._sg.gradient(y, xa, oldxa, params=params), self._sg.hess(y, xa, oldxa)
 
-            diff = np.abs(mode - oldmode)
-            if np.all(diff < 1e-3) or iters > 3:
-                converged = True
+            step = hess * first if ndim < 2 else dot(hess, first)
+
+            mode[..., active] -= step
+            variance[..., active] = -hess
+
+            done = np.abs(step) < self._tol
+            done = done if ndim < 2 else done.all(axis=0)
+
+            converged[active] = done
+            active[active] = ~done
+
+            if not active.any():
+                break
+
+        # ===== A mode requires a finite and negative definite hessian ===== #
+        if ndim < 2:
+            finite = np.isfinite(mode) & np.isfinite(variance)
+            variance[~finite] = 1.
+
+            posdef = variance > 0
+        else:
+            finite = np.isfinite(mode).all(axis=0) & np.isfinite(variance).all(axis=(0, 1))
+            variance[..., ~finite] = np.eye(ndim)[..., None]
 
-            iters += 1
-            oldmode = mode.copy()
+            posdef = np.linalg.eigvalsh(np.moveaxis(variance, (0, 1), (-2, -1))).min(axis=-1) > 0
 
-        return mode, -hess
+        return mode, variance, converged & finite & posdef
 
     def weight(self, y, xn, xo, *args, **kwargs):
         correction = self._kernel.logpdf(xn)
-        return self._model.weight(y, xn) + self._model.h_weight(xn, xo) - correction
\ No newline at end of file
+        return self._model.weight(y, xn) + self._model.h_weight(xn, xo) - correction
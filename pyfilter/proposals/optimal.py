@@ -0,0 +1,126 @@
+from .base import Proposal
+from ..distributions.continuous import Normal, MultivariateNormal
+from ..utils.utils import dot, mdot, outerm, expanddims, customcholesky, trisolve
+import numpy as np
+
+
+class Optimal(Proposal):
+    def __init__(self, *args, loading=None, **kwargs):
+        """
+        Implements the locally optimal proposal for models with Gaussian transitions and observations that are
+        Gaussian and linear in the state, i.e. `y_t = H * x_t + b + e_t`. The states are then drawn from the exact
+        distribution of `x_t` given `x_{t-1}` and `y_t`, and weighted by the predictive likelihood of `y_t` given
+        `x_{t-1}`, see "On sequential Monte Carlo sampling methods for Bayesian filtering" by Doucet et al.
+        :param loading: The matrix `H` as a function of the parameters of the observable, of shape
+                        (obs ndim, hidden ndim, ...), where the axes of one-dimensional processes are dropped. If None,
+                        it's evaluated from the mean of the observable by differences, which are exact for linear
+                        functions, and a `ValueError` is raised if the observable isn't linear in the state
+        :type loading: callable
+        """
+
+        super().__init__(*args, **kwargs)
+        self._loading = loading
+        self._predictive = None
+
+    def set_model(self, model, nested=False):
+        for ts in (model.hidden, model.observable):
+            if not isinstance(ts.noise, (Normal, MultivariateNormal)):
+                raise ValueError('The optimal proposal requires Gaussian noise, got `{}`'.format(ts.noise))
+
+        return super().set_model(model, nested)
+
+    def _squeeze(self, x):
+        """
+        Removes the leading axis of the state of one-dimensional hidden processes.
+        :param x: The state, of shape (hidden ndim, ...)
+        :type x: np.ndarray
+        :rtype: np.ndarray
+        """
+
+        return x[0] if self._model.hidden_ndim < 2 else x
+
+    def _covariance(self, ts, x, ndim):
+        """
+        Returns the covariance of the noise of `ts` given the state `x`.
+        :param ts: The process
+        :type ts: pyfilter.timeseries.meta.Base
+        :param x: The state
+        :type x: np.ndarray
+        :param ndim: The number of dimensions of the covariance
+        :type ndim: int
+        :rtype: np.ndarray
+        """
+
+        scale = np.array(ts.scale(x), dtype=float)
+        cov = scale[None, None] ** 2 if ts.ndim < 2 else outerm(scale, scale)
+
+        return expanddims(cov, ndim)
+
+    def _linearize(self, x):
+        """
+        Evaluates the mean of the observable at `x`, and the loading matrix.
+        :param x: The state, of shape (hidden ndim, ...)
+        :type x: np.ndarray
+        :return: The mean, of shape (obs ndim, ...), and the loading, of shape (obs ndim, hidden ndim, ...)
+        :rtype: tuple of np.ndarray
+        """
+
+        obs, hdim = self._model.observable, x.shape[0]
+        atleast = (lambda u: u[None]) if obs.ndim < 2 else (lambda u: u)
+
+        if self._loading is not None:
+            loading = np.array(self._loading(*obs.theta_vals), dtype=float)
+            loading = loading[:, None] if hdim < 2 else loading
+            loading = expanddims(atleast(loading), x.ndim + 1)
+
+            return atleast(np.array(obs.mean(self._squeeze(x)), dtype=float)), loading
+
+        # ===== Evaluate the centre and unit steps along each axis in one call ===== #
+        offsets = np.concatenate((np.zeros((hdim, 1)), np.eye(hdim), -np.eye(hdim)), axis=1)
+        points = x[:, None] + offsets.reshape(offsets.shape + (1,) * (x.ndim - 1))
+
+        out = atleast(np.array(obs.mean(self._squeeze(points)), dtype=float))
+        out = np.broadcast_to(out, (obs.ndim, *points.shape[1:]))
+
+        mid, up, low = out[:, :1], out[:, 1:hdim + 1], out[:, hdim + 1:]
+
+        if not np.allclose(up + low, 2 * mid):
+            raise ValueError('The optimal proposal requires an observable that is linear in the state')
+
+        return mid[:, 0], (up - low) / 2
+
+    def draw(self, y, x, size=None, *args, out=None, **kwargs):
+        x = self._meaner(x)
+        hidden, obs = self._model.hidden, self._model.observable
+
+        mean = np.array(hidden.mean(x), dtype=float)
+        mean = mean[None] if hidden.ndim < 2 else mean
+
+        cov = self._covariance(hidden, x, mean.ndim + 1)
+
+        # ===== Condition the transition on the observation ===== #
+        ymean, loading = self._linearize(mean)
+
+        xycov = outerm(cov, loading)
+        ycov = mdot(loading, xycov) + self._covariance(obs, self._squeeze(mean), mean.ndim + 1)
+
+        if obs.ndim < 2:
+            gain = xycov / ycov[0, 0]
+            self._predictive = Normal(ymean[0], np.sqrt(ycov[0, 0])).logpdf(y)
+        else:
+            ychol = customcholesky(ycov)
+            gain = np.swapaxes(trisolve(ychol, trisolve(ychol, np.swapaxes(xycov, 0, 1)), trans=True), 0, 1)
+            self._predictive = MultivariateNormal(ymean, ychol).logpdf(y)
+
+        mean = mean + dot(gain, np.reshape(y, (-1,) + (1,) * (ymean.ndim - 1)) - ymean)
+        cov = cov - mdot(gain, outerm(ycov, gain))
+
+        if hidden.ndim < 2:
+            self._kernel = Normal(mean[0], np.sqrt(cov[0, 0]))
+        else:
+            self._kernel = MultivariateNormal(mean, customcholesky(cov))
+
+        return self._kernel.rvs(size=size, out=out, rng=self._rng)
+
+    def weight(self, y, xn, xo, *args, **kwargs):
+        return self._predictive
@@ -1,8 +1,9 @@
 from ..proposals import Linearized
 import numpy as np
-from ..utils.utils import choose, customcholesky
 from ..utils.unscentedtransform import UnscentedTransform
 from ..distributions.continuous import MultivariateNormal, Normal
+from ..utils.qmc import hilbert_sort
+from ..utils.utils import expanddims
 
 
 class Unscented(Linearized):
@@ -21,33 +22,118 @@ class Unscented(Linearized):
 
         return self
 
-    def draw(self, y, x, size=None, *args, **kwargs):
-        mean, cov = self.ut.construct(y)
+    def initialize(self, x):
+        """
+        Initializes the unscented transform given the initial states.
+        :param x: The initial states
+        :type x: np.ndarray
+        :return: Self
+        :rtype: Unscented
+        """
+
+        self.ut.initialize(x)
+
+        return self
+
+    def draw(self, y, x, size=None, *args, out=None, **kwargs):
+        mean = self.ut.construct(y)
 
         if self._model.hidden_ndim > 1:
-            self._kernel = MultivariateNormal(mean, customcholesky(cov))
+            self._kernel = MultivariateNormal(mean, self.ut.xchol)
         else:
-            self._kernel = Normal(mean[0], np.sqrt(cov[0, 0]))
+            self._kernel = Normal(mean[0], self.ut.xchol[0, 0])
 
-        return self._kernel.rvs(size=size)
+        return self._kernel.rvs(size=size, out=out, rng=self._rng)
 
     def resample(self, inds):
-        self.ut._mean = choose(self.ut._mean, inds)
-        self.ut._cov = choose(self.ut._cov, inds)
+        self.ut.resample(inds)
 
         return self
 
 
 class GlobalUnscented(Unscented):
-    def draw(self, y, x, size=None, *args, **kwargs):
-        mean, cov = self.ut.globalconstruct(y, x)
+    def initialize(self, x):
+        self.ut.initialize(expanddims(x.mean(axis=-1), x.ndim))
+
+        return self
+
+    def draw(self, y, x, size=None, *args, out=None, **kwargs):
+        mean = self.ut.globalconstruct(y, x, rng=self._rng)
 
         if self._model.hidden_ndim > 1:
-            self._kernel = MultivariateNormal(mean, customcholesky(cov))
+            self._kernel = MultivariateNormal(mean, self.ut.xchol)
         else:
-            self._kernel = Normal(mean[0], np.sqrt(cov[0, 0]))
+            self._kernel = Normal(mean[0], self.ut.xchol[0, 0])
 
-        return self._kernel.rvs(size=size)
+        return self._kernel.rvs(size=size, out=out, rng=self._rng)
 
     def resample(self, inds):
-        return self
\ No newline at end of file
+        return self
+
+
+def _cluster(x, clusters):
+    """
+    Groups the states into clusters of equal size along the Hilbert curve, i.e. by quantile in one dimension.
+    :param x: The states
+    :type x: np.ndarray
+    :param clusters: The number of clusters
+    :type clusters: int
+    :return: The cluster of each state
+    :rtype: np.ndarray
+    """
+
+    order = hilbert_sort(x)
+
+    labels = np.empty(order.size, dtype=int)
+    labels[order] = np.arange(order.size) * clusters // order.size
+
+    return labels
+
+
+class ClusteredUnscented(GlobalUnscented):
+    def __init__(self, clusters=16, **utkwargs):
+        """
+        Implements a cluster-shared version of the Unscented proposal. The particles are grouped into `clusters`
+        clusters of equal size along the Hilbert curve, and one unscented transform is constructed per cluster using
+        the mean and covariance of its particles as prior. Each particle is then drawn from the Gaussian of its
+        cluster, so that the cost scales with the number of clusters rather than the number of particles.
+        :param clusters: The number of clusters
+        :type clusters: int
+        :param utkwargs: Any kwargs passed to UnscentedTransform
+        """
+
+        super().__init__(**utkwargs)
+        self._clusters = clusters
+        self._labels = None
+
+    def set_model(self, model, nested=False):
+        if nested:
+            raise NotImplementedError('The clustered Unscented proposal is only implemented for non-nested filters')
+
+        return super().set_model(model, nested)
+
+    def initialize(self, x):
+        clusters = min(self._clusters, x.shape[-1])
+        labels = _cluster(x, clusters)
+
+        counts = np.bincount(labels, minlength=clusters)
+        if self._model.hidden_ndim > 1:
+            mean = np.stack([np.bincount(labels, weights=u, minlength=clusters) for u in x]) / counts
+        else:
+            mean = np.bincount(labels, weights=x, minlength=clusters) / counts
+
+        self.ut.initialize(mean)
+
+        return self
+
+    def draw(self, y, x, size=None, *args, out=None, **kwargs):
+        labels = _cluster(x, self.ut.xmean.shape[-1])
+        mean = self.ut.clusterconstruct(y, x, labels)
+        chol = self.ut.xchol
+
+        if self._model.hidden_ndim > 1:
+            self._kernel = MultivariateNormal(mean[:, labels], chol[:, :, labels])
+        else:
+            self._kernel = Normal(mean[0, labels], chol[0, 0, labels])
+
+        return self._kernel.rvs(size=size, out=out, rng=self._rng)
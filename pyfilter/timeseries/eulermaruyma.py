@@ -4,7 +4,7 @@ from ..utils.utils import resizer
 
 
 class EulerMaruyma(Base):
-    def __init__(self, initial, funcs, theta, noise, dt=1):
+    def __init__(self, initial, funcs, theta, noise, dt=1, grads=None, jit=False, additive=False):
         """
         Implements the Euler-Maruyama scheme.
         :param initial: See Base
@@ -13,13 +13,25 @@ class EulerMaruyma(Base):
         :param noise: See Base
         :param dt: The step-size to use in the approximation. If `dt=1`, is basically AR process
         :type dt: float
+        :param grads: See Base
+        :param jit: See Base
+        :param additive: See Base
         """
-        super().__init__(initial, funcs, theta, noise)
+        super().__init__(initial, funcs, theta, noise, grads=grads, jit=jit, additive=additive)
 
         self.dt = dt
 
+    def _get_kernels(self, initial=False, dt=None):
+        return super()._get_kernels(initial, dt=None if initial else self.dt)
+
     def mean(self, x, params=None):
         return x + resizer(self.f(x, *(params or self.theta_vals))) * self.dt
 
     def scale(self, x, params=None):
         return resizer(self.g(x, *(params or self.theta_vals))) * sqrt(self.dt)
+
+    def mean_grad(self, x, params=None):
+        return tuple(d * self.dt for d in super().mean_grad(x, params))
+
+    def scale_grad(self, x, params=None):
+        return tuple(d * sqrt(self.dt) for d in super().scale_grad(x, params))
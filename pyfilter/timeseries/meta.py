@@ -1,10 +1,29 @@
 import numpy as np
-from ..distributions.continuous import Distribution
+from ..distributions.continuous import Distribution, Normal
 from ..utils.utils import resizer
+from ..utils.jit import get_kernels, standard_normal
+
+
+def _rvskwargs(noise, rng=None, out=None):
+    """
+    Returns the kwargs for sampling from `noise`, which is either a `Distribution` or a SciPy distribution.
+    :param noise: The noise distribution
+    :type noise: Distribution|scipy.stats.rv_continuous
+    :param rng: The random number generator
+    :type rng: np.random.Generator
+    :param out: Optional buffer to write the samples to, only supported by `Distribution`
+    :type out: np.ndarray
+    :rtype: dict
+    """
+
+    if not isinstance(noise, Distribution):
+        return {'random_state': rng} if rng is not None else {}
+
+    return {k: v for k, v in [('rng', rng), ('out', out)] if v is not None}
 
 
 class Base(object):
-    def __init__(self, initial, funcs, theta, noise, q=None):
+    def __init__(self, initial, funcs, theta, noise, q=None, grads=None, jit=False, additive=False):
         """
         This object is to serve as a base class for the timeseries models.
         :param initial: The functions governing the initial dynamics of the process
@@ -17,6 +36,17 @@ class Base(object):
         :type noise: (Distribution, Distribution)
         :param q: The correlation of the noise processes
         :type q: numpy.ndarray
+        :param grads: The analytical gradients of `funcs` with respect to the parameters. Each function should return
+                      the partial derivatives in the same order as `theta`
+        :type grads: tuple of callable
+        :param jit: Whether to compile the functions together with the density and sampling of the noise into fused
+                    kernels using numba. Only applies to `Normal` noise and requires that the functions can be
+                    evaluated on scalars. If numba isn't installed, NumPy is used
+        :type jit: bool
+        :param additive: Whether the noise is additive, i.e. whether the scale of the process does not depend on the
+                         state, but possibly on the parameters. Allows the unscented transform to add the covariance of
+                         the noise analytically instead of augmenting the state with it
+        :type additive: bool
         """
 
         self.f0, self.g0 = initial
@@ -24,6 +54,9 @@ class Base(object):
         self._theta = theta           # We save the original inputs if is of `Distribution`
         self.noise0, self.noise = noise
         self.q = q
+        self.grads = grads
+        self.jit = jit
+        self.additive = additive
 
     @property
     def theta(self):
@@ -70,6 +103,25 @@ class Base(object):
         """
         return tuple(self.theta)
 
+    def _get_kernels(self, initial=False, dt=None):
+        """
+        Returns the fused kernels of the process if `jit` is enabled.
+        :param initial: Whether to return the kernels of the initial distribution
+        :type initial: bool
+        :param dt: The step size if the process is discretized using the Euler-Maruyama scheme
+        :type dt: float
+        :rtype: pyfilter.utils.jit.Kernels
+        """
+
+        noise = self.noise0 if initial else self.noise
+        if not self.jit or type(noise) is not Normal:
+            return None
+
+        if initial:
+            return get_kernels(self.f0, self.g0, len(self.theta), initial=True)
+
+        return get_kernels(self.f, self.g, len(self.theta), dt=dt)
+
     def i_mean(self, params=None):
         """
         Calculates the mean of the initial distribution.
@@ -103,6 +155,12 @@ class Base(object):
         :rtype: np.ndarray
         """
 
+        kernels = self._get_kernels(initial=True)
+        if kernels is not None:
+            out = kernels.weight(x, *(params or self.theta_vals))
+            if out is not None:
+                return out
+
         return self.noise0.logpdf(x, loc=self.i_mean(params), scale=self.i_scale(params))
 
     def mean(self, x, params=None):
@@ -145,35 +203,56 @@ class Base(object):
         :rtype: np.ndarray|float
         """
 
+        kernels = self._get_kernels()
+        if kernels is not None:
+            out = kernels.weight(y, x, *(params or self.theta_vals))
+            if out is not None:
+                return out
+
         return self.noise.logpdf(y, loc=self.mean(x, params=params), scale=self.scale(x, params=params))
 
-    def i_sample(self, size=None, **kwargs):
+    def i_sample(self, size=None, rng=None, **kwargs):
         """
         Samples from the initial distribution.
         :param size: The number of samples
         :type size: int|tuple of int
+        :param rng: The random number generator to use, defaults to the global NumPy random state
+        :type rng: np.random.Generator
         :param kwargs: kwargs passed to the noise class
         :return: Samples from the initial distribution
         :rtype: np.ndarray|float|int
         """
 
-        return self.noise0.rvs(loc=self.i_mean(), scale=self.i_scale(), size=size, **kwargs)
+        rvskwargs = _rvskwargs(self.noise0, rng=rng)
+
+        return self.noise0.rvs(loc=self.i_mean(), scale=self.i_scale(), size=size, **rvskwargs, **kwargs)
 
-    def propagate(self, x, params=None):
+    def propagate(self, x, params=None, out=None, rng=None):
         """
         Propagates the model forward conditional on the previous state and current parameters.
         :param x: The previous state
         :type x: np.ndarray|float|int
         :param params: Used for overriding the parameters
         :type params: tuple of np.ndarray|float|int
+        :param out: Optional buffer of the same shape as the samples, used if the noise supports it
+        :type out: np.ndarray
+        :param rng: The random number generator to use, defaults to the global NumPy random state
+        :type rng: np.random.Generator
         :return: Samples from the model
         :rtype: np.ndarray|float|int
         """
 
+        kernels = self._get_kernels()
+        if kernels is not None:
+            params = params or self.theta_vals
+            res = kernels.propagate(standard_normal(x, *params, rng=rng), x, *params, out=out)
+            if res is not None:
+                return res
+
         loc = self.mean(x, params)
         scale = self.scale(x, params)
 
-        return self.noise.rvs(loc=loc, scale=scale)
+        return self.noise.rvs(loc=loc, scale=scale, **_rvskwargs(self.noise, rng=rng, out=out))
 
     def sample(self, steps, samples=None, **kwargs):
         """
@@ -244,9 +323,36 @@ class Base(object):
 
         return out
 
+    def mean_grad(self, x, params=None):
+        """
+        Calculates the analytical gradient of the mean with respect to the parameters.
+        :param x: The state of the process
+        :type x: np.ndarray|float|int
+        :param params: Used for overriding the parameters
+        :type params: tuple of np.ndarray|float|int
+        :return: The gradient for each of the parameters
+        :rtype: tuple of np.ndarray|float
+        """
+
+        return tuple(resizer(d) for d in self.grads[0](x, *(params or self.theta_vals)))
+
+    def scale_grad(self, x, params=None):
+        """
+        Calculates the analytical gradient of the scale with respect to the parameters.
+        :param x: The state of the process
+        :type x: np.ndarray|float|int
+        :param params: Used for overriding the parameters
+        :type params: tuple of np.ndarray|float|int
+        :return: The gradient for each of the parameters
+        :rtype: tuple of np.ndarray|float
+        """
+
+        return tuple(resizer(d) for d in self.grads[1](x, *(params or self.theta_vals)))
+
     def p_grad(self, y, x, h=1e-3):
         """
-        Calculates the gradient of the model parameters for current state `y` with the previous state `x`.
+        Calculates the gradient of the model parameters for current state `y` with the previous state `x`. Uses the
+        analytical gradients if `grads` was passed, else a central finite difference approximation.
         :param y: The current state
         :type y: np.ndarray|float|int
         :param x: The previous state
@@ -254,16 +360,108 @@ class Base(object):
         :param h: The step size
         :type h: float
         :return: The gradient of the model parameters
-        :rtype: np.ndarray|float
+        :rtype: tuple of np.ndarray|float
         """
 
+        if self.grads is not None:
+            return self._p_grad_analytical(y, x)
+
+        return self._p_grad_numerical(y, x, h)
+
+    def _p_grad_analytical(self, y, x):
+        """
+        Calculates the gradient of the model parameters via the chain rule using the analytical gradients of the
+        functions governing the dynamics.
+        :param y: The current state
+        :type y: np.ndarray|float|int
+        :param x: The previous state
+        :type x: np.ndarray|float
+        :return: The gradient of the model parameters
+        :rtype: tuple of np.ndarray|float
+        """
+
+        dloc, dscale = self.noise.logpdf_grad(y, loc=self.mean(x), scale=self.scale(x))
+
         out = tuple()
-        for i, (p, op) in enumerate(zip(self.theta, self._o_theta)):
-            if isinstance(op, Distribution):
-                up, low = list(self.theta).copy(), list(self.theta).copy()
-                up[i], low[i] = p + h, p - h
-                out += ((self.weight(y, x, params=up) - self.weight(y, x, params=low)) / 2 / h,)
+        for p, dm, ds in zip(self.theta, self.mean_grad(x), self.scale_grad(x)):
+            if isinstance(p, Distribution):
+                out += (dloc * dm + dscale * ds,)
             else:
-                out += (np.zeros_like(x),)
+                out += (np.zeros_like(dloc),)
+
+        return out
+
+    def _p_grad_numerical(self, y, x, h):
+        """
+        Calculates the gradient of the model parameters using central finite differences. All of the perturbed
+        parameter sets are stacked along a new axis, placed in front of the particle axes, such that the model only is
+        evaluated once.
+        :param y: The current state
+        :type y: np.ndarray|float|int
+        :param x: The previous state
+        :type x: np.ndarray|float
+        :param h: The step size
+        :type h: float
+        :return: The gradient of the model parameters
+        :rtype: tuple of np.ndarray|float
+        """
+
+        dists = self.theta_dists
+        if len(dists) < 1:
+            return tuple(np.zeros_like(self.weight(y, x)) for _ in self.theta)
+
+        # ===== Stack the perturbed parameters ===== #
+
+        k = 2 * len(dists)
+        pshape = np.shape(dists[0].values)
+
+        params = tuple()
+        j = 0
+        for p in self.theta:
+            if not isinstance(p, Distribution):
+                params += (p,)
+                continue
+
+            stacked = np.empty((k, *np.shape(p.values)))
+            stacked[:] = p.values
+            stacked[2 * j] += h
+            stacked[2 * j + 1] -= h
+
+            params += (stacked,)
+            j += 1
+
+        # ===== Evaluate all perturbations at once ===== #
+
+        w = self.weight(_stack(y, k, pshape), _stack(x, k, pshape), params=params)
+
+        out = tuple()
+        j = 0
+        for p in self.theta:
+            if isinstance(p, Distribution):
+                out += ((w[2 * j] - w[2 * j + 1]) / 2 / h,)
+                j += 1
+            else:
+                out += (np.zeros_like(w[0]),)
+
+        return out
+
+
+def _stack(x, k, pshape):
+    """
+    Helper function for inserting an axis of size `k` between the state axes and the particle axes of `x`.
+    :param x: The state
+    :type x: np.ndarray|float|int
+    :param k: The size of the new axis
+    :type k: int
+    :param pshape: The shape of the parameter particles
+    :type pshape: tuple of int
+    :return: A broadcasted view of the state
+    :rtype: np.ndarray|float|int
+    """
+
+    if not isinstance(x, np.ndarray):
+        return x
+
+    axis = max(x.ndim - len(pshape), 0)
 
-        return out
\ No newline at end of file
+    return np.broadcast_to(np.expand_dims(x, axis), (*x.shape[:axis], k, *x.shape[axis:]))
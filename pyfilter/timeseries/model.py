@@ -2,6 +2,7 @@ import copy
 from ..distributions.continuous import Distribution
 import numpy as np
 from ..utils.utils import flatten
+from .store import ParameterStore
 
 
 def _get_params(parameters):
@@ -29,6 +30,8 @@ class StateSpaceModel(object):
         self.hidden = hidden
         self.observable = observable
 
+        self._store = None
+
     @property
     def theta_dists(self):
         """
@@ -49,6 +52,19 @@ class StateSpaceModel(object):
 
         return flatten(self.theta_dists)
 
+    def p_store(self):
+        """
+        Returns the store holding the values of all parameter distributions of the model in one contiguous array of
+        shape (# parameters, # particles, ...). The store is rebuilt if the parameters of the model have been replaced.
+        :rtype: ParameterStore
+        """
+
+        dists = self.flat_theta_dists
+        if self._store is None or not self._store.attached(dists):
+            self._store = ParameterStore(dists)
+
+        return self._store
+
     @property
     def hidden_ndim(self):
         """
@@ -80,16 +96,20 @@ class StateSpaceModel(object):
 
         return self.hidden.i_sample(size, **kwargs)
 
-    def propagate(self, x):
+    def propagate(self, x, out=None, rng=None):
         """
         Propagates the state conditional on the previous state, and parameters.
         :param x: Previous state
         :type x: np.ndarray|float|int
+        :param out: Optional buffer to write the next state to
+        :type out: np.ndarray
+        :param rng: The random number generator to use, defaults to the global NumPy random state
+        :type rng: np.random.Generator
         :return: Next sampled state
         :rtype: np.ndarray|float|int
         """
 
-        return self.hidden.propagate(x)
+        return self.hidden.propagate(x, out=out, rng=rng)
 
     def weight(self, y, x, params=None):
         """
@@ -121,28 +141,30 @@ class StateSpaceModel(object):
 
         return self.hidden.weight(y, x, params)
 
-    def sample(self, steps, x_s=None):
+    def sample(self, steps, x_s=None, rng=None):
         """
         Constructs a sample trajectory for both the observable and the hidden process.
         :param steps: The number of steps
         :type steps: int
         :param x_s: The starting value
         :type x_s: np.ndarray|float|int
+        :param rng: The random number generator to use, defaults to the global NumPy random state
+        :type rng: np.random.Generator
         :return: Sampled trajectories
         :rtype: tuple of list
         """
 
         hidden, obs = list(), list()
 
-        x = x_s if x_s is not None else self.initialize()
-        y = self.observable.propagate(x)
+        x = x_s if x_s is not None else self.initialize(rng=rng)
+        y = self.observable.propagate(x, rng=rng)
 
         hidden.append(x)
         obs.append(y)
 
         for i in range(1, steps):
-            x = self.propagate(x)
-            y = self.observable.propagate(x)
+            x = self.propagate(x, rng=rng)
+            y = self.observable.propagate(x, rng=rng)
 
             hidden.append(x)
             obs.append(y)
@@ -223,6 +245,20 @@ class StateSpaceModel(object):
 
         return self.hidden.p_grad(x, xo, h=h), self.observable.p_grad(y, x, h=h)
 
+    def p_resample(self, indices):
+        """
+        Resamples the parameters of the model along the particle axis.
+        :param indices: The indices to choose
+        :type indices: np.ndarray
+        :return: Self
+        :rtype: StateSpaceModel
+        """
+
+        if len(self.flat_theta_dists) > 0:
+            self.p_store().resample(indices)
+
+        return self
+
     def exchange(self, indices, newmodel):
         """
         Exchanges the parameters of `self` with `newmodel` at indices.
@@ -234,16 +270,7 @@ class StateSpaceModel(object):
         :rtype: StateSpaceModel
         """
 
-        # ===== Exchange hidden parameters ===== #
-
-        for newp, oldp in zip(newmodel.hidden.theta, self.hidden.theta):
-            if isinstance(newp, Distribution):
-                oldp.values[indices] = newp.values[indices]
-
-        # ===== Exchange observable parameters ====== #
-
-        for newp, oldp in zip(newmodel.observable.theta, self.observable.theta):
-            if isinstance(newp, Distribution):
-                oldp.values[indices] = newp.values[indices]
+        if len(self.flat_theta_dists) > 0:
+            self.p_store().exchange(indices, newmodel.p_store())
 
         return self
\ No newline at end of file
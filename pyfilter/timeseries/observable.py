@@ -3,7 +3,7 @@ from ..distributions.continuous import Distribution
 
 
 class Observable(Base):
-    def __init__(self, funcs, theta, noise):
+    def __init__(self, funcs, theta, noise, grads=None, jit=False, additive=False):
         """
         Object for defining the observable part of an HMM.
         :param funcs: The functions governing the dynamics of the process
@@ -12,5 +12,11 @@ class Observable(Base):
         :type theta: tuple of np.ndarray|tuple of float|tuple of Distribution
         :param noise: The noise governing the noise process
         :type noise: Distribution
+        :param grads: See Base
+        :type grads: tuple of callable
+        :param jit: See Base
+        :type jit: bool
+        :param additive: See Base
+        :type additive: bool
         """
-        super().__init__((None, None), funcs, theta, (None, noise))
\ No newline at end of file
+        super().__init__((None, None), funcs, theta, (None, noise), grads=grads, jit=jit, additive=additive)
\ No newline at end of file
@@ -0,0 +1,103 @@
+import numpy as np
+from ..distributions.transforms import StackedTransform
+
+
+class ParameterStore(object):
+    def __init__(self, dists):
+        """
+        Stores the values of the parameter distributions of a model in one contiguous array of shape
+        (# parameters, # particles, ...). Each distribution is attached to its row of the array, and reads and writes
+        its values through it. As the distributions only reference the store, copies of the model remain consistent. The
+        transforms of the distributions are applied to the whole array at once.
+        :param dists: The parameter distributions, must all have been sampled with the same size
+        :type dists: list of pyfilter.distributions.continuous.Distribution
+        """
+
+        self.dists = tuple(dict.fromkeys(dists))
+
+        shapes = set(np.shape(d.values) for d in self.dists)
+        if len(shapes) != 1 or () in shapes:
+            raise ValueError('All parameters must be arrays of the same shape, got: {}'.format(shapes))
+
+        self.array = np.stack([d.values for d in self.dists]).astype(float)
+
+        for i, d in enumerate(self.dists):
+            d.attach(self, i)
+
+        self.transform = StackedTransform(self.dists, self.array.ndim)
+
+    def attached(self, dists):
+        """
+        Checks whether `dists` are the distributions attached to the store.
+        :param dists: The parameter distributions
+        :type dists: list of pyfilter.distributions.continuous.Distribution
+        :rtype: bool
+        """
+
+        dists = tuple(dict.fromkeys(dists))
+
+        if len(dists) != len(self.dists):
+            return False
+
+        return all(d is s and d._store is self for d, s in zip(dists, self.dists))
+
+    @property
+    def t_values(self):
+        """
+        Returns the transformed values of all parameters.
+        :rtype: np.ndarray
+        """
+
+        return self.transform.transform(self.array)
+
+    @t_values.setter
+    def t_values(self, x):
+        """
+        Sets the transformed values of all parameters. The values are only validated if `Distribution.debug` is set.
+        :param x: The transformed values, of the same shape as `array`
+        :type x: np.ndarray
+        """
+
+        if any(d.debug for d in self.dists):
+            for d, v in zip(self.dists, x):
+                d.t_values = v
+
+            return
+
+        self.array[...] = self.transform.inverse_transform(x)
+
+    def log_jacobian(self):
+        """
+        Returns the log-Jacobian of the inverse transforms at the current values, summed over the parameters.
+        :rtype: np.ndarray
+        """
+
+        return self.transform.log_jacobian(self.t_values)
+
+    def resample(self, indices):
+        """
+        Resamples the parameters along the particle axis.
+        :param indices: The indices to choose
+        :type indices: np.ndarray
+        :return: Self
+        :rtype: ParameterStore
+        """
+
+        self.array = self.array[:, indices]
+
+        return self
+
+    def exchange(self, indices, store):
+        """
+        Exchanges the parameters of `self` with those of `store` at `indices`.
+        :param indices: The indices to exchange
+        :type indices: np.ndarray
+        :param store: The store to exchange with
+        :type store: ParameterStore
+        :return: Self
+        :rtype: ParameterStore
+        """
+
+        self.array[:, indices] = store.array[:, indices]
+
+        return self
@@ -0,0 +1,64 @@
+from collections import deque
+import numpy as np
+
+
+class Deadline(object):
+    def __init__(self, budget, bounds, knob='particles', quantile=0.95, window=20):
+        """
+        Controls the effort of a filter, i.e. the number of particles or of inner iterations, such that the `quantile`
+        of the time of a call to `filter` is at most `budget`. The time of a step is modelled as proportional to the
+        effort, where the cost per unit of effort is the `quantile` of the costs of the last `window` steps. As the
+        cost per unit includes the fixed overhead of a step, this converges to the largest effort meeting the budget
+        if the time is affine in the effort. Every decision is saved in `log`.
+        :param budget: The target latency in seconds
+        :type budget: float
+        :param bounds: The lower and upper bound on the effort, which must be positive
+        :type bounds: (int, int)
+        :param knob: What to control, either 'particles' or 'iterations', where the filter must support the knob
+        :type knob: str
+        :param quantile: The quantile of the time of a step to keep within the budget
+        :type quantile: float
+        :param window: The number of recent steps to estimate the quantile from
+        :type window: int
+        """
+
+        if knob not in ('particles', 'iterations'):
+            raise ValueError('`knob` must be either \'particles\' or \'iterations\', got `{}`'.format(knob))
+
+        self.budget = budget
+        self.bounds = bounds
+        self.knob = knob
+        self.quantile = quantile
+
+        self._costs = deque(maxlen=window)
+        self.log = list()
+
+    def update(self, elapsed, effort):
+        """
+        Records the time of a step taken with `effort`, and returns the effort to use for the next step.
+        :param elapsed: The time of the step in seconds
+        :type elapsed: float
+        :param effort: The effort of the step
+        :type effort: int
+        :rtype: int
+        """
+
+        self._costs.append(elapsed / effort)
+        cost = np.quantile(self._costs, self.quantile)
+
+        new = int(np.clip(np.floor(self.budget / cost), *self.bounds))
+
+        self.log.append({'elapsed': elapsed, 'effort': effort, 'predicted': cost * new, 'next': new})
+
+        return new
+
+    def reset(self):
+        """
+        Clears the log, but keeps the recent costs.
+        :return: Self
+        :rtype: Deadline
+        """
+
+        self.log = list()
+
+        return self
@@ -0,0 +1,158 @@
+import math
+import warnings
+import numpy as np
+from .rng import get_rng
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+_WEIGHT = """
+def weight(y, {x}{args}):
+    m = {mean}
+    s = {scale}
+    return -math.log(2 * math.pi * s ** 2) / 2 - (y - m) ** 2 / 2 / s ** 2
+"""
+
+_PROPAGATE = """
+def propagate(z, {x}{args}):
+    return {mean} + {scale} * z
+"""
+
+_cache = dict()
+
+
+class Kernels(object):
+    def __init__(self, key, weight, propagate):
+        """
+        Container for the fused kernels of a process with Gaussian noise. If the kernels fail to compile, they are
+        disabled and `None` is returned, in which case the caller should fall back to NumPy.
+        :param key: The key of the kernels in the cache
+        :type key: tuple
+        :param weight: The log-density of the noise evaluated at the mean and scale of the process
+        :type weight: callable
+        :param propagate: Translates and scales standard normal variables with the mean and scale of the process
+        :type propagate: callable
+        """
+
+        self._key = key
+        self._weight = weight
+        self._propagate = propagate
+
+    def _call(self, func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except numba.core.errors.NumbaError:
+            f, g = self._key[:2]
+            warnings.warn('Could not compile `{:s}` and `{:s}`, falling back to NumPy'.format(f.__name__, g.__name__))
+            _cache[self._key] = None
+
+            return None
+
+    def weight(self, y, *args):
+        """
+        Evaluates the log-density of `y`.
+        :param y: The point at which to evaluate
+        :type y: np.ndarray|float|int
+        :param args: The state (if not initial) and the parameters
+        :return: The log-density, or `None` if the kernel could not be compiled
+        :rtype: np.ndarray|float
+        """
+
+        return self._call(self._weight, y, *args)
+
+    def propagate(self, z, *args, out=None):
+        """
+        Translates and scales the standard normal variables `z`.
+        :param z: The standard normal variables
+        :type z: np.ndarray|float
+        :param args: The state (if not initial) and the parameters
+        :param out: Optional buffer to write the samples to, defaults to overwriting `z` if it's an array
+        :type out: np.ndarray
+        :return: The samples, or `None` if the kernel could not be compiled
+        :rtype: np.ndarray|float
+        """
+
+        if out is None and isinstance(z, np.ndarray):
+            out = z
+
+        return self._call(self._propagate, z, *args, out=out)
+
+
+def _compile(key):
+    """
+    Generates the source of the fused kernels and compiles them into lazy ufuncs, i.e. a single loop over the
+    broadcasted particles without any intermediate arrays.
+    :param key: The functions `f` and `g`, the number of parameters, whether it's the initial distribution, and the
+                step size if the process is discretized using the Euler-Maruyama scheme
+    :type key: tuple
+    :rtype: Kernels
+    """
+
+    f, g, nparams, initial, dt = key
+
+    args = ', '.join('p{:d}'.format(i) for i in range(nparams))
+    x = '' if initial else ('x, ' if nparams > 0 else 'x')
+
+    mean, scale = 'f({:s}{:s})'.format(x, args), 'g({:s}{:s})'.format(x, args)
+    if dt is not None:
+        mean, scale = 'x + {:s} * dt'.format(mean), '{:s} * sqrtdt'.format(scale)
+
+    namespace = {
+        'math': math,
+        'f': numba.njit(f),
+        'g': numba.njit(g),
+        'dt': dt,
+        'sqrtdt': math.sqrt(dt) if dt is not None else None
+    }
+
+    fmt = dict(x=x, args=args, mean=mean, scale=scale)
+    exec(_WEIGHT.format(**fmt), namespace)
+    exec(_PROPAGATE.format(**fmt), namespace)
+
+    weight = numba.vectorize(nopython=True)(namespace['weight'])
+    propagate = numba.vectorize(nopython=True)(namespace['propagate'])
+
+    return Kernels(key, weight, propagate)
+
+
+def get_kernels(f, g, nparams, initial=False, dt=None):
+    """
+    Returns the fused kernels for the functions `f` and `g` with Gaussian noise. The kernels are cached on the
+    functions, and thus survive copying of the models. Returns `None` if numba is not installed.
+    :param f: The mean function
+    :type f: callable
+    :param g: The scale function
+    :type g: callable
+    :param nparams: The number of parameters
+    :type nparams: int
+    :param initial: Whether the functions are those of the initial distribution, i.e. does not take a state
+    :type initial: bool
+    :param dt: The step size if the process is discretized using the Euler-Maruyama scheme
+    :type dt: float
+    :rtype: Kernels
+    """
+
+    if numba is None:
+        return None
+
+    key = f, g, nparams, initial, dt
+    if key not in _cache:
+        _cache[key] = _compile(key)
+
+    return _cache[key]
+
+
+def standard_normal(*arrays, rng=None):
+    """
+    Draws standard normal variables of the broadcasted shape of `arrays`.
+    :param arrays: The arrays to broadcast
+    :type arrays: np.ndarray|float|int
+    :param rng: The random number generator to use, defaults to the global NumPy random state
+    :type rng: np.random.Generator
+    :rtype: np.ndarray|float
+    """
+
+    return get_rng(rng).standard_normal(size=np.broadcast(*arrays).shape or None)
@@ -0,0 +1,190 @@
+import warnings
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+
+def sobol(n, ndim, rng=None):
+    """
+    Draws a randomized QMC point set of size `n` from the Sobol sequence, scrambled with `rng`. The point set is only
+    balanced if `n` is a power of 2.
+    :param n: The number of points
+    :type n: int
+    :param ndim: The dimension of the points
+    :type ndim: int
+    :param rng: The random number generator used for scrambling
+    :type rng: np.random.Generator
+    :return: The points, of shape (n, ndim)
+    :rtype: np.ndarray
+    """
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        return qmc.Sobol(ndim, scramble=True, seed=rng).random(n)
+
+
+def hilbert_index(coords, bits):
+    """
+    Calculates the index along the Hilbert curve of the integer coordinates `coords` using the algorithm of Skilling,
+    found here:
+        https://doi.org/10.1063/1.1751381
+    :param coords: The coordinates, of shape (ndim, n) and with values in [0, 2 ** bits)
+    :type coords: np.ndarray
+    :param bits: The number of bits of each coordinate, must satisfy `ndim * bits <= 63`
+    :type bits: int
+    :return: The Hilbert indices
+    :rtype: np.ndarray
+    """
+
+    x = np.array(coords, dtype=np.int64)
+    ndim = x.shape[0]
+
+    # ===== Inverse undo excess work ===== #
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = q - 1
+        for i in range(ndim):
+            invert = (x[i] & q) != 0
+            t = np.where(invert, 0, (x[0] ^ x[i]) & p)
+            x[0] ^= np.where(invert, p, t)
+            x[i] ^= t
+
+        q >>= 1
+
+    # ===== Gray encode ===== #
+    for i in range(1, ndim):
+        x[i] ^= x[i - 1]
+
+    t = np.zeros_like(x[0])
+    q = 1 << (bits - 1)
+    while q > 1:
+        t ^= np.where((x[-1] & q) != 0, q - 1, 0)
+        q >>= 1
+
+    x ^= t
+
+    # ===== Interleave the bits of the transpose ===== #
+    index = np.zeros_like(x[0])
+    for b in range(bits - 1, -1, -1):
+        for i in range(ndim):
+            index = (index << 1) | ((x[i] >> b) & 1)
+
+    return index
+
+
+def hilbert_sort(x):
+    """
+    Returns the indices that sort the particles `x` along the Hilbert curve. The particles are mapped to the unit
+    hypercube by a logistic transform of the standardized coordinates. In one dimension it's the ordinary sort.
+    :param x: The particles, of shape (n,) or (ndim, n)
+    :type x: np.ndarray
+    :rtype: np.ndarray
+    """
+
+    if x.ndim < 2:
+        return np.argsort(x, kind='stable')
+
+    ndim = x.shape[0]
+    bits = min(63 // ndim, 16)
+
+    std = x.std(axis=-1, keepdims=True)
+    z = (x - x.mean(axis=-1, keepdims=True)) / np.where(std > 0, std, 1)
+
+    coords = np.minimum(np.floor(2 ** bits / (1 + np.exp(-z))), 2 ** bits - 1)
+
+    return np.argsort(hilbert_index(coords, bits), kind='stable')
+
+
+class QMCGenerator(object):
+    def __init__(self, rng, ndim, scrambler=None):
+        """
+        Wraps a `numpy.random.Generator` and serves uniform and standard normal variables of the particles from
+        scrambled Sobol point sets of dimension `ndim + 1`, as in the SQMC of Gerber and Chopin, found here:
+            https://arxiv.org/abs/1402.4039
+        A call to `uniform` with an integer size, i.e. the number of particles, draws a new point set sorted by its
+        first coordinate and returns that coordinate, which is used for resampling. The next call to `standard_normal`
+        or `normal` of shape (ndim, # particles) returns the inverse normal CDF of the remaining coordinates, which is
+        used for propagating the particle resampled with the same point. Calls of other shapes, as well as all other
+        methods, are delegated to the wrapped generator.
+        :param rng: The generator to wrap
+        :type rng: np.random.Generator|pyfilter.utils.rng.BufferedGenerator
+        :param ndim: The dimension of the state
+        :type ndim: int
+        :param scrambler: The generator used for scrambling the point sets, which must be a plain
+            `numpy.random.Generator`. Defaults to `rng`
+        :type scrambler: np.random.Generator
+        """
+
+        self._rng = rng
+        self._scrambler = scrambler if scrambler is not None else rng
+        self._ndim = ndim
+        self._points = None
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+
+        return getattr(self._rng, item)
+
+    def _draw(self, n):
+        """
+        Draws a new point set of size `n`, sorted by the first coordinate.
+        :param n: The number of points
+        :type n: int
+        :rtype: np.ndarray
+        """
+
+        points = sobol(n, self._ndim + 1, rng=self._scrambler)
+
+        return points[np.argsort(points[:, 0])]
+
+    def _shape(self, size):
+        """
+        Returns `size` as a tuple if it's the shape of the state of the particles, else None.
+        :param size: The size
+        :type size: int|tuple of int|None
+        :rtype: tuple of int|None
+        """
+
+        shape = () if size is None else (tuple(size) if isinstance(size, (tuple, list)) else (size,))
+
+        if len(shape) < 1 or int(np.prod(shape[:-1])) != self._ndim:
+            return None
+
+        return shape
+
+    def uniform(self, low=0., high=1., size=None):
+        if not isinstance(size, (int, np.integer)):
+            return self._rng.uniform(low, high, size=size)
+
+        self._points = self._draw(size)
+
+        return low + (high - low) * self._points[:, 0]
+
+    def standard_normal(self, size=None, out=None):
+        shape = self._shape(out.shape if out is not None else size)
+        if shape is None:
+            return self._rng.standard_normal(size=size, out=out)
+
+        points = self._points if self._points is not None and self._points.shape[0] == shape[-1] else None
+        if points is None:
+            points = self._draw(shape[-1])
+
+        self._points = None
+
+        u = np.clip(points[:, 1:].T, np.finfo(float).eps, 1 - np.finfo(float).eps)
+        z = ndtri(u).reshape(shape)
+
+        if out is None:
+            return z
+
+        out[...] = z
+
+        return out
+
+    def normal(self, loc=0., scale=1., size=None):
+        size = size if size is not None else (np.broadcast(loc, scale).shape or None)
+        if self._shape(size) is None:
+            return self._rng.normal(loc, scale, size=size)
+
+        return loc + scale * self.standard_normal(size=size)
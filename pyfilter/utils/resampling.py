@@ -1,19 +1,23 @@
 import numpy as np
 from .normalization import normalize
 from ..utils.utils import searchsorted2d
+from .rng import get_rng
+from .qmc import hilbert_sort
 
 
-def _matrix(weights, u):
+def _matrix(weights, u, rng=None):
     """
     Performs systematic resampling of a 2D array of log weights along the second axis.
     independent of the others.
     :param weights: The weights to use for resampling
     :type weights: np.ndarray
+    :param rng: The random number generator
+    :type rng: np.random.Generator
     :return: Resampled indices
     :rtype: np.ndarray
     """
     n = weights.shape[1]
-    u = u if u is not None else np.random.uniform(size=weights.shape[0])[:, None]
+    u = u if u is not None else get_rng(rng).uniform(size=weights.shape[0])[:, None]
     index_range = np.arange(n)[None, :] * np.ones(weights.shape)
 
     probs = (index_range + u) / n
@@ -23,16 +27,20 @@ def _matrix(weights, u):
     return searchsorted2d(cumsum, probs).astype(int)
 
 
-def _vector(weights, u):
+def _vector(weights, u, rng=None, size=None):
     """
     Performs systematic resampling of a 1D array log weights.
     :param weights: The weights to use for resampling
     :type weights: np.ndarray
+    :param rng: The random number generator
+    :type rng: np.random.Generator
+    :param size: The number of indices to draw, defaults to the number of weights
+    :type size: int
     :return: Resampled indices
     :rtype: np.ndarray
     """
-    n = weights.size
-    u = u or np.random.uniform()
+    n = size or weights.size
+    u = u or get_rng(rng).uniform()
     probs = (np.arange(n) + u) / n
 
     cumsum = normalize(weights).cumsum()
@@ -40,41 +48,54 @@ def _vector(weights, u):
     return np.searchsorted(cumsum, probs).astype(int)
 
 
-def systematic(w, u=None):
+def systematic(w, u=None, rng=None, size=None):
     """
     Performs systematic resampling on either a 1D or 2D array.
     :param w: The weights to use for resampling
     :type w: np.ndarray
     :param u: Parameter for overriding the sampled index, for testing
     :type u: sample from np.random.uniform()
+    :param rng: The random number generator to use, defaults to the global NumPy random state
+    :type rng: np.random.Generator
+    :param size: The number of indices to draw, defaults to the number of weights. Only supported for 1D arrays
+    :type size: int
     :return: Resampled indices
     :rtype: np.ndarray
     """
     if w.ndim > 1:
-        return _matrix(w, u)
+        if size is not None:
+            raise NotImplementedError('Resampling to another size is only implemented for 1D arrays of weights')
 
-    return _vector(w, u)
+        return _matrix(w, u, rng=rng)
 
+    return _vector(w, u, rng=rng, size=size)
 
-def _mn_vector(w):
+
+def _mn_vector(w, rng=None, size=None):
     """
     Resamples a vector array of weights using multinomial resampling.
     :param w: The weights to use for resampling
     :type w: np.ndarray
+    :param rng: The random number generator
+    :type rng: np.random.Generator
+    :param size: The number of indices to draw, defaults to the number of weights
+    :type size: int
     :return: Resampled indices
     :rtype: np.ndarray
     """
     normalized = normalize(w).cumsum()
     normalized[-1] = 1
 
-    return np.searchsorted(normalized, np.random.uniform(0, 1, w.shape))
+    return np.searchsorted(normalized, get_rng(rng).uniform(0, 1, size or w.shape))
 
 
-def _mn_matrix(w):
+def _mn_matrix(w, rng=None):
     """
     Resamples a matrix array of weights using multinomial resampling.
     :param w: The weights to use for resampling
     :type w: np.ndarray
+    :param rng: The random number generator
+    :type rng: np.random.Generator
     :return: Resampled indices
     :rtype: np.ndarray
     """
@@ -82,19 +103,55 @@ def _mn_matrix(w):
     normalized = normalize(w).cumsum(axis=-1)
     normalized[:, -1] = 1
 
-    return searchsorted2d(normalized, np.random.uniform(0, 1, w.shape))
+    return searchsorted2d(normalized, get_rng(rng).uniform(0, 1, w.shape))
 
 
-def multinomial(w):
+def multinomial(w, rng=None, size=None):
     """
     Performs multinomial resampling on either a 1D or 2D array.
     :param w: The weights to use for resampling
     :type w: np.ndarray
+    :param rng: The random number generator to use, defaults to the global NumPy random state
+    :type rng: np.random.Generator
+    :param size: The number of indices to draw, defaults to the number of weights. Only supported for 1D arrays
+    :type size: int
     :return: Resampled indices
     :rtype: np.ndarray
     """
 
     if w.ndim > 1:
-        return _mn_matrix(w)
+        if size is not None:
+            raise NotImplementedError('Resampling to another size is only implemented for 1D arrays of weights')
+
+        return _mn_matrix(w, rng=rng)
+
+    return _mn_vector(w, rng=rng, size=size)
+
+
+def hilbert(w, x=None, rng=None):
+    """
+    Performs resampling of a 1D array of weights by inverting the empirical distribution of the particles sorted along
+    the Hilbert curve, as in SQMC. The indices are returned in the order of the sorted uniforms, such that the particle
+    resampled with the n:th point is at position n. If the generator is a `QMCGenerator` the uniforms are the first
+    coordinates of its point set, else it's sorted multinomial resampling.
+    :param w: The weights to use for resampling
+    :type w: np.ndarray
+    :param x: The particles, of shape (n,) or (ndim, n), defaults to the order of the weights
+    :type x: np.ndarray
+    :param rng: The random number generator to use, defaults to the global NumPy random state
+    :type rng: np.random.Generator|pyfilter.utils.qmc.QMCGenerator
+    :return: Resampled indices
+    :rtype: np.ndarray
+    """
+
+    if w.ndim > 1:
+        raise NotImplementedError('Hilbert resampling is only implemented for 1D arrays of weights')
+
+    order = hilbert_sort(x) if x is not None else np.arange(w.size)
+
+    normalized = normalize(w[order]).cumsum()
+    normalized[-1] = 1
+
+    u = np.sort(get_rng(rng).uniform(size=w.size))
 
-    return _mn_vector(w)
+    return order[np.searchsorted(normalized, u)]
@@ -0,0 +1,123 @@
+import numpy as np
+
+
+def seedsequence(seed=None):
+    """
+    Returns `seed` as a `SeedSequence`, from which independent child streams may be spawned.
+    :param seed: The seed
+    :type seed: int|np.random.SeedSequence|None
+    :rtype: np.random.SeedSequence
+    """
+
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+
+    return np.random.SeedSequence(seed)
+
+
+def get_rng(rng=None):
+    """
+    Returns `rng` if not None, else the global NumPy random state.
+    :param rng: The random number generator
+    :type rng: np.random.Generator|BufferedGenerator|None
+    :rtype: np.random.Generator|BufferedGenerator
+    """
+
+    return rng if rng is not None else np.random
+
+
+def standard_normal(rng=None, size=None, out=None):
+    """
+    Draws standard normal variables, writing them to `out` if passed.
+    :param rng: The random number generator, defaults to the global NumPy random state
+    :type rng: np.random.Generator|BufferedGenerator|None
+    :param size: The size to draw, ignored if `out` is passed
+    :type size: int|tuple of int
+    :param out: Optional buffer to write the variables to
+    :type out: np.ndarray
+    :rtype: np.ndarray|float
+    """
+
+    if out is None:
+        return get_rng(rng).standard_normal(size=size)
+
+    if rng is None:
+        out[...] = np.random.standard_normal(size=out.shape)
+    else:
+        rng.standard_normal(out=out)
+
+    return out
+
+
+class BufferedGenerator(object):
+    def __init__(self, rng, block=2 ** 16):
+        """
+        Wraps a `numpy.random.Generator` and pre-generates blocks of standard normal and uniform variables, from which
+        consecutive calls are served. This reduces the overhead of calling the generator at every step of the filter
+        when the number of particles is small. All other methods are delegated to the wrapped generator.
+        :param rng: The generator to wrap
+        :type rng: np.random.Generator
+        :param block: The number of variables of each kind to pre-generate in one call
+        :type block: int
+        """
+
+        self._rng = rng
+        self._block = block
+
+        self._blocks = {'standard_normal': np.empty(0), 'random': np.empty(0)}
+        self._pos = {'standard_normal': 0, 'random': 0}
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+
+        return getattr(self._rng, item)
+
+    def _take(self, kind, size):
+        """
+        Takes variables of `kind` from the current block, and generates a new block if it is exhausted.
+        :param kind: The name of the method of the generator
+        :type kind: str
+        :param size: The size to take
+        :type size: int|tuple of int|None
+        :rtype: np.ndarray|float
+        """
+
+        shape = () if size is None else (tuple(size) if isinstance(size, (tuple, list)) else (size,))
+        n = int(np.prod(shape))
+
+        if n > self._block:
+            return getattr(self._rng, kind)(size=shape)
+
+        if self._pos[kind] + n > self._blocks[kind].size:
+            self._blocks[kind] = getattr(self._rng, kind)(size=self._block)
+            self._pos[kind] = 0
+
+        block, pos = self._blocks[kind], self._pos[kind]
+        self._pos[kind] = pos + n
+
+        if size is None:
+            return block[pos]
+
+        return block[pos:pos + n].reshape(shape)
+
+    def standard_normal(self, size=None, out=None):
+        if out is None:
+            return self._take('standard_normal', size)
+
+        out[...] = self._take('standard_normal', out.shape)
+
+        return out
+
+    def normal(self, loc=0., scale=1., size=None):
+        size = size if size is not None else (np.broadcast(loc, scale).shape or None)
+
+        return loc + scale * self._take('standard_normal', size)
+
+    def random(self, size=None):
+        return self._take('random', size)
+
+    def uniform(self, low=0., high=1., size=None):
+        size = size if size is not None else (np.broadcast(low, high).shape or None)
+
+        return low + (high - low) * self._take('random', size)
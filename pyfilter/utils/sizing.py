@@ -0,0 +1,53 @@
+import numpy as np
+from scipy.stats import norm
+from .normalization import normalize
+from .utils import get_ess
+
+
+def kld(x, w, epsilon=0.05, delta=0.01, binsize=0.5):
+    """
+    Returns the number of particles of KLD-sampling by Dieter Fox, found here:
+        https://doi.org/10.1177/0278364903022012001
+    I.e. the number required for the Kullback-Leibler divergence between the particle approximation and the posterior to
+    be below `epsilon` with probability `1 - delta`, where the state space is divided into bins of width `binsize`. The
+    number of bins with support is taken as the expected number of bins hit when resampling the particles.
+    :param x: The particles, of shape (n,) or (ndim, n)
+    :type x: np.ndarray
+    :param w: The log weights
+    :type w: np.ndarray
+    :param epsilon: The bound on the Kullback-Leibler divergence
+    :type epsilon: float
+    :param delta: The probability of exceeding the bound
+    :type delta: float
+    :param binsize: The width of the bins
+    :type binsize: float
+    :rtype: int
+    """
+
+    bins = np.floor(np.reshape(x, (-1, w.size)) / binsize).astype(int)
+    _, inverse = np.unique(bins, axis=1, return_inverse=True)
+
+    k = np.minimum(1, w.size * np.bincount(inverse, weights=normalize(w))).sum()
+
+    if k <= 1:
+        return 1
+
+    a = 2 / 9 / (k - 1)
+
+    return int(np.ceil((k - 1) / 2 / epsilon * (1 - a + np.sqrt(a) * norm.ppf(1 - delta)) ** 3))
+
+
+def ess(x, w, target=1000):
+    """
+    Returns the number of particles for which the effective sample size is `target`, assuming that the ratio between
+    the effective sample size and the number of particles remains the same.
+    :param x: The particles
+    :type x: np.ndarray
+    :param w: The log weights
+    :type w: np.ndarray
+    :param target: The effective sample size to target
+    :type target: int
+    :rtype: int
+    """
+
+    return int(np.ceil(target * w.size / get_ess(w)))
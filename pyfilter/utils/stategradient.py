@@ -1,89 +1,121 @@
 from ..timeseries import StateSpaceModel
+from .utils import expanddims
 import numpy as np
 
 
+def stencil(x, h):
+    """
+    Stacks the points of the central difference stencil around `x` along a new axis after the state axis, i.e. the
+    centre, the points `x +/- h * e_i` and the points `x +/- h * (e_i + e_j)` for i < j.
+    :param x: The state, of shape (ndim, ...)
+    :type x: np.ndarray
+    :param h: The step size
+    :type h: float
+    :return: The stencil points, of shape (ndim, 1 + ndim ** 2 + ndim, ...)
+    :rtype: np.ndarray
+    """
+
+    ndim = x.shape[0]
+    pairs = [(i, j) for i in range(ndim) for j in range(i + 1, ndim)]
+
+    offsets = np.zeros((ndim, 1 + 2 * ndim + 2 * len(pairs)))
+    offsets[:, 1:1 + 2 * ndim:2] = h * np.eye(ndim)
+    offsets[:, 2:2 + 2 * ndim:2] = -h * np.eye(ndim)
+
+    for k, (i, j) in enumerate(pairs):
+        offsets[[i, j], 1 + 2 * ndim + 2 * k] = h
+        offsets[[i, j], 2 + 2 * ndim + 2 * k] = -h
+
+    return x[:, None] + offsets.reshape(offsets.shape + (1,) * (x.ndim - 1))
+
+
+def fromstencil(fx, h, ndim):
+    """
+    Assembles the gradient and hessian from the function evaluated at the points of `stencil`.
+    :param fx: The function values, of shape (1 + ndim ** 2 + ndim, ...)
+    :type fx: np.ndarray
+    :param h: The step size
+    :type h: float
+    :param ndim: The dimension of the state
+    :type ndim: int
+    :return: The gradient, of shape (ndim, ...), and the hessian, of shape (ndim, ndim, ...)
+    :rtype: tuple of np.ndarray
+    """
+
+    fmid, fup, flow = fx[0], fx[1:1 + 2 * ndim:2], fx[2:2 + 2 * ndim:2]
+
+    grad = (fup - flow) / 2 / h
+
+    hess = np.empty((ndim, ndim, *fx.shape[1:]))
+    hess[np.diag_indices(ndim)] = (fup - 2 * fmid + flow) / h ** 2
+
+    k = 1 + 2 * ndim
+    for i in range(ndim):
+        for j in range(i + 1, ndim):
+            tmp = fx[k] - fup[i] - fup[j] + 2 * fmid - flow[i] - flow[j] + fx[k + 1]
+            hess[i, j] = hess[j, i] = tmp / 2 / h ** 2
+            k += 2
+
+    return grad, hess
+
+
 class NumericalStateGradient(object):
-    h = 1e-6
-    grad = None
+    h = 1e-4
 
     def __init__(self, model):
         """
-        Implements a way for calculating the gradient and hessian of the underlying states. NOTE, this should not be
-        used stand-alone as it currently requires `hess` to be called after `grad`.
+        Implements a way for calculating the gradient and hessian of the underlying states. All points of the central
+        difference stencil are evaluated in one call to the model, where the step `h` is large enough for the second
+        differences of the hessian not to be dominated by rounding errors. NOTE, this should not be used stand-alone as
+        it currently requires `hess` to be called after `grad`.
         :param model: The model
         :type model: StateSpaceModel
         """
 
         self._model = model
+        self._hess = None
 
-    def gradient(self, y, x, oldx):
+    def gradient(self, y, x, oldx, params=None):
         """
-        Estimates the gradient numerically.
+        Estimates the gradient numerically, and the hessian returned by `hess`.
         :param y: The observation
         :param x: The state
         :param oldx: The previous state
+        :param params: Whether to override the current parameters of the hidden and observable processes
+        :type params: tuple of tuple of np.ndarray
         :return:
         """
 
-        if self._model.hidden_ndim < 2:
-            up = x + self.h
-            low = x - self.h
-
-            fupx = self._model.weight(y, up) + self._model.h_weight(up, oldx)
-            flowx = self._model.weight(y, low) + self._model.h_weight(low, oldx)
+        ndim = self._model.hidden_ndim
 
-            self.grad = [flowx, fupx]
+        if ndim < 2:
+            points = stencil(np.array(x, dtype=float)[None], self.h)[0]
+        else:
+            points = stencil(x, self.h)
+            oldx = np.array(oldx)[:, None]
 
-            return (fupx - flowx) / 2 / self.h
+        if self._model.obs_ndim > 1:
+            y = expanddims(np.array(y), points.ndim)
 
-        grad = np.empty_like(x)
-        self.grad = list()
-        for i, tx in enumerate(x):
-            up, low = x.copy(), x.copy()
-            up[i] = tx + self.h
-            low[i] = tx - self.h
+        hparams, oparams = params or (None, None)
 
-            fupx = self._model.weight(y, up) + self._model.h_weight(up, oldx)
-            flowx = self._model.weight(y, low) + self._model.h_weight(low, oldx)
+        fx = self._model.weight(y, points, oparams) + self._model.h_weight(points, oldx, hparams)
+        fx = np.broadcast_to(fx, points.shape if ndim < 2 else points.shape[1:])
 
-            grad[i] = (fupx - flowx) / 2 / self.h
-            self.grad.append((fupx, flowx))
+        grad, self._hess = fromstencil(fx, self.h, ndim)
 
-        return grad
+        return grad[0] if ndim < 2 else grad
 
     def hess(self, y, x, oldx):
         """
-        Estimates the hessian numerically.
+        Returns the inverse of the hessian estimated in the latest call to `gradient`.
         :param y: The observation
         :param x: The state
         :param oldx: The previous state
         :return:
         """
 
-        fmid = self._model.weight(y, x) + self._model.h_weight(x, oldx)
-
         if self._model.hidden_ndim < 2:
-            return 1 / ((self.grad[1] - 2 * fmid + self.grad[0]) / self.h ** 2)
-
-        hess = np.empty((x.shape[0], *x.shape))
-        for i in range(x.shape[0]):
-            for j in range(i, x.shape[0]):
-                if i == j:
-                    hess[i, i] = (self.grad[i][0] - 2 * fmid + self.grad[i][1]) / self.h ** 2
-                else:
-                    upx, lowx = x.copy(), x.copy()
-
-                    upx[i] += self.h
-                    upx[j] += self.h
-
-                    lowx[i] -= self.h
-                    lowx[j] -= self.h
-
-                    fup = self._model.weight(y, upx) + self._model.h_weight(upx, oldx)
-                    flow = self._model.weight(y, lowx) + self._model.h_weight(lowx, oldx)
-
-                    tmp = fup - self.grad[i][0] - self.grad[j][0] + 2 * fmid - self.grad[i][1] - self.grad[j][1] + flow
-
-                    hess[i, j] = hess[j, i] = tmp / 2 / self.h ** 2
+            return 1 / self._hess[0, 0]
 
-        return np.linalg.inv(hess.T).T
\ No newline at end of file
+        return np.linalg.inv(self._hess.T).T
@@ -0,0 +1,186 @@
+import numpy as np
+
+
+def mean(x, w):
+    """
+    Returns the weighted mean of the particles.
+    :param x: The particles, where the particles are on the last axis
+    :type x: np.ndarray
+    :param w: The normalized weights
+    :type w: np.ndarray
+    :rtype: np.ndarray
+    """
+
+    return np.sum(x * w, axis=-1)
+
+
+def variance(x, w):
+    """
+    Returns the weighted variance of the particles, for each dimension.
+    :param x: The particles, where the particles are on the last axis
+    :type x: np.ndarray
+    :param w: The normalized weights
+    :type w: np.ndarray
+    :rtype: np.ndarray
+    """
+
+    return np.sum(w * (x - mean(x, w)[..., None]) ** 2, axis=-1)
+
+
+def quantile(q):
+    """
+    Returns a reducer of the weighted quantiles `q` of the particles, i.e. the smallest particles at which the
+    cumulative weight is at least `q`. The quantiles are exact, as the particles are sorted at each step.
+    :param q: The quantiles, where the quantiles are on the first axis of the output if several
+    :type q: float|tuple of float
+    :rtype: callable
+    """
+
+    qs = np.atleast_1d(q)
+
+    def reducer(x, w):
+        order = np.argsort(x, axis=-1)
+        cumw = np.cumsum(np.take_along_axis(np.broadcast_to(w, x.shape), order, axis=-1), axis=-1)
+
+        inds = np.minimum((cumw[..., None, :] < qs[:, None]).sum(axis=-1), x.shape[-1] - 1)
+        out = np.moveaxis(np.take_along_axis(np.take_along_axis(x, order, axis=-1), inds, axis=-1), -1, 0)
+
+        return out if np.ndim(q) > 0 else out[0]
+
+    return reducer
+
+
+def exceedance(threshold):
+    """
+    Returns a reducer of the weighted probability of the particles exceeding `threshold`.
+    :param threshold: The threshold
+    :type threshold: float|np.ndarray
+    :rtype: callable
+    """
+
+    def reducer(x, w):
+        return np.sum(w * (x > threshold), axis=-1)
+
+    return reducer
+
+
+REDUCERS = {
+    'mean': mean,
+    'noise': mean,
+    'variance': variance,
+    'median': quantile(0.5)
+}
+
+
+class Trace(object):
+    def __init__(self):
+        """
+        Saves a summary for each step in a preallocated array, which is doubled in size when full.
+        """
+
+        self._values = None
+        self._n = 0
+        self._reserved = 16
+
+    @property
+    def values(self):
+        """
+        Returns the saved summaries, where the steps are on the first axis.
+        :rtype: np.ndarray
+        """
+
+        if self._values is None:
+            return np.empty(0)
+
+        return self._values[:self._n]
+
+    def reserve(self, n):
+        """
+        Makes room for `n` more steps.
+        :param n: The number of steps
+        :type n: int
+        :return: Self
+        :rtype: Trace
+        """
+
+        if self._values is None:
+            self._reserved = max(self._reserved, n)
+        elif self._values.shape[0] < self._n + n:
+            self._grow(self._n + n)
+
+        return self
+
+    def _grow(self, size):
+        """
+        Reallocates the array to fit `size` steps.
+        :param size: The number of steps
+        :type size: int
+        """
+
+        values = np.empty((size, *self._values.shape[1:]), dtype=self._values.dtype)
+        values[:self._n] = self._values[:self._n]
+
+        self._values = values
+
+    def append(self, value):
+        """
+        Saves the summary of a step.
+        :param value: The summary
+        :type value: np.ndarray|float
+        :return: Self
+        :rtype: Trace
+        """
+
+        value = np.asarray(value)
+
+        if self._values is None:
+            self._values = np.empty((self._reserved, *value.shape), dtype=value.dtype)
+        elif self._n == self._values.shape[0]:
+            self._grow(2 * self._n)
+
+        self._values[self._n] = value
+        self._n += 1
+
+        return self
+
+    def resample(self, indices):
+        """
+        Resamples the summaries of all steps along the last axis, i.e. the axis of the parameter particles.
+        :param indices: The indices to choose
+        :type indices: np.ndarray
+        :return: Self
+        :rtype: Trace
+        """
+
+        if self._values is not None:
+            self._values = self._values[..., indices]
+
+        return self
+
+    def exchange(self, indices, trace):
+        """
+        Exchanges the summaries of all steps of `self` with `indices` of `trace`.
+        :param indices: The indices to exchange
+        :type indices: np.ndarray
+        :param trace: The trace to exchange with
+        :type trace: Trace
+        :return: Self
+        :rtype: Trace
+        """
+
+        if self._values is not None:
+            self._values[:self._n][..., indices] = trace.values[..., indices]
+
+        return self
+
+    def clear(self):
+        """
+        Removes all summaries.
+        :return: Self
+        :rtype: Trace
+        """
+
+        self._values = None
+        self._n = 0
+
+        return self
@@ -1,6 +1,8 @@
 from ..timeseries import StateSpaceModel, Base
 import numpy as np
-from .utils import outerm, expanddims, customcholesky, dot, mdot, outerv
+from .utils import outerm, expanddims, customcholesky, dot, mdot, outerv, outer, triangularize, cholupdate, trisolve, \
+    choose
+from .rng import get_rng
 
 
 def _propagate_sps(spx, spn, process):
@@ -24,6 +26,20 @@ def _propagate_sps(spx, spn, process):
     return mean + scale * spn
 
 
+def _translate_sps(spx, process):
+    """
+    Translate the Sigma points by the mean of the given process, used when the noise is additive.
+    :param spx: The state Sigma points
+    :type spx: np.ndarray
+    :param process: The process
+    :type process: Base
+    :return: Translated sigma points
+    :rtype: np.ndarray
+    """
+
+    return np.broadcast_to(process.mean(spx), (process.ndim, *spx.shape[1:]))
+
+
 def _helpweighter(a, b):
     """
     Performs a weighting along the second axis of `b` using `a` and sums.
@@ -71,8 +87,67 @@ def _get_meancov(spxy, wm, wc):
     return x, _covcalc(centered, centered, wc)
 
 
+def _get_meanchol(spxy, wm, wc, noise=None):
+    """
+    Calculates the mean and the lower triangular Cholesky factor of the covariance given sigma points, via a QR
+    decomposition of the weighted deviations and a rank one update with the central sigma point.
+    :param spxy: The state/observation sigma points
+    :type spxy: np.ndarray
+    :param wm: The W^m
+    :type wm: np.ndarray
+    :param wc: The W^c
+    :type wc: np.ndarray
+    :param noise: A square root of the covariance of additive noise, if any
+    :type noise: np.ndarray
+    :return: Mean, Cholesky factor and the centered sigma points
+    :rtype: tuple of np.ndarray
+    """
+
+    x = _helpweighter(wm, spxy)
+    centered = spxy - x[:, None, ...]
+
+    deviations = np.sqrt(wc[1]) * centered[:, 1:]
+    if noise is not None:
+        noise = np.broadcast_to(noise, noise.shape[:2] + x.shape[1:])
+        deviations = np.concatenate((deviations, noise), axis=1)
+
+    chol = triangularize(deviations)
+    chol = cholupdate(chol, np.sqrt(np.abs(wc[0])) * centered[:, 0], np.sign(wc[0]))
+
+    return x, chol, centered
+
+
+def _noisecov(process, x, cov, chol=False):
+    """
+    Calculates the covariance of the additive noise of the process, or a square root of it.
+    :param process: The process
+    :type process: Base
+    :param x: A state at which to evaluate the scale
+    :type x: np.ndarray
+    :param cov: The covariance of the noise of the process, or its Cholesky factor if `chol`
+    :type cov: np.ndarray
+    :param chol: Whether to return a square root of the covariance instead
+    :type chol: bool
+    :return: The covariance, or square root, with the matrix axes first
+    :rtype: np.ndarray
+    """
+
+    scale = process.scale(x)
+
+    if process.ndim < 2:
+        out = np.abs(scale) * cov[0, 0] if chol else scale ** 2 * cov[0, 0]
+        return np.array(out)[None, None]
+
+    if chol:
+        out = mdot(scale, expanddims(cov, scale.ndim))
+    else:
+        out = outer(scale, expanddims(cov, scale.ndim))
+
+    return expanddims(out, x.ndim + 1)
+
+
 class UnscentedTransform(object):
-    def __init__(self, model, a=1, b=2, k=0):
+    def __init__(self, model, a=1, b=2, k=0, sqrt=False, augment=None):
         """
         Implements the Unscented Transform for a state space model.
         :param model: The model
@@ -83,15 +158,32 @@ class UnscentedTransform(object):
         :type b: float
         :param k: The kappa parameter. To control the semi-definiteness
         :type k: float
+        :param sqrt: Whether to propagate the Cholesky factor of the covariance instead of the covariance, i.e. the
+                     square-root UKF of van der Merwe and Wan, which avoids factorizing the covariance at every step
+        :type sqrt: bool
+        :param augment: Whether to augment the state with the noise. If not, both processes must be declared
+                        `additive`, and the covariance of the noise is added analytically, using 2n+1 instead of
+                        2(2n+m)+1 sigma points. Defaults to augmenting unless both processes are declared `additive`
+        :type augment: bool
         """
 
+        additive = model.hidden.additive and model.observable.additive
+
+        if augment is False and not additive:
+            raise ValueError('The state may only be left unaugmented if the noise of both processes is additive')
+
         self._a = a
         self._b = b
+        self._k = k
         self._model = model
-        self._ndim = 2 * model.hidden_ndim + model.obs_ndim
-        self._lam = a ** 2 * (self._ndim + k) - self._ndim
+        self._augmented = not additive if augment is None else augment
+        self._noise = None
+        self._ndim = None
+        self._lam = None
         self._ymean = None
         self._ycov = None
+        self._ychol = None
+        self._sqrt = sqrt
 
     def _set_slices(self):
         """
@@ -101,8 +193,10 @@ class UnscentedTransform(object):
         """
 
         self._sslc = slice(self._model.hidden_ndim)
-        self._hslc = slice(self._model.hidden_ndim, 2 * self._model.hidden_ndim)
-        self._oslc = slice(2 * self._model.hidden_ndim, None)
+
+        if self._augmented:
+            self._hslc = slice(self._model.hidden_ndim, 2 * self._model.hidden_ndim)
+            self._oslc = slice(2 * self._model.hidden_ndim, None)
 
         return self
 
@@ -113,6 +207,12 @@ class UnscentedTransform(object):
         :rtype: UnscentedTransform
         """
 
+        self._ndim = self._model.hidden_ndim
+        if self._augmented:
+            self._ndim = 2 * self._model.hidden_ndim + self._model.obs_ndim
+
+        self._lam = self._a ** 2 * (self._ndim + self._k) - self._ndim
+
         self._wm = np.zeros(1 + 2 * self._ndim)
         self._wc = self._wm.copy()
         self._wm[0] = self._lam / (self._ndim + self._lam)
@@ -138,7 +238,8 @@ class UnscentedTransform(object):
         parts = x.shape[1:] if self._model.hidden_ndim > 1 else x.shape
 
         self._mean = np.zeros((self._ndim, *parts))
-        self._cov = np.zeros((self._ndim, self._ndim, *parts))
+        self._cov = None if self._sqrt else np.zeros((self._ndim, self._ndim, *parts))
+        self._chol = np.zeros((self._ndim, self._ndim, *parts)) if self._sqrt else None
         self._sps = np.zeros((self._ndim, 1 + 2 * self._ndim, *parts))
 
         return self
@@ -158,6 +259,9 @@ class UnscentedTransform(object):
 
         self._mean[self._sslc] = x
 
+        if self._sqrt:
+            return self._initialize_chol()
+
         # ==== Set state covariance ===== #
         scale = self._model.hidden.i_scale()
         if self._model.hidden_ndim > 1:
@@ -167,34 +271,98 @@ class UnscentedTransform(object):
 
         # ==== Set noise covariance ===== #
 
+        if not self._augmented:
+            return self._initialize_noise()
+
         self._cov[self._hslc, self._hslc] = expanddims(self._model.hidden.noise.cov(), self._cov.ndim)
         self._cov[self._oslc, self._oslc] = expanddims(self._model.observable.noise.cov(), self._cov.ndim)
 
         return self
 
+    def _initialize_chol(self):
+        """
+        Initializes the Cholesky factor of the covariance, where the factors of the noise are constant.
+        :return: Instance of self
+        :rtype: UnscentedTransform
+        """
+
+        scale = self._model.hidden.i_scale()
+        if self._model.hidden_ndim > 1:
+            self._chol[self._sslc, self._sslc] = expanddims(triangularize(scale), self._chol.ndim)
+        else:
+            self._chol[self._sslc, self._sslc] = np.abs(scale)
+
+        if not self._augmented:
+            return self._initialize_noise()
+
+        for slc, noise in [(self._hslc, self._model.hidden.noise), (self._oslc, self._model.observable.noise)]:
+            self._chol[slc, slc] = expanddims(np.linalg.cholesky(np.atleast_2d(noise.cov())), self._chol.ndim)
+
+        return self
+
+    def _initialize_noise(self):
+        """
+        Initializes the covariances of the standardized noise of the processes when not augmented, or their Cholesky
+        factors in square-root mode. At every step these are scaled by the scale of the process evaluated at the mean,
+        such that scales depending on the parameters of each particle are honoured.
+        :return: Instance of self
+        :rtype: UnscentedTransform
+        """
+
+        covs = [np.atleast_2d(p.noise.cov()) for p in (self._model.hidden, self._model.observable)]
+        self._noise = tuple(np.linalg.cholesky(c) for c in covs) if self._sqrt else tuple(covs)
+
+        return self
+
     def get_sps(self):
         """
         Constructs the Sigma points used for propagation.
         :return: Sigma points
         :rtype: np.ndarray
         """
-        cholcov = np.sqrt(self._lam + self._ndim) * customcholesky(self._cov)
+        chol = self._chol if self._sqrt else customcholesky(self._cov)
+
+        return self._sigmapoints(self._mean, chol, self._sps)
 
-        self._sps[:, 0] = self._mean
-        self._sps[:, 1:self._ndim+1] = self._mean[:, None] + cholcov
-        self._sps[:, self._ndim+1:] = self._mean[:, None] - cholcov
+    def _sigmapoints(self, mean, chol, out=None):
+        """
+        Constructs the Sigma points of the given mean and Cholesky factor of the covariance.
+        :param mean: The mean
+        :type mean: np.ndarray
+        :param chol: The Cholesky factor
+        :type chol: np.ndarray
+        :param out: Optional array to write the Sigma points to
+        :type out: np.ndarray
+        :return: Sigma points
+        :rtype: np.ndarray
+        """
 
-        return self._sps
+        out = out if out is not None else np.empty((self._ndim, 1 + 2 * self._ndim, *mean.shape[1:]))
+        cholcov = np.sqrt(self._lam + self._ndim) * chol
+
+        out[:, 0] = mean
+        out[:, 1:self._ndim+1] = mean[:, None] + cholcov
+        out[:, self._ndim+1:] = mean[:, None] - cholcov
+
+        return out
 
     def propagate_sps(self, only_x=False):
         """
-        Propagate the Sigma points through the given process.
+        Propagate the Sigma points through the given process. If not augmented, the Sigma points are only translated
+        by the mean of the process, and the noise has to be added separately.
         :return: Sigma points of x and y
         :rtype: tuple of np.ndarray
         """
 
         sps = self.get_sps()
 
+        if not self._augmented:
+            spx = _translate_sps(sps, self._model.hidden)
+            if only_x:
+                return spx
+
+            return spx, _translate_sps(spx, self._model.observable)
+
         spx = _propagate_sps(sps[self._sslc], sps[self._hslc], self._model.hidden)
         if only_x:
             return spx
@@ -231,6 +399,9 @@ class UnscentedTransform(object):
         :rtype: np.ndarray
         """
 
+        if self._sqrt:
+            return outerm(self.xchol, self.xchol)
+
         return self._cov[self._sslc, self._sslc]
 
     @xcov.setter
@@ -241,7 +412,26 @@ class UnscentedTransform(object):
         :type x: np.ndarray
         """
 
-        self._cov[self._sslc, self._sslc] = x
+        if self._sqrt:
+            self._chol[self._sslc, self._sslc] = customcholesky(x) if self._model.hidden_ndim > 1 else np.sqrt(x)
+        else:
+            self._cov[self._sslc, self._sslc] = x
+
+    @property
+    def xchol(self):
+        """
+        Returns the lower triangular Cholesky factor of the covariance of the latest state.
+        :return: The Cholesky factor of the state covariance
+        :rtype: np.ndarray
+        """
+
+        if self._sqrt:
+            return self._chol[self._sslc, self._sslc]
+
+        if self._model.hidden_ndim < 2:
+            return np.sqrt(self.xcov)
+
+        return customcholesky(self.xcov)
 
     @property
     def ymean(self):
@@ -261,19 +451,68 @@ class UnscentedTransform(object):
         :rtype: np.ndarray
         """
 
+        if self._sqrt:
+            return outerm(self._ychol, self._ychol)
+
         return self._ycov
 
+    @property
+    def ychol(self):
+        """
+        Returns the lower triangular Cholesky factor of the covariance of the observation.
+        :return: The Cholesky factor of the covariance of the observational process
+        :rtype: np.ndarray
+        """
+
+        if self._sqrt:
+            return self._ychol
+
+        if self._model.obs_ndim < 2:
+            return np.sqrt(self._ycov)
+
+        return customcholesky(self._ycov)
+
+    def resample(self, inds):
+        """
+        Resamples the mean and covariance along the particle axis.
+        :param inds: The indices to choose
+        :type inds: np.ndarray
+        :return: Instance of self
+        :rtype: UnscentedTransform
+        """
+
+        self._mean = choose(self._mean, inds)
+
+        if self._sqrt:
+            self._chol = choose(self._chol, inds)
+        else:
+            self._cov = choose(self._cov, inds)
+
+        return self
+
     def construct(self, y):
         """
-        Constructs the mean and covariance given the current observation and previous state.
+        Constructs the mean and covariance given the current observation and previous state. The covariance, or its
+        Cholesky factor, is available through `xcov` and `xchol`, where the latter is not refactorized in square-root
+        mode.
         :param y: The current observation
         :type y: np.ndarray
-        :return: Estimated tate mean and covariance
-        :rtype: tuple of np.ndarray
+        :return: Estimated state mean
+        :rtype: np.ndarray
         """
 
         # ==== Get mean and covariance ===== #
 
+        if self._sqrt:
+            txmean, txchol, ymean, ychol = self._get_m_and_chol(y)
+
+            self._ymean = ymean
+            self._ychol = ychol
+            self._mean[self._sslc] = txmean
+            self._chol[self._sslc, self._sslc] = txchol
+
+            return txmean
+
         txmean, txcov, ymean, ycov = self._get_m_and_p(y)
 
         # ==== Overwrite mean and covariance ==== #
@@ -283,7 +522,7 @@ class UnscentedTransform(object):
         self._mean[self._sslc] = txmean
         self._cov[self._sslc, self._sslc] = txcov
 
-        return txmean, txcov
+        return txmean
 
     def get_meancov(self):
         """
@@ -292,6 +531,9 @@ class UnscentedTransform(object):
         :rtype: tuple
         """
 
+        if not self._augmented:
+            return self._get_meancov_additive()
+
         # ==== Propagate Sigma points ==== #
 
         spx, spy = self.propagate_sps()
@@ -303,6 +545,57 @@ class UnscentedTransform(object):
 
         return (xmean, xcov, spx), (ymean, ycov, spy)
 
+    def _get_meancov_additive(self):
+        """
+        Constructs the mean and covariance for the hidden and observable process respectively when not augmented. The
+        covariances of the noise are added to those of the Sigma points, and the Sigma points of the observation are
+        redrawn from the predicted mean and covariance of the state.
+        :return: The mean and covariance
+        :rtype: tuple
+        """
+
+        xmean, xcov = _get_meancov(self.propagate_sps(only_x=True), self._wm, self._wc)
+        xcov = xcov + _noisecov(self._model.hidden, self.xmean, self._noise[0])
+
+        spx = self._sigmapoints(xmean, customcholesky(xcov))
+        spy = _translate_sps(spx, self._model.observable)
+
+        ymean, ycov = _get_meancov(spy, self._wm, self._wc)
+        ycov = ycov + _noisecov(self._model.observable, xmean, self._noise[1])
+
+        return (xmean, xcov, spx), (ymean, ycov, spy)
+
+    def get_meanchol(self):
+        """
+        Constructs the mean and the Cholesky factor of the covariance for the hidden and observable process
+        respectively. In square-root mode the factors are obtained without factorizing the covariance.
+        :return: The mean, the Cholesky factor and the centered sigma points
+        :rtype: tuple
+        """
+
+        if not self._sqrt:
+            (xmean, xcov, spx), (ymean, ycov, spy) = self.get_meancov()
+            xcent, ycent = spx - xmean[:, None], spy - ymean[:, None]
+
+            return (xmean, customcholesky(xcov), xcent), (ymean, customcholesky(ycov), ycent)
+
+        if self._augmented:
+            spx, spy = self.propagate_sps()
+
+            return _get_meanchol(spx, self._wm, self._wc), _get_meanchol(spy, self._wm, self._wc)
+
+        # ==== Add the noise as additional columns of the factors ==== #
+
+        hnoise = _noisecov(self._model.hidden, self.xmean, self._noise[0], chol=True)
+        xmean, xchol, _ = _get_meanchol(self.propagate_sps(only_x=True), self._wm, self._wc, noise=hnoise)
+
+        spx = self._sigmapoints(xmean, xchol)
+        spy = _translate_sps(spx, self._model.observable)
+
+        onoise = _noisecov(self._model.observable, xmean, self._noise[1], chol=True)
+
+        return (xmean, xchol, spx - xmean[:, None]), _get_meanchol(spy, self._wm, self._wc, noise=onoise)
+
     def _get_m_and_p(self, y):
         """
         Helper method for generating the mean and covariance.
@@ -329,20 +622,53 @@ class UnscentedTransform(object):
 
         return txmean, txcov, ymean, ycov
 
-    def globalconstruct(self, y, x):
+    def _get_m_and_chol(self, y):
+        """
+        Helper method for generating the mean and Cholesky factor of the covariance in square-root mode, where the gain
+        is calculated using triangular solves and the factor of the state is downdated with the columns of
+        `gain * ychol`.
+        :param y: The latest observation
+        :type y: float|np.ndarray
+        :return: The estimated means and Cholesky factors of the covariances of state and observation
+        :rtype: tuple of np.ndarray
+        """
+
+        (xmean, xchol, xcent), (ymean, ychol, ycent) = self.get_meanchol()
+
+        # ==== Calculate cross covariance ==== #
+
+        xycov = _covcalc(xcent, ycent, self._wc)
+
+        # ==== Calculate the gain ==== #
+
+        gain = np.swapaxes(trisolve(ychol, trisolve(ychol, np.swapaxes(xycov, 0, 1)), trans=True), 0, 1)
+
+        # ===== Calculate true mean and Cholesky factor ==== #
+
+        txmean = xmean + dot(gain, expanddims(y, ymean.ndim) - ymean)
+
+        u = mdot(gain, ychol)
+        for j in range(u.shape[1]):
+            xchol = cholupdate(xchol, u[:, j], -1.)
+
+        return txmean, xchol, ymean, ychol
+
+    def globalconstruct(self, y, x, rng=None):
         """
         Constructs the mean and covariance given the current observation and previous state.
         :param y: The current observation
         :type y: np.ndarray
         :param x: The previous state
         :type x: np.ndarray
-        :return: The mean and covariance of the state
-        :rtype: tuple of np.ndarray
+        :param rng: The random number generator to use for jittering the state
+        :type rng: np.random.Generator
+        :return: The mean of the state, see `construct`
+        :rtype: np.ndarray
         """
 
         # ==== Overwrite mean and covariance ==== #
 
-        x += np.random.normal(scale=1e-3, size=x.shape)
+        x += get_rng(rng).normal(scale=1e-3, size=x.shape)
         mean = expanddims(x.mean(axis=-1), x.ndim)
         centered = x - mean
         if self._model.hidden_ndim > 1:
@@ -351,10 +677,43 @@ class UnscentedTransform(object):
             cov = expanddims((centered ** 2).mean(axis=-1), x.ndim)
 
         self._mean[self._sslc] = mean
-        self._cov[self._sslc, self._sslc] = cov
+        self.xcov = cov
 
-        # ==== Get mean and covariance ==== #
+        return self.construct(y)
 
-        txmean, txcov, ymean, ycov = self._get_m_and_p(y)
+    def clusterconstruct(self, y, x, labels):
+        """
+        Constructs the mean and covariance given the current observation and the previous states grouped into clusters,
+        where the prior of each cluster is given by the mean and covariance of its states.
+        :param y: The current observation
+        :type y: np.ndarray
+        :param x: The previous state
+        :type x: np.ndarray
+        :param labels: The cluster of each state, must be in [0, # clusters) where the number of clusters is the
+                       number of particles of the transform
+        :type labels: np.ndarray
+        :return: The mean of the state of each cluster, see `construct`
+        :rtype: np.ndarray
+        """
+
+        clusters = self._mean.shape[-1]
+        counts = np.bincount(labels, minlength=clusters)
+
+        def clustersum(u):
+            return np.bincount(labels, weights=u, minlength=clusters) / counts
+
+        # ==== Overwrite mean and covariance ==== #
+
+        if self._model.hidden_ndim > 1:
+            mean = np.stack([clustersum(u) for u in x])
+            centered = x - mean[:, labels]
+            cov = np.stack([[clustersum(u * v) for v in centered] for u in centered])
+            cov += 1e-8 * np.eye(self._model.hidden_ndim)[..., None]
+        else:
+            mean = clustersum(x)
+            cov = clustersum((x - mean[labels]) ** 2) + 1e-8
+
+        self._mean[self._sslc] = mean
+        self.xcov = cov
 
-        return txmean, txcov
\ No newline at end of file
+        return self.construct(y)
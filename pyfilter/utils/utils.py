@@ -195,6 +195,93 @@ def customcholesky(a):
     return np.linalg.cholesky(a.transpose(firstaxes)).transpose(secondaxes)
 
 
+def trisolve(a, b, trans=False):
+    """
+    Solves the system `a * x = b` for a lower triangular `a` by forward substitution. The matrix axes are the first
+    two axes of `a`, and any remaining axes are broadcasted against those of `b`.
+    :param a: The lower triangular matrix
+    :type a: np.ndarray
+    :param b: The right hand side
+    :type b: np.ndarray
+    :param trans: Whether to solve the system `a^t * x = b` by backward substitution instead
+    :type trans: bool
+    :return: The solution `x`
+    :rtype: np.ndarray
+    """
+
+    out = np.empty((a.shape[0], *np.broadcast(a[0, 0], b[0]).shape))
+
+    if trans:
+        for i in reversed(range(a.shape[0])):
+            out[i] = (b[i] - np.einsum('j...,j...->...', a[i+1:, i], out[i+1:])) / a[i, i]
+
+        return out
+
+    for i in range(a.shape[0]):
+        out[i] = (b[i] - np.einsum('j...,j...->...', a[i, :i], out[:i])) / a[i, i]
+
+    return out
+
+
+def triangularize(a):
+    """
+    Returns the lower triangular matrix `l` with positive diagonal such that `l * l^t = a * a^t`, via the QR
+    decomposition of `a^t`. The matrix axes are the first two axes, and `a` must have at least as many columns as rows.
+    :param a: The matrix
+    :type a: np.ndarray
+    :return: The triangular factor
+    :rtype: np.ndarray
+    """
+
+    if a.shape[0] < 2:
+        return np.sqrt((a ** 2).sum(axis=1, keepdims=True))
+
+    batch = tuple(range(2, a.ndim))
+    r = np.linalg.qr(a.transpose(*batch, 1, 0), mode='r')[..., :a.shape[0], :]
+    r *= np.sign(np.diagonal(r, axis1=-2, axis2=-1))[..., None]
+
+    return r.transpose(-1, -2, *range(len(batch)))
+
+
+def cholupdate(l, v, sign=1.):
+    """
+    Performs the rank one update of the lower triangular Cholesky factor `l`, i.e. returns the factor of
+    `l * l^t + sign * v * v^t`. The matrix axes are the first two axes of `l`, and the vector axis the first of `v`.
+    :param l: The Cholesky factor
+    :type l: np.ndarray
+    :param v: The vector
+    :type v: np.ndarray
+    :param sign: The sign of the update, i.e. -1 for a downdate
+    :type sign: float
+    :return: The updated factor
+    :rtype: np.ndarray
+    """
+
+    l = np.array(l, dtype=float)
+    v = np.array(np.broadcast_to(v, l.shape[1:]), dtype=float)
+
+    for k in range(l.shape[0]):
+        r = np.sqrt(l[k, k] ** 2 + sign * v[k] ** 2)
+        c, s = r / l[k, k], v[k] / l[k, k]
+
+        l[k, k] = r
+        l[k+1:, k] = (l[k+1:, k] + sign * s * v[k+1:]) / c
+        v[k+1:] = c * v[k+1:] - s * l[k+1:, k]
+
+    return l
+
+
+def istril(a):
+    """
+    Checks whether the matrix `a` is lower triangular, where the matrix axes are the first two axes.
+    :param a: The matrix
+    :type a: np.ndarray
+    :rtype: bool
+    """
+
+    return not a[np.triu_indices(a.shape[0], 1)].any()
+
+
 def resizer(tup):
     """
     Recasts all the non-array elements of an array to arrays of the same size as the array elements. If you for example
@@ -245,6 +332,79 @@ def flatten(iterable):
     return out
 
 
+def _indexed(f, x, indexed=False):
+    """
+    Returns `f` as a function of the stacked columns `z`, of shape (ndim, # stacked, # columns), of the particles
+    `inds`, returning the values of shape (# stacked, # columns). If `indexed`, `f` is called as `f(x, inds)` with the
+    stacked columns placed side by side and the indices repeated accordingly, i.e. in one evaluation on the particles
+    `inds` only. Otherwise `f` is evaluated on the whole array once per stack, where the columns are inserted into a
+    copy of `x` unless they cover all of it.
+    :param f: The function
+    :type f: callable
+    :param x: The full array of shape (ndim, # particles)
+    :type x: np.ndarray
+    :param indexed: Whether `f` takes the indices of the particles as second argument
+    :type indexed: bool
+    :rtype: callable
+    """
+
+    if indexed:
+        def func(z, inds):
+            out = f(z.reshape(z.shape[0], -1), np.tile(inds, z.shape[1]))
+
+            return np.reshape(out, z.shape[1:])
+
+        return func
+
+    def func(z, inds):
+        out = np.empty(z.shape[1:])
+
+        if inds.size == x.shape[-1]:
+            for i in range(z.shape[1]):
+                out[i] = np.reshape(f(z[:, i]), x.shape[1:])
+
+            return out
+
+        full = x.copy()
+        for i in range(z.shape[1]):
+            full[:, inds] = z[:, i]
+            out[i] = np.reshape(f(full), x.shape[1:])[inds]
+
+        return out
+
+    return func
+
+
+def _fprime(x, func, inds, epsilon, central=True):
+    """
+    Approximates the gradient of the indexed function `func` by central or forward differences, evaluated at all points
+    at once.
+    :param x: The point at which to approximate the gradient, of shape (ndim, # columns)
+    :type x: np.ndarray
+    :param func: The indexed function, see `_indexed`
+    :type func: callable
+    :param inds: The indices of the particles
+    :type inds: np.ndarray
+    :param epsilon: The discretization to use
+    :type epsilon: float
+    :param central: Whether to use central differences, else forward differences requiring `ndim` fewer evaluations
+    :type central: bool
+    :return: The value of the function at `x` and the gradient
+    :rtype: tuple of np.ndarray
+    """
+
+    ndim = x.shape[0]
+    steps = (epsilon * np.eye(ndim), -epsilon * np.eye(ndim)) if central else (epsilon * np.eye(ndim),)
+    offsets = np.concatenate((np.zeros((ndim, 1)), *steps), axis=1)
+
+    fx = func(x[:, None] + offsets[..., None], inds)
+
+    if not central:
+        return fx[0], (fx[1:] - fx[0]) / epsilon
+
+    return fx[0], (fx[1:ndim + 1] - fx[ndim + 1:]) / 2 / epsilon
+
+
 def approx_fprime(x, f, epsilon):
     """
     Wrapper for scipy's `approx_fprime`. Handles vectorized functions.
@@ -258,18 +418,40 @@ def approx_fprime(x, f, epsilon):
     :rtype: np.ndarray
     """
 
-    f0 = f(x)
+    x = np.array(x, dtype=float)
+    columns = x.reshape(x.shape[0], -1)
+
+    _, grad = _fprime(columns, _indexed(f, columns), np.arange(columns.shape[-1]), epsilon, central=False)
 
-    grad = np.zeros_like(x)
-    ei = np.zeros_like(x)
+    return grad.reshape(x.shape)
 
-    for k in range(x.shape[0]):
-        ei[k] = 1.
-        d = epsilon * ei
-        grad[k] = (f(x + d) - f0) / d[k]
-        ei[k] = 0.
 
-    return grad
+def _line_search(func, x, p, grad, a, amin, fx, inds):
+    """
+    Implements the line search of `line_search` for the indexed function `func`, see `_indexed`. Only the particles
+    that have not yet satisfied the Armijo condition are evaluated in each iteration.
+    :param fx: The value of the function at `x`
+    :type fx: np.ndarray
+    :param inds: The indices of the particles of the columns of `x`
+    :type inds: np.ndarray
+    :return: The step sizes
+    :rtype: np.ndarray
+    """
+
+    c = tau = 0.75
+
+    t = -c * (p * grad).sum(axis=0)
+    a = a * np.ones(x.shape[-1])
+
+    active = np.arange(x.shape[-1])
+    while active.size > 0:
+        z = x[:, active] + a[active] * p[:, active]
+        done = (fx[active] - func(z[:, None], inds[active])[0] >= a[active] * t[active]) | (a[active] <= amin)
+
+        active = active[~done]
+        a[active] *= tau
+
+    return a
 
 
 def line_search(f, x, p, grad, a=10, amin=1e-8):
@@ -291,32 +473,23 @@ def line_search(f, x, p, grad, a=10, amin=1e-8):
     :rtype: np.ndarray
     """
     # TODO: Implement full Wolfe conditions
-    c = tau = 0.75
-
-    m = (p * grad).sum(axis=0)
-    t = -c * m
-
-    fx = f(x)
-
-    a = a * np.ones(x.shape[1:])
-    if isinstance(a, np.ndarray):
-        a = a[None, :]
+    scalar = x.ndim < 2
+    if scalar:
+        x, p, grad = x[:, None], p[:, None], grad[:, None]
 
-    inds = fx - f(x + a * p) >= a * t
-    while not inds.all():
-        if a.ndim > 0:
-            a[~inds] *= tau
-        else:
-            a *= tau
+    inds = np.arange(x.shape[-1])
+    func = _indexed(f, x)
 
-        inds = (fx - f(x + a * p) >= a * t) | (a <= amin)
+    a = _line_search(func, x, p, grad, a, amin, func(x[:, None], inds)[0], inds)
 
-    return a
+    return a[0] if scalar else a
 
 
-def bfgs(f, x, epsilon=1e-7, tol=1e-2, maxiter=50):
+def bfgs(f, x, epsilon=1e-7, tol=1e-2, maxiter=50, hessinv=None, indexed=False):
     """
-    Implements a vectorized version of the BFGS algorithm.
+    Implements a vectorized version of the BFGS algorithm, where each column of `x` is a separate problem. If `f` is
+    indexed, the columns that have converged are dropped from the iterations. Otherwise all columns are iterated until
+    95% of them have converged, as `f` is evaluated on the full array regardless.
     :param f: The function minimize
     :type f: callable
     :param x: Starting point
@@ -327,51 +500,54 @@ def bfgs(f, x, epsilon=1e-7, tol=1e-2, maxiter=50):
     :type tol: float
     :param maxiter: The maximum number of iterations
     :type maxiter: int
+    :param hessinv: The initial inverse hessian, defaults to the identity
+    :type hessinv: np.ndarray
+    :param indexed: Whether `f` is called as `f(x, inds)`, where `inds` are the indices of the columns of the full
+                    array that `x` corresponds to, possibly repeated. If so, `f` is only evaluated on the columns that
+                    have not converged, and the central differences are evaluated in one call. Otherwise `f` is
+                    evaluated on the full array, and the gradient is approximated by forward differences
+    :type indexed: bool
     :return: The optimization results
     :rtype: OptimizeResult
     """
     if not isinstance(x, np.ndarray):
         x = np.array([x], dtype=float)
 
-    hessinv = np.zeros((x.shape[0], *x.shape))
-    hessinv[np.diag_indices(x.shape[0])] = 1
+    scalar = x.ndim < 2
+    x = x[:, None].astype(float) if scalar else x.astype(float)
+
+    eye = expanddims(np.eye(x.shape[0]), 3)
+    hessinv = np.repeat(eye, x.shape[-1], axis=-1) if hessinv is None else expanddims(hessinv, 3).copy()
 
-    eye = hessinv.copy()
+    func = _indexed(f, x, indexed)
 
-    converged = np.zeros_like(x, dtype=bool)
+    xout, hout = x.copy(), hessinv.copy()
 
-    xold = x.copy()
-    gradold = approx_fprime(xold, f, epsilon)
+    inds = np.arange(x.shape[-1])
+    fold, gradold = _fprime(x, func, inds, epsilon, central=indexed)
 
-    amax = 1e2
+    xold = x
+    amax = 1e2 * np.ones(x.shape[-1])
     iters = 0
-    while converged.mean() < 0.95 and iters < maxiter:
-        # TODO: figure out a way to only optimize those that haven't converged. Causing errors
+    while inds.size > 0 and iters < maxiter:
         p = dot(hessinv, -gradold)
 
-        with np.errstate(divide='ignore'):
+        with np.errstate(divide='ignore', invalid='ignore'):
             p = p / np.sqrt((p ** 2).sum(axis=0))
 
         p[np.isnan(p)] = 0.
         # TODO: Seems as like it can take a too big of a step - fix this
-        a = line_search(f, xold, p, gradold, a=amax)
+        a = _line_search(func, xold, p, gradold, amax, 1e-8, fold, inds)
 
         s = a * p
         xnew = xold + s
 
-        gradnew = approx_fprime(xnew, f, epsilon)
+        fnew, gradnew = _fprime(xnew, func, inds, epsilon, central=indexed)
         y = gradnew - gradold
 
-        with np.errstate(divide='raise'):
-            try:
-                tmp = (y * s).sum(axis=0)
-                rhok = 1 / tmp
-            except FloatingPointError:
-                if isinstance(tmp, np.ndarray):
-                    tmp[tmp == 0.] = 1e-3
-                else:
-                    tmp = 1e-3
-                rhok = 1. / tmp
+        tmp = (y * s).sum(axis=0)
+        tmp[tmp == 0.] = 1e-3
+        rhok = 1 / tmp
 
         t1 = eye - s[:, None] * y[None, :] * rhok
         t2 = eye - y[:, None] * s[None, :] * rhok
@@ -379,15 +555,24 @@ def bfgs(f, x, epsilon=1e-7, tol=1e-2, maxiter=50):
 
         hessinv = mdot(mdot(t1, hessinv), t2) + t3
 
-        converged = np.sqrt((gradnew ** 2).sum(axis=0)) < tol
+        xout[:, inds] = xnew
+        hout[..., inds] = hessinv
 
-        xold = xnew.copy()
-        gradold = gradnew.copy()
+        # ===== Drop the converged columns, or all of them once most have converged if `f` is not indexed ===== #
+        active = np.sqrt((gradnew ** 2).sum(axis=0)) >= tol
+        if not indexed:
+            active = np.full(active.shape, active.mean() > 0.05)
 
-        amax = 2 * a.max()
+        inds, xold, fold, gradold, hessinv = inds[active], xnew[:, active], fnew[active], gradnew[:, active], \
+            hessinv[..., active]
+
+        amax = 2 * a[active]
         iters += 1
 
-    return OptimizeResult(xnew, hessinv)
+    if scalar:
+        return OptimizeResult(xout[:, 0], hout[..., 0])
+
+    return OptimizeResult(xout, hout)
 
 
 class OptimizeResult(object):
@@ -9,9 +9,9 @@ setup(
     description='Package for performing online Bayesian inference in state space models',
     packages=find_packages(),
     install_requires=[
-        'numpy>=1.11.3',
+        'numpy>=1.22.0',
         'matplotlib>=2.0.0',
         'pandas>=0.19.2',
-        'scipy>=0.18.1',
+        'scipy>=1.7.0',
     ]
 )
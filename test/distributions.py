@@ -2,6 +2,7 @@ import unittest
 import pyfilter.distributions.continuous as cont
 import numpy as np
 import scipy.stats as stats
+from pyfilter.distributions.transforms import StackedTransform
 
 
 class Tests(unittest.TestCase):
@@ -72,3 +73,94 @@ class Tests(unittest.TestCase):
         true_y = true_rv.logpdf(x)
 
         assert np.sqrt(((y - true_y) ** 2).mean()) < 1e-14
+
+    def test_ClosedFormLogPdf(self):
+        x = np.linspace(-1, 5, num=1000)
+        u = np.linspace(-0.2, 1.2, num=1000)
+
+        pairs = [
+            (cont.Gamma(2.5, loc=0.1, scale=2), stats.gamma(2.5, loc=0.1, scale=2), x),
+            (cont.InverseGamma(2.5, loc=0.1, scale=2), stats.invgamma(2.5, loc=0.1, scale=2), x),
+            (cont.Beta(2, 3), stats.beta(2, 3), u),
+            (cont.Uniform(-1, 2), stats.uniform(-1, 3), x),
+            (cont.Student(3, 1, 2), stats.t(3, loc=1, scale=2), x)
+        ]
+
+        for rv, true_rv, values in pairs:
+            y = rv.logpdf(values)
+            true_y = true_rv.logpdf(values)
+
+            assert np.array_equal(np.isinf(y), np.isinf(true_y))
+            assert np.allclose(y[~np.isinf(y)], true_y[~np.isinf(true_y)])
+
+        assert np.isfinite(cont.Student(1e6).logpdf(0.))
+
+    def test_MVNBatchedCholesky(self):
+        covs = [stats.wishart(3, scale=np.eye(3)).rvs() for _ in range(100)]
+        choleskied = np.linalg.cholesky(np.array(covs)).transpose(1, 2, 0)
+
+        x = np.random.normal(size=(3, 100))
+        mean = np.random.normal(size=(3, 100))
+
+        mvn = cont.MultivariateNormal(ndim=3)
+
+        est = mvn.logpdf(x, mean, choleskied)
+        true = [stats.multivariate_normal.logpdf(x[:, i], mean[:, i], c) for i, c in enumerate(covs)]
+
+        assert np.allclose(est, true)
+
+    def test_MVNSample(self):
+        cov = stats.wishart(3, scale=np.eye(3)).rvs()
+        choleskied = np.linalg.cholesky(cov)
+
+        mean = np.random.normal(size=3)
+        mvn = cont.MultivariateNormal(mean, choleskied)
+
+        out = np.empty((3, 100000))
+        samples = mvn.rvs(out=out)
+
+        assert samples is out
+        assert np.allclose(samples.mean(axis=-1), mean, atol=5e-2)
+        assert np.allclose(np.cov(samples), cov, atol=1e-1)
+
+        batched = np.zeros((3, 3, 1000))
+        batched[:, :, :] = choleskied[:, :, None]
+
+        assert mvn.rvs(np.zeros((3, 1000)), batched).shape == (3, 1000)
+        assert mvn.rvs(size=(10, 20)).shape == (3, 10, 20)
+
+    def test_TrustedWrites(self):
+        gamma = cont.Gamma(1).sample(size=100)
+
+        gamma.t_values = np.zeros(100)
+        assert np.allclose(gamma.values, 1.)
+
+        gamma._set_values(-np.ones(100), trusted=True)
+        assert np.all(gamma.values == -1.)
+
+        with self.assertRaises(AssertionError):
+            gamma.values = -np.ones(100)
+
+        try:
+            cont.Distribution.debug = True
+
+            with self.assertRaises(AssertionError):
+                gamma._set_values(-np.ones(100), trusted=True)
+        finally:
+            cont.Distribution.debug = False
+
+    def test_StackedTransform(self):
+        dists = [cont.Normal(), cont.Gamma(1), cont.Beta(1, 1), cont.Uniform(-1, 3)]
+        stacked = StackedTransform(dists, ndim=2)
+
+        x = np.stack([d.rvs(size=100) for d in dists])
+        y = stacked.transform(x)
+
+        assert np.allclose(y, np.stack([d.transform(v) for d, v in zip(dists, x)]))
+        assert np.allclose(stacked.inverse_transform(y), x)
+
+        eps = 1e-6
+        numerical = np.log((stacked.inverse_transform(y + eps) - stacked.inverse_transform(y - eps)) / 2 / eps)
+
+        assert np.allclose(stacked.log_jacobian(y), numerical.sum(axis=0), atol=1e-5)
+        assert np.allclose(stacked.log_jacobian(y), sum(d.log_jacobian(v) for d, v in zip(dists, y)))
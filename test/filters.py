@@ -3,10 +3,16 @@ import numpy as np
 import pykalman
 import scipy.stats as stats
 from pyfilter.distributions.continuous import Normal, Gamma, MultivariateNormal
-from pyfilter.filters import Linearized, NESS, RAPF, SMC2, SISR, APF, UPF, GlobalUPF, UKF, KalmanLaplace, NESSMC2
+from pyfilter.filters import Linearized, NESS, RAPF, SMC2, SISR, APF, UPF, GlobalUPF, UKF, KalmanLaplace, NESSMC2, \
+    SQMC, EnKF, EKF, RBPF
+from pyfilter.proposals import Linearized as Linz, Optimal
 from pyfilter.timeseries import StateSpaceModel, Observable, Base
 from pyfilter.utils.normalization import normalize
 from pyfilter.utils.utils import dot
+from pyfilter.utils.sizing import kld, ess
+from pyfilter.utils.deadline import Deadline
+from pyfilter.utils.summaries import mean, variance, quantile, exceedance
+from functools import partial
 
 
 def f(x, alpha, sigma):
@@ -54,12 +60,12 @@ def fomvn(x, alpha, sigma):
 
 
 class Tests(unittest.TestCase):
-    linear = Base((f0, g0), (f, g), (1, 1), (Normal(), Normal()))
-    linearobs = Observable((fo, go), (1, 1), Normal())
+    linear = Base((f0, g0), (f, g), (1, 1), (Normal(), Normal()), additive=True)
+    linearobs = Observable((fo, go), (1, 1), Normal(), additive=True)
     model = StateSpaceModel(linear, linearobs)
 
-    mvn = Base((f0mvn, g0mvn), (fmvn, gmvn), (0.5, 1), (MultivariateNormal(), MultivariateNormal()))
-    mvnobs = Observable((fomvn, go), (1, 1), Normal())
+    mvn = Base((f0mvn, g0mvn), (fmvn, gmvn), (0.5, 1), (MultivariateNormal(), MultivariateNormal()), additive=True)
+    mvnobs = Observable((fomvn, go), (1, 1), Normal(), additive=True)
     mvnmodel = StateSpaceModel(mvn, mvnobs)
 
     def test_InitializeFilter(self):
@@ -88,6 +94,116 @@ class Tests(unittest.TestCase):
 
         assert rmse < 0.05
 
+    def test_AdaptiveSISR(self):
+        x, y = self.model.sample(500)
+
+        filt = SISR(self.model, 1000, bounds=(100, 5000), sizing=partial(kld, binsize=0.1)).initialize()
+        filt = filt.longfilter(y)
+
+        estimates = np.array(filt.filtermeans())
+
+        kf = pykalman.KalmanFilter(transition_matrices=1, observation_matrices=1)
+        filterestimates = kf.filter(y)
+
+        rmse = np.sqrt(np.mean((estimates - filterestimates[0][:, 0]) ** 2))
+
+        assert rmse < 0.1
+        assert len(filt.s_particles) == 500 and filt.s_particles[0] == 1000
+        assert all(100 <= n <= 5000 for n in filt.s_particles) and len(set(filt.s_particles)) > 1
+
+        filt = SISR(self.model, 1000, bounds=(100, 20000), sizing=partial(ess, target=500)).initialize()
+        filt = filt.longfilter(y)
+
+        assert all(100 <= n <= 20000 for n in filt.s_particles) and np.mean(filt.s_particles) > 500
+
+    def test_Deadline(self):
+        deadline = Deadline(1e-3, (100, 5000), quantile=0.5, window=3)
+
+        assert deadline.update(2e-3, 1000) == 500 and deadline.update(1e-3, 1000) == 666
+        assert deadline.update(1e-3, 1000) == 1000 and deadline.update(1e-6, 1000) == 1000
+        assert deadline.update(1e-6, 1000) == 5000 and deadline.update(1., 1000) == 5000
+
+        assert [d['next'] for d in deadline.log] == [500, 666, 1000, 1000, 5000, 5000]
+        assert np.isclose(deadline.log[0]['predicted'], 1e-3) and len(deadline.reset().log) == 0
+
+        x, y = self.model.sample(50)
+
+        deadline = Deadline(2e-3, (100, 50000))
+        filt = SISR(self.model, 1000, deadline=deadline).initialize().longfilter(y)
+
+        # ===== The particles of a step are drawn at the resampling of the previous step ===== #
+        nexts = [d['next'] for d in deadline.log]
+
+        assert len(deadline.log) == 50 and [d['effort'] for d in deadline.log] == filt.s_particles
+        assert filt.s_particles[2:] == nexts[:-2] and all(100 <= n <= 50000 for n in nexts)
+
+        deadline = Deadline(1e-3, (1, 10), knob='iterations')
+        filt = Linearized(self.model, 1000, deadline=deadline).initialize().longfilter(y[:10])
+
+        assert [d['effort'] for d in deadline.log[1:]] == [d['next'] for d in deadline.log[:-1]]
+        assert filt._proposal._maxiter == deadline.log[-1]['next']
+
+        with self.assertRaises(NotImplementedError):
+            EKF(self.model, deadline=Deadline(1e-3, (1, 10)))
+
+        with self.assertRaises(NotImplementedError):
+            SISR(self.model, 1000, deadline=Deadline(1e-3, (1, 10), knob='iterations'))
+
+    def test_Summaries(self):
+        x, y = self.model.sample(500)
+
+        summaries = {
+            'mean': mean, 'variance': variance, 'quartiles': quantile((0.25, 0.75)), 'positive': exceedance(0.)
+        }
+        filt = SISR(self.model, 5000, summaries=summaries).initialize().longfilter(y)
+
+        kf = pykalman.KalmanFilter(transition_matrices=1, observation_matrices=1)
+        means, covs = kf.filter(y)
+
+        quartiles = filt.summary('quartiles')
+        positive = stats.norm.sf(0., loc=means[:, 0], scale=np.sqrt(covs[:, 0, 0]))
+
+        assert len(filt.s_n) == 0 and filt.summary('variance').shape == (500,) and quartiles.shape == (500, 2)
+        assert np.sqrt(np.mean((filt.summary('mean') - means[:, 0]) ** 2)) < 0.05
+        assert np.sqrt(np.mean((filt.summary('variance') - covs[:, 0, 0]) ** 2)) < 0.05
+        assert np.sqrt(np.mean((quartiles.mean(axis=1) - means[:, 0]) ** 2)) < 0.05
+        assert np.sqrt(np.mean((filt.summary('positive') - positive) ** 2)) < 0.05
+        assert np.shares_memory(filt.s_mx, filt.s_summaries['mean'].values)
+
+        ukf = UKF(self.model).initialize().longfilter(y[:50])
+
+        assert set(ukf.s_summaries) == {'mean', 'noise'} and ukf.s_mx.shape == ukf.s_n.shape == (50,)
+        assert np.allclose(ukf.filtermeans(), ukf.summary('mean'))
+
+        with self.assertRaises(ValueError):
+            SISR(self.model, 5000, summaries=('mean', 'skew'))
+
+        with self.assertRaises(NotImplementedError):
+            UKF(self.model, summaries=('mean', 'variance'))
+
+    def test_Optimal(self):
+        x, y = self.mvnmodel.sample(500)
+
+        kf = pykalman.KalmanFilter(transition_matrices=[[0.5, 1 / 3], [0, 1]], observation_matrices=[1, 2])
+        filterestimates = kf.filter(y)
+
+        loading = lambda alpha, sigma: np.array([1, 2])
+
+        for proposal in [Optimal(), Optimal(loading=loading)]:
+            filt = SISR(self.mvnmodel, 500, proposal=proposal).initialize().longfilter(y)
+
+            estimates = np.array(filt.filtermeans())
+
+            rmse = np.sqrt(np.mean((estimates - filterestimates[0]) ** 2))
+            logldiff = np.abs((kf.loglikelihood(y) - np.array(filt.s_l).sum()) / kf.loglikelihood(y))
+
+            assert rmse < 0.05 and logldiff < 0.01
+
+        nonlinear = StateSpaceModel(self.linear, Observable((lambda u, alpha, sigma: u ** 2, go), (1, 1), Normal()))
+
+        with self.assertRaises(ValueError):
+            SISR(nonlinear, 500, proposal=Optimal()).initialize().longfilter(y[:1])
+
     def test_APF(self):
         x, y = self.model.sample(500)
 
@@ -133,6 +249,24 @@ class Tests(unittest.TestCase):
 
         assert (apferror < 0.01) and (sisrerror < 0.01) and (linerror < 0.01) and (upferror < 0.01) and (ukferr < 0.01)
 
+    def test_FastLikelihood(self):
+        x, y = self.model.sample(500)
+
+        for filt in [SISR(self.model, 1000, seed=1), APF(self.model, 1000, seed=1), UKF(self.model, seed=1)]:
+            longfilt = filt.copy().set_seed(2).initialize().longfilter(y)
+            filt = filt.set_seed(2).initialize()
+
+            assert np.allclose(filt.loglikelihood(y), np.sum(longfilt.s_l, axis=0))
+            assert len(filt.s_l) == 0 and len(filt.s_mx) == 0 and len(filt.s_n) == 0
+
+        linear = Base((f0, g0), (f, g), (1, Gamma(1)), (Normal(), Normal()))
+        model = StateSpaceModel(linear, self.model.observable)
+
+        filt = SISR(model, (100, 300), seed=3).initialize()
+        ll = filt.copy().set_seed(4).loglikelihood(y)
+
+        assert ll.shape == (100,) and np.allclose(ll, np.sum(filt.set_seed(4).longfilter(y).s_l, axis=0))
+
     def test_MultiDimensional(self):
         x, y = self.model.sample(50)
 
@@ -265,6 +399,22 @@ class Tests(unittest.TestCase):
 
         assert rmse < 0.05
 
+    def test_LinearizedFallback(self):
+        x = self.model.initialize(1000)
+        y = 1.
+
+        newton = Linz().set_model(self.model).set_rng(np.random.default_rng())
+        newton.draw(y, x)
+
+        assert np.allclose(newton._kernel.loc, (x + y) / 2, atol=1e-4)
+        assert np.allclose(newton._kernel.scale ** 2, 0.5, atol=1e-2)
+
+        # ===== No step is smaller than zero, so every particle is drawn from the prior ===== #
+        fallback = Linz(tol=0.).set_model(self.model).set_rng(np.random.default_rng())
+        fallback.draw(y, x)
+
+        assert np.allclose(fallback._kernel.loc, x) and np.allclose(fallback._kernel.scale, 1)
+
     def test_Gradient(self):
         x, y = self.model.sample(500)
 
@@ -280,7 +430,7 @@ class Tests(unittest.TestCase):
         def truderiv(obs, mu, sigma):
             return ((obs - mu) ** 2 - sigma ** 2) / sigma ** 3
 
-        truederiv = truderiv(y[-1], rapf.s_mx[-1], self.model.observable.theta[-1])
+        truederiv = truderiv(y[-1], rapf.s_mx[-1], self.model.observable.theta[-1].values)
 
         assert np.allclose(truederiv, grad[-1][-1], atol=1e-4)
 
@@ -359,6 +509,82 @@ class Tests(unittest.TestCase):
 
         assert rmse < 0.05 and logldiff < 0.01
 
+    def test_NewtonKLF(self):
+        x, y = self.mvnmodel.sample(500)
+
+        filt = KalmanLaplace(self.mvnmodel, newton=3).initialize().longfilter(y)
+
+        estimates = np.array(filt.filtermeans())
+
+        kf = pykalman.KalmanFilter(transition_matrices=[[0.5, 1 / 3], [0, 1]], observation_matrices=[1, 2])
+        filterestimates = kf.filter(y)
+
+        rmse = np.sqrt(np.mean((estimates - filterestimates[0]) ** 2))
+
+        logldiff = np.abs((kf.loglikelihood(y) - np.array(filt.s_l).sum()) / kf.loglikelihood(y))
+
+        assert rmse < 0.05 and logldiff < 0.01
+
+        particles = KalmanLaplace(self.mvnmodel, particles=100, newton=1).initialize().longfilter(y)
+
+        logldiff = np.abs((kf.loglikelihood(y) - np.array(particles.s_l).sum(axis=0)) / kf.loglikelihood(y))
+
+        assert (logldiff < 0.01).all()
+
+    def test_EnKF(self):
+        x, y = self.mvnmodel.sample(500)
+
+        kf = pykalman.KalmanFilter(transition_matrices=[[0.5, 1 / 3], [0, 1]], observation_matrices=[1, 2])
+        filterestimates = kf.filter(y)
+
+        for sqrt in [False, True]:
+            filt = EnKF(self.mvnmodel, ensemble=1000, sqrt=sqrt).initialize().longfilter(y)
+
+            estimates = np.array(filt.filtermeans())
+
+            rmse = np.sqrt(np.mean((estimates - filterestimates[0]) ** 2))
+            logldiff = np.abs((kf.loglikelihood(y) - np.array(filt.s_l).sum()) / kf.loglikelihood(y))
+
+            assert rmse < 0.1 and logldiff < 0.01
+
+    def test_EKF(self):
+        x, y = self.mvnmodel.sample(500)
+
+        filt = EKF(self.mvnmodel).initialize().longfilter(y)
+
+        estimates = np.array(filt.filtermeans())
+
+        kf = pykalman.KalmanFilter(transition_matrices=[[0.5, 1 / 3], [0, 1]], observation_matrices=[1, 2])
+        filterestimates = kf.filter(y)
+
+        rmse = np.sqrt(np.mean((estimates - filterestimates[0]) ** 2))
+        logldiff = np.abs((kf.loglikelihood(y) - np.array(filt.s_l).sum()) / kf.loglikelihood(y))
+
+        assert rmse < 0.05 and logldiff < 0.01
+
+        jacobians = lambda u, alpha, sigma: np.array([[alpha, 1 / 3], [0, 1]]), lambda u, alpha, sigma: np.array([1, 2])
+        analytical = EKF(self.mvnmodel, jacobians=jacobians).initialize().longfilter(y)
+
+        assert np.allclose(analytical.s_l, filt.s_l)
+
+    def test_RBPF(self):
+        x, y = self.mvnmodel.sample(500)
+
+        filt = RBPF(self.mvnmodel, 1000, linear=(1,)).initialize().longfilter(y)
+
+        estimates = np.array(filt.filtermeans())
+
+        kf = pykalman.KalmanFilter(transition_matrices=[[0.5, 1 / 3], [0, 1]], observation_matrices=[1, 2])
+        filterestimates = kf.filter(y)
+
+        rmse = np.sqrt(np.mean((estimates - filterestimates[0]) ** 2))
+        logldiff = np.abs((kf.loglikelihood(y) - np.array(filt.s_l).sum()) / kf.loglikelihood(y))
+
+        assert rmse < 0.05 and logldiff < 0.01
+
+        with self.assertRaises(ValueError):
+            RBPF(self.mvnmodel, 1000, linear=(0, 1))
+
     def test_NESSMC2(self):
         x, y = self.model.sample(500)
 
@@ -375,4 +601,116 @@ class Tests(unittest.TestCase):
         mean = np.mean(estimates.values)
         std = np.std(estimates.values)
 
-        assert mean - std < 1 < mean + std
\ No newline at end of file
+        assert mean - std < 1 < mean + std
+
+    def test_Seeding(self):
+        x, y = self.model.sample(50)
+
+        first = SISR(self.model, 500, seed=123).initialize().longfilter(y, bar=False)
+        second = SISR(self.model, 500, seed=123).initialize().longfilter(y, bar=False)
+
+        assert np.array_equal(first.s_l, second.s_l)
+
+        shards = [s.reset().longfilter(y, bar=False) for s in first.spawn(2)]
+
+        assert not np.array_equal(shards[0].s_l, shards[1].s_l)
+
+        first = SISR(self.model, 500, seed=123, prefetch=2000).initialize().longfilter(y, bar=False)
+        second = SISR(self.model, 500, seed=123, prefetch=2000).initialize().longfilter(y, bar=False)
+
+        assert np.array_equal(first.s_l, second.s_l)
+
+    def test_SQMC(self):
+        x, y = self.model.sample(500)
+
+        sqmc = SQMC(self.model, 1024, seed=123).initialize().longfilter(y, bar=False)
+
+        kf = pykalman.KalmanFilter(transition_matrices=1, observation_matrices=1)
+        kalmanloglikelihood = kf.loglikelihood(y)
+
+        sqmcerror = np.abs((kalmanloglikelihood - np.array(sqmc.s_l).sum()) / kalmanloglikelihood)
+
+        assert sqmcerror < 0.01
+
+        x, y = self.mvnmodel.sample(50)
+
+        sqmc = SQMC(self.mvnmodel, 1024).initialize().longfilter(y, bar=False)
+        sisr = SISR(self.mvnmodel, 1024).initialize().longfilter(y, bar=False)
+
+        assert sqmc._old_x.shape == (2, 1024)
+        assert np.abs(np.sum(sqmc.s_l) - np.sum(sisr.s_l)) < 5
+
+        prefetched = SQMC(self.mvnmodel, 1024, seed=123, prefetch=2 ** 12).initialize().longfilter(y, bar=False)
+
+        assert np.abs(np.sum(prefetched.s_l) - np.sum(sisr.s_l)) < 5
+
+    def test_SquareRootUKF(self):
+        x, y = self.mvnmodel.sample(50)
+
+        ukf = UKF(self.mvnmodel).initialize().longfilter(y, bar=False)
+        srukf = UKF(self.mvnmodel, utkwargs={'sqrt': True}).initialize().longfilter(y, bar=False)
+
+        assert np.allclose(ukf.s_l, srukf.s_l) and np.allclose(ukf.filtermeans(), srukf.filtermeans())
+        assert srukf._ut.ychol is srukf._ut._ychol and srukf._ut.xchol.base is srukf._ut._chol
+
+        x, y = self.model.sample(50)
+
+        upf = UPF(self.model, 500, seed=123).initialize().longfilter(y, bar=False)
+        srupf = UPF(self.model, 500, seed=123, utkwargs={'sqrt': True}).initialize().longfilter(y, bar=False)
+
+        assert np.allclose(upf.s_l, srupf.s_l)
+
+    def test_NonAugmentedUKF(self):
+        x, y = self.mvnmodel.sample(50)
+
+        ukf = UKF(self.mvnmodel, utkwargs={'augment': True}).initialize().longfilter(y, bar=False)
+        naukf = UKF(self.mvnmodel).initialize().longfilter(y, bar=False)
+
+        assert ukf._ut._augmented and not naukf._ut._augmented and naukf._ut._sps.shape[1] == 5
+        assert np.allclose(ukf.s_l, naukf.s_l) and np.allclose(ukf.filtermeans(), naukf.filtermeans())
+
+        x, y = self.model.sample(50)
+
+        upf = UPF(self.model, 500, seed=123, utkwargs={'augment': True}).initialize().longfilter(y, bar=False)
+        naupf = UPF(self.model, 500, seed=123, utkwargs={'sqrt': True}).initialize().longfilter(y, bar=False)
+
+        assert np.allclose(upf.s_l, naupf.s_l)
+
+        # ===== The scale may depend on the parameters of each particle ===== #
+        linear = Base((f0, g0), (f, g), (1, Gamma(1)), (Normal(), Normal()), additive=True)
+        model = StateSpaceModel(linear, self.linearobs)
+
+        ukf = UKF(model, particles=100, seed=123, utkwargs={'augment': True}).initialize().longfilter(y, bar=False)
+        naukf = UKF(model, particles=100, seed=123).initialize().longfilter(y, bar=False)
+
+        assert not naukf._ut._augmented and np.allclose(ukf.s_l, naukf.s_l)
+
+        # ===== The scale depends on the state ===== #
+        stochvol = Base((f0, g0), (f, lambda u, alpha, sigma: sigma * np.exp(u / 2)), (1, 1), (Normal(), Normal()))
+        model = StateSpaceModel(stochvol, self.linearobs)
+
+        assert UKF(model).initialize()._ut._augmented
+
+        with self.assertRaises(ValueError):
+            UKF(model, utkwargs={'augment': False})
+
+    def test_ClusteredUPF(self):
+        x, y = self.model.sample(500)
+
+        upf = UPF(self.model, 1000, clusters=16).initialize().longfilter(y, bar=False)
+
+        assert upf._proposal.ut.xmean.shape == (1, 16)
+
+        kf = pykalman.KalmanFilter(transition_matrices=1, observation_matrices=1)
+        kalmanloglikelihood = kf.loglikelihood(y)
+
+        upferror = np.abs((kalmanloglikelihood - np.array(upf.s_l).sum()) / kalmanloglikelihood)
+
+        assert upferror < 0.01
+
+        x, y = self.mvnmodel.sample(50)
+
+        upf = UPF(self.mvnmodel, 1000, clusters=16).initialize().longfilter(y, bar=False)
+        sisr = SISR(self.mvnmodel, 1000).initialize().longfilter(y, bar=False)
+
+        assert np.abs(np.sum(upf.s_l) - np.sum(sisr.s_l)) < 5
@@ -6,6 +6,7 @@ import scipy.stats as stats
 import pyfilter.distributions.continuous as cont
 import pyfilter.utils.utils as helps
 from pyfilter.timeseries import StateSpaceModel, Observable, Base
+from pyfilter.utils.stategradient import NumericalStateGradient
 
 
 def f(x, alpha, sigma):
@@ -99,6 +100,22 @@ class Tests(unittest.TestCase):
 
         assert np.allclose(w, truew)
 
+    def test_StateGradient(self):
+        x = self.mvnmodel.initialize(1000)
+        oldx = self.mvnmodel.initialize(1000)
+
+        y = 1.
+
+        sg = NumericalStateGradient(self.mvnmodel)
+        grad, hessinv = sg.gradient(y, x, oldx), sg.hess(y, x, oldx)
+
+        loadings = np.array([1, 0.5])
+        truegrad = (y - loadings.dot(x)) * loadings[:, None] - (x - oldx)
+        truehess = -np.outer(loadings, loadings) - np.eye(2)
+
+        assert np.allclose(grad, truegrad, atol=1e-5)
+        assert np.allclose(hessinv, np.linalg.inv(truehess)[..., None], atol=1e-2)
+
     def test_Sample(self):
         x, y = self.model.sample(50)
 
@@ -85,3 +85,75 @@ class Tests(unittest.TestCase):
 
         x = self.linear.propagate(sample, params=(2, 2))
 
+
+    def test_ParameterGradient(self):
+        from pyfilter.distributions.continuous import Normal, Gamma
+
+        def df(x, alpha, sigma):
+            return x, 0
+
+        def dg(x, alpha, sigma):
+            return 0, 1
+
+        theta = (Gamma(10, scale=0.1).sample(size=500), Gamma(10, scale=0.1).sample(size=500))
+
+        numerical = ts.Base((f0, g0), (f, g), theta, (Normal(), Normal()))
+        analytical = ts.Base((f0, g0), (f, g), theta, (Normal(), Normal()), grads=(df, dg))
+
+        x = np.random.normal(size=500)
+        y = np.random.normal(size=500)
+
+        for est, true in zip(numerical.p_grad(y, x, h=1e-5), analytical.p_grad(y, x)):
+            assert np.allclose(est, true, rtol=1e-4)
+
+    def test_JIT(self):
+        from pyfilter.distributions.continuous import Normal, Gamma
+
+        theta = (Gamma(10, scale=0.1).sample(size=500), 1.)
+
+        linear = ts.Base((f0, g0), (f, g), theta, (Normal(), Normal()))
+        compiled = ts.Base((f0, g0), (f, g), theta, (Normal(), Normal()), jit=True)
+
+        x = np.random.normal(size=500)
+        y = np.random.normal(size=500)
+
+        assert np.allclose(linear.weight(y, x), compiled.weight(y, x))
+
+        np.random.seed(123)
+        true = linear.propagate(x)
+
+        np.random.seed(123)
+        est = compiled.propagate(x)
+
+        assert np.allclose(true, est)
+
+    def test_ParameterStore(self):
+        from pyfilter.distributions.continuous import Normal, Gamma
+        from pyfilter.timeseries import StateSpaceModel
+
+        hidden = ts.Base((f0, g0), (f, g), (Gamma(1).sample(size=500), 1.), (Normal(), Normal()))
+        observable = ts.Base((f0, g0), (f, g), (1., Gamma(1).sample(size=500)), (Normal(), Normal()))
+        model = StateSpaceModel(hidden, observable)
+
+        values = [p.values.copy() for p in model.flat_theta_dists]
+        store = model.p_store()
+
+        assert store.array.shape == (2, 500) and np.array_equal(store.array, values)
+        assert all(np.shares_memory(p.values, store.array) for p in model.flat_theta_dists)
+
+        indices = np.random.randint(500, size=500)
+        model.p_resample(indices)
+
+        assert np.array_equal(hidden.theta[0].values, values[0][indices])
+
+        copy = model.copy()
+        copy.p_store().array[:] = 1.
+
+        assert np.array_equal(copy.observable.theta[1].values, np.ones(500))
+        assert not np.array_equal(observable.theta[1].values, np.ones(500))
+
+        mask = np.arange(500) < 250
+        model.exchange(mask, copy)
+
+        assert np.all(hidden.theta[0].values[:250] == 1.)
+        assert np.array_equal(hidden.theta[0].values[250:], values[0][indices][250:])
@@ -101,4 +101,19 @@ class Tests(unittest.TestCase):
 
         print('naive: {:.3f}, parallel: {:.3f}, speedup: {:.2f}x'.format(truetime, approxtime, truetime / approxtime))
 
-        assert (np.abs(approximate.x - m) < 1e-7).mean() > 0.95 and truetime / approxtime > 2
\ No newline at end of file
+        assert (np.abs(approximate.x - m) < 1e-7).mean() > 0.95 and truetime / approxtime > 2
+
+    def test_BFGS_Indexed(self):
+        x = np.random.normal(size=(2, 1000))
+        m = np.random.normal(size=(2, 1000))
+
+        evaluated = list()
+
+        def func(u, inds):
+            evaluated.append(inds.size)
+            return -np.exp(-((u - m[:, inds]) ** 2).sum(axis=0) / 2)
+
+        approximate = helps.bfgs(func, x, tol=1e-7, indexed=True)
+
+        assert (np.abs(approximate.x - m) < 1e-6).all(axis=0).mean() > 0.95
+        assert evaluated[-1] < x.shape[-1] and approximate.hess_inv.shape == (2, 2, 1000)
\ No newline at end of file